@@ -0,0 +1,8 @@
+-- Replication position of each Geofabrik region in the slim osm2pgsql
+-- database: the last applied change file and the data timestamp it brings.
+CREATE TABLE IF NOT EXISTS osm_replication (
+    region          TEXT PRIMARY KEY,
+    sequence_number INTEGER NOT NULL,
+    timestamp       TIMESTAMPTZ NOT NULL,
+    updated_at      TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
@@ -0,0 +1,25 @@
+-- Work queues between incremental pipeline steps. Each step consumes its
+-- queue and feeds the next one, so only what changed is recomputed:
+--   osm-update → osm_changes    → osm-views
+--   osm-views  → places_changes → mv-match
+--   mv-match   → brand_changes  → mv-brand
+
+-- OSM objects touched by applied replication diffs (osm2pgsql ids: relations
+-- positive here, as in the change files).
+CREATE TABLE IF NOT EXISTS osm_changes (
+    osm_type    CHAR(1) NOT NULL CHECK (osm_type IN ('N', 'W', 'R')),
+    osm_id      BIGINT NOT NULL,
+    PRIMARY KEY (osm_type, osm_id)
+);
+
+-- mv_places rows (osm_id, node_type) whose matches must be recomputed.
+CREATE TABLE IF NOT EXISTS places_changes (
+    osm_id      BIGINT NOT NULL,
+    node_type   TEXT NOT NULL,
+    PRIMARY KEY (osm_id, node_type)
+);
+
+-- Brands whose aggregate row in mv_places_brand must be recomputed.
+CREATE TABLE IF NOT EXISTS brand_changes (
+    brand_wikidata  TEXT PRIMARY KEY
+);
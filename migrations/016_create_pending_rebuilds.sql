@@ -0,0 +1,12 @@
+-- Relations whose next pipeline run must rebuild from scratch (e.g. mv_places
+-- after osm-import swapped in a new points/polygons generation). The live
+-- relation keeps serving until its rebuilt shadow copy is swapped in, which
+-- clears the row.
+CREATE TABLE IF NOT EXISTS pending_rebuilds (
+    relation    TEXT PRIMARY KEY
+);
+
+-- Rebuilt relations are built in `shadow`, and the generation they replace
+-- is kept in `previous` for rollback.
+CREATE SCHEMA IF NOT EXISTS shadow;
+CREATE SCHEMA IF NOT EXISTS previous;
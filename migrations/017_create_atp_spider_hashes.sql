@@ -0,0 +1,22 @@
+-- Per-spider change tracking for incremental ATP refreshes:
+--   atp-extract → atp_spider_changes → atp-import → atp_changes → mv-match
+
+-- Content hash of every spider output last loaded into atp_fr.
+CREATE TABLE IF NOT EXISTS atp_spider_hashes (
+    spider          TEXT PRIMARY KEY,
+    content_hash    TEXT NOT NULL,
+    updated_at      TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Spiders whose rows in atp_fr must be replaced. A NULL hash means the
+-- spider is gone from the latest run and its rows are only deleted.
+CREATE TABLE IF NOT EXISTS atp_spider_changes (
+    spider          TEXT PRIMARY KEY,
+    content_hash    TEXT
+);
+
+-- atp_fr ids deleted or inserted by an incremental import, whose candidate
+-- pairs must be recomputed.
+CREATE TABLE IF NOT EXISTS atp_changes (
+    atp_id      TEXT PRIMARY KEY
+);
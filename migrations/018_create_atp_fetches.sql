@@ -0,0 +1,8 @@
+-- How each ATP run was fetched: the whole archive ('full') or only the
+-- spiders with French POIs ('targeted'). Targeted fetches fall back to a
+-- full one once the last full fetch is older than ATP_FULL_FETCH_DAYS.
+CREATE TABLE IF NOT EXISTS atp_fetches (
+    run_id      TEXT PRIMARY KEY,
+    mode        TEXT NOT NULL CHECK (mode IN ('full', 'targeted')),
+    fetched_at  TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
@@ -0,0 +1,13 @@
+-- Per-region OSM bookkeeping: each Geofabrik region is imported on its own,
+-- so data_imports also records one row per region (region NULL keeps meaning
+-- the whole pipeline step).
+ALTER TABLE data_imports ADD COLUMN IF NOT EXISTS region TEXT;
+
+CREATE INDEX IF NOT EXISTS data_imports_type_region_date_idx
+    ON data_imports (type, region, date DESC);
+
+-- Regions re-imported from their PBF, whose whole slice of mv_places must be
+-- re-derived by osm-views.
+CREATE TABLE IF NOT EXISTS osm_region_changes (
+    region      TEXT PRIMARY KEY
+);
@@ -0,0 +1,36 @@
+-- Projected CRS of each French territory, so that the 500 m matching radius
+-- is a planar distance instead of spheroid math on geography.
+-- local_srid(geom): EPSG code for a WGS84 point (Lambert-93 by default).
+-- local_xy(geom, srid): geom in that CRS, with SRID 0 so that the rows of
+-- every territory share one column (and one GIST index). Compare xy values
+-- only between rows with the same local_srid.
+-- IMMUTABLE: used in atp_fr generated columns.
+
+CREATE OR REPLACE FUNCTION local_srid(geom geometry) RETURNS INTEGER
+LANGUAGE SQL IMMUTABLE STRICT PARALLEL SAFE AS $$
+  SELECT CASE
+    WHEN lon BETWEEN -63.5 AND -60.5 AND lat BETWEEN 14.0 AND 18.5
+      THEN 5490   -- Antilles (Guadeloupe, Martinique, St-Martin, St-Barth): RGAF09 / UTM 20N
+    WHEN lon BETWEEN -55.0 AND -51.0 AND lat BETWEEN 1.5 AND 6.5
+      THEN 2972   -- Guyane: RGFG95 / UTM 22N
+    WHEN lon BETWEEN -57.0 AND -55.5 AND lat BETWEEN 46.5 AND 47.5
+      THEN 4467   -- Saint-Pierre-et-Miquelon: RGSPM06 / UTM 21N
+    WHEN lon BETWEEN 54.5 AND 56.5 AND lat BETWEEN -22.0 AND -20.0
+      THEN 2975   -- Réunion: RGR92 / UTM 40S
+    WHEN lon BETWEEN 44.5 AND 45.5 AND lat BETWEEN -13.5 AND -12.0
+      THEN 4471   -- Mayotte: RGM04 / UTM 38S
+    WHEN lon BETWEEN 156.0 AND 173.0 AND lat BETWEEN -26.0 AND -17.0
+      THEN 3163   -- Nouvelle-Calédonie: RGNC91-93 / Lambert New Caledonia
+    WHEN lon BETWEEN -158.0 AND -131.0 AND lat BETWEEN -29.0 AND -7.0
+      THEN 3297   -- Polynésie française: RGPF / UTM 6S
+    WHEN lon BETWEEN -179.0 AND -175.5 AND lat BETWEEN -15.0 AND -12.5
+      THEN 32701  -- Wallis-et-Futuna: WGS 84 / UTM 1S
+    ELSE 2154     -- Metropolitan France and Corsica: RGF93 / Lambert-93
+  END
+  FROM (SELECT ST_X($1) AS lon, ST_Y($1) AS lat) AS p;
+$$;
+
+CREATE OR REPLACE FUNCTION local_xy(geom geometry, srid INTEGER) RETURNS geometry
+LANGUAGE SQL IMMUTABLE STRICT PARALLEL SAFE AS $$
+  SELECT ST_SetSRID(ST_Transform($1, $2), 0);
+$$;
@@ -0,0 +1,10 @@
+-- Matching grid: 500 m cells (the matching radius) over the projected
+-- coordinates of local_xy (migration 020). An ATP POI can only be within
+-- 500 m of what overlaps its own cell or one of the 8 around it, which turns
+-- candidate generation into an equi-join on (local_srid, cell_x, cell_y).
+-- IMMUTABLE: used in atp_fr generated columns.
+
+CREATE OR REPLACE FUNCTION grid_cell(coord DOUBLE PRECISION) RETURNS INTEGER
+LANGUAGE SQL IMMUTABLE STRICT PARALLEL SAFE AS $$
+  SELECT floor($1 / 500)::INTEGER;
+$$;
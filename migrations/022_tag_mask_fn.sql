@@ -0,0 +1,18 @@
+-- The tags ATP can fill in an OSM object, as a bitmask:
+-- 1 opening_hours, 2 email, 4 phone, 8 website.
+-- atp_fr.tags_offered is the mask of the tags an ATP POI has, and
+-- mv_places.tags_missing that of the tags an OSM object lacks. A pair can
+-- lead to an edit only if (tags_offered & tags_missing) <> 0.
+-- IMMUTABLE: used in atp_fr generated columns.
+
+CREATE OR REPLACE FUNCTION tag_mask(
+    opening_hours TEXT, email TEXT, phone TEXT, website TEXT
+) RETURNS SMALLINT
+LANGUAGE SQL IMMUTABLE PARALLEL SAFE AS $$
+  SELECT (
+    CASE WHEN $1 IS NOT NULL THEN 1 ELSE 0 END
+    | CASE WHEN $2 IS NOT NULL THEN 2 ELSE 0 END
+    | CASE WHEN $3 IS NOT NULL THEN 4 ELSE 0 END
+    | CASE WHEN $4 IS NOT NULL THEN 8 ELSE 0 END
+  )::SMALLINT;
+$$;
@@ -0,0 +1,42 @@
+-- local_srid (migration 020) mapped the whole of French Polynesia to UTM 6S,
+-- although the Marquesas and the Gambier lie one and two zones east, and
+-- sent every point outside its boxes (TAAF, Clipperton…) to Lambert-93.
+-- Polynesia now gets the RGPF UTM zone of each point (5S to 8S), Lambert-93
+-- is kept to metropolitan France and Corsica, and any other point uses the
+-- WGS 84 UTM zone it falls in (Wallis-et-Futuna keeps UTM 1S this way).
+
+CREATE OR REPLACE FUNCTION local_srid(geom geometry) RETURNS INTEGER
+LANGUAGE SQL IMMUTABLE STRICT PARALLEL SAFE AS $$
+  SELECT CASE
+    WHEN lon BETWEEN -5.5 AND 10.0 AND lat BETWEEN 41.0 AND 51.5
+      THEN 2154   -- Metropolitan France and Corsica: RGF93 / Lambert-93
+    WHEN lon BETWEEN -63.5 AND -60.5 AND lat BETWEEN 14.0 AND 18.5
+      THEN 5490   -- Antilles (Guadeloupe, Martinique, St-Martin, St-Barth): RGAF09 / UTM 20N
+    WHEN lon BETWEEN -55.0 AND -51.0 AND lat BETWEEN 1.5 AND 6.5
+      THEN 2972   -- Guyane: RGFG95 / UTM 22N
+    WHEN lon BETWEEN -57.0 AND -55.5 AND lat BETWEEN 46.5 AND 47.5
+      THEN 4467   -- Saint-Pierre-et-Miquelon: RGSPM06 / UTM 21N
+    WHEN lon BETWEEN 54.5 AND 56.5 AND lat BETWEEN -22.0 AND -20.0
+      THEN 2975   -- Réunion: RGR92 / UTM 40S
+    WHEN lon BETWEEN 44.5 AND 45.5 AND lat BETWEEN -13.5 AND -12.0
+      THEN 4471   -- Mayotte: RGM04 / UTM 38S
+    WHEN lon BETWEEN 156.0 AND 173.0 AND lat BETWEEN -26.0 AND -17.0
+      THEN 3163   -- Nouvelle-Calédonie: RGNC91-93 / Lambert New Caledonia
+    WHEN lon BETWEEN -158.0 AND -131.0 AND lat BETWEEN -29.0 AND -7.0
+      THEN 3291 + GREATEST(5, LEAST(8, zone))
+                  -- Polynésie française: RGPF / UTM 5S (3296) to 8S (3299)
+    ELSE CASE WHEN lat < 0 THEN 32700 ELSE 32600 END + zone
+                  -- Elsewhere (TAAF, Clipperton, Wallis-et-Futuna…): WGS 84 / UTM
+  END
+  FROM (
+    SELECT ST_X($1) AS lon, ST_Y($1) AS lat,
+           LEAST(60, floor((ST_X($1) + 180) / 6)::INTEGER + 1) AS zone
+  ) AS p;
+$$;
+
+-- The stored local_srid/xy/cell_* columns of atp_fr and mv_places were
+-- computed with the old zones: forget the spider hashes so that the next
+-- atp-extract reloads every spider, and rebuild mv_places on the next
+-- osm-views. Both invalidate the matches.
+TRUNCATE atp_spider_hashes, atp_spider_changes;
+INSERT INTO pending_rebuilds (relation) VALUES ('mv_places') ON CONFLICT DO NOTHING;
@@ -0,0 +1,9 @@
+-- No query reads atp_fr or mv_places filtered on tags_offered / tags_missing:
+-- mv-match filters the candidate pairs on is_importable instead. Drop the
+-- partial indexes the builds used to create, in every generation.
+DROP INDEX IF EXISTS public.atp_fr_offering_idx;
+DROP INDEX IF EXISTS previous.atp_fr_offering_idx;
+DROP INDEX IF EXISTS shadow.atp_fr_offering_idx;
+DROP INDEX IF EXISTS public.mv_places_receiving_idx;
+DROP INDEX IF EXISTS previous.mv_places_receiving_idx;
+DROP INDEX IF EXISTS shadow.mv_places_receiving_idx;
@@ -1,144 +1,175 @@
 local srid = 4326
 
+-- The pipeline imports into "public" (see src/pipeline/README.md); the
+-- style benchmark uses a schema of its own.
+local schema = os.getenv('OSM2PGSQL_SCHEMA') or 'public'
+
+-- Geofabrik region of the file being imported: regions are imported (and
+-- their diffs applied) one osm2pgsql run at a time, so that one region can be
+-- re-imported alone.
+local region = os.getenv('OSM2PGSQL_REGION')
+
 local tables = {}
 
-tables.points = osm2pgsql.define_node_table('points', {
+-- The tags an ATP POI is matched on (see src/matching.py MATCH_KEYS) and the
+-- ones it can fill, extracted once here rather than by every query through
+-- tags->>. Their normalized *_norm forms are generated columns, added by
+-- osm-import with the same SQL expressions as atp_fr's.
+local place_columns = {
+    { column = 'name',           type = 'text' },
+    { column = 'brand',          type = 'text' },
+    { column = 'brand_wikidata', type = 'text' },
+    { column = 'city',           type = 'text' },
+    { column = 'postcode',       type = 'text' },
+    { column = 'opening_hours',  type = 'text' },
+    { column = 'website',        type = 'text' },
+    { column = 'phone',          type = 'text' },
+    { column = 'email',          type = 'text' },
+}
+
+local function with_place_columns(columns)
+    for _, column in ipairs(place_columns) do
+        table.insert(columns, column)
+    end
+    return columns
+end
+
+tables.points = osm2pgsql.define_node_table('points', with_place_columns({
     { column = 'tags',    type = 'jsonb' },
     { column = 'geom',    type = 'point', projection = srid, not_null = true },
     { column = 'version', type = 'int' },
-})
+    { column = 'region',  type = 'text' },
+}), { schema = schema })
 
-tables.polygons = osm2pgsql.define_area_table('polygons', {
+tables.polygons = osm2pgsql.define_area_table('polygons', with_place_columns({
     { column = 'osm_type', type = 'text',     not_null = true },
     { column = 'tags',     type = 'jsonb' },
     { column = 'members',  type = 'jsonb' },
     { column = 'geom',     type = 'geometry', projection = srid, not_null = true },
+    { column = 'centroid', type = 'point',    projection = srid },
     { column = 'version',  type = 'int' },
-})
+    { column = 'region',   type = 'text' },
+}), { schema = schema })
+
+-- The extracted columns of a place, or nil when it carries
+-- none of the match keys: no ATP POI could ever be matched to it.
+local function place_row(tags)
+    local website = tags['website'] or tags['contact:website']
+    local phone = tags['phone'] or tags['contact:phone']
+    local email = tags['email'] or tags['contact:email']
+    local name, brand = tags['name'], tags['brand']
+    local brand_wikidata = tags['brand:wikidata']
+    if not (name or brand or brand_wikidata or website or phone or email) then
+        return nil
+    end
+    return {
+        tags = tags,
+        name = name,
+        brand = brand,
+        brand_wikidata = brand_wikidata,
+        city = tags['addr:city'],
+        postcode = tags['addr:postcode'],
+        opening_hours = tags['opening_hours'],
+        website = website,
+        phone = phone,
+        email = email,
+        region = region,
+    }
+end
 
 -- Based on tags wiki list, that removes every POI which are definitely not places
 -- https://wiki.openstreetmap.org/wiki/Map_features
+--
+-- The rules are lookup sets, built once at load time: the filter runs for
+-- every tagged object of the extracts, so it walks the (few) tags of the
+-- object instead of probing every rule, and allocates nothing.
+local function set(keys)
+    local result = {}
+    for _, key in ipairs(keys) do
+        result[key] = true
+    end
+    return result
+end
+
+-- Any of these keys rejects the object, whatever its value.
+local rejected_keys = set {
+    'aerialway', 'aeroway', 'barrier', 'bicycle_road', 'boundary',
+    'admin_level', 'busway', 'cycleway', 'emergency', 'geological',
+    'footway', 'highway', 'lifeguard', 'man_made', 'military', 'natural',
+    'parking', 'place', 'power', 'public_transport', 'railway', 'route',
+    'sidewalk', 'telecom', 'traffic_sign', 'water', 'waterway',
+}
+
+local rejected_landuses = set {
+    'industrial', 'construction', 'aquaculture', 'farmyard', 'flowerbed',
+    'depot', 'quarry', 'railway',
+}
+
+-- All other amenities are rejected for ATP.
+local accepted_amenities = set {
+    'shop',
+    'bar', 'biergarten', 'cafe', 'fast_food', 'food_court', 'ice_cream',
+    'pub', 'restaurant',
+    'atm', 'bank', 'bureau_de_change', 'money_transfer', 'payment_centre',
+    'bicycle_rental', 'boat_rental', 'car_rental', 'fuel',
+    'motorcycle_rental',
+}
+
 local function is_definitely_not_a_place(tags)
-    if tags["aerialway"] then return true end
-    if tags["aeroway"] then return true end
-    if tags["barrier"] then return true end
-    if tags["bicycle_road"] then return true end
-    if tags["boundary"] then return true end
-    if tags["admin_level"] then return true end
-    if tags["busway"] then return true end
-    if tags["cycleway"] then return true end
-    if tags["emergency"] then return true end
-    if tags["geological"] then return true end
-    if tags["footway"] then return true end
-    if tags["highway"] then return true end
-    if tags["lifeguard"] then return true end
-    if tags["man_made"] then return true end
-    if tags["military"] then return true end
-    if tags["natural"] then return true end
-    if tags["parking"] then return true end
-    if tags["place"] then return true end
-    if tags["power"] then return true end
-    if tags["public_transport"] then return true end
-    if tags["railway"] then return true end
-    if tags["route"] then return true end
-    if tags["sidewalk"] then return true end
-    if tags["telecom"] then return true end
-    if tags["traffic_sign"] then return true end
-    if tags["water"] then return true end
-    if tags["waterway"] then return true end
-
-    if tags["bicycle_road"] then return true end
-
-    if tags["building"] and not (tags["shop"] or tags["brand"] or tags["brand:wikidata"]) then return true end
-
-    if tags["landuse"] == 'industrial' then return true end
-    if tags["landuse"] == 'construction' then return true end
-    if tags["landuse"] == 'aquaculture' then return true end
-    if tags["landuse"] == 'farmyard' then return true end
-    if tags["landuse"] == 'flowerbed' then return true end
-    if tags["landuse"] == 'farmyard' then return true end
-    if tags["landuse"] == 'depot' then return true end
-    if tags["landuse"] == 'quarry' then return true end
-    if tags["landuse"] == 'railway' then return true end
-
-    if tags["railway"] and tags["railway"] ~= 'halt' then return true end
-    if tags["railway"] and tags["railway"] ~= 'stop_position' then return true end
-    if tags["railway"] and tags["railway"] ~= 'stop' then return true end
-    if tags["railway"] and tags["railway"] ~= 'station' then return true end
-    if tags["railway"] and tags["railway"] ~= 'platform' then return true end
-    if tags["railway"] and tags["railway"] ~= 'subway_entrance' then return true end
-    if tags["railway"] and tags["railway"] ~= 'tram_stop' then return true end
-
-    if tags["amenity"] then
-        local amenity = tags["amenity"]
-
-        if amenity == 'shop' then return false end
-
-        if amenity == 'bar' then return false end
-        if amenity == 'biergarten' then return false end
-        if amenity == 'cafe' then return false end
-        if amenity == 'fast_food' then return false end
-        if amenity == 'food_court' then return false end
-        if amenity == 'ice_cream' then return false end
-        if amenity == 'pub' then return false end
-        if amenity == 'restaurant' then return false end
-        if amenity == 'atm' then return false end
-        if amenity == 'bank' then return false end
-        if amenity == 'bureau_de_change' then return false end
-        if amenity == 'money_transfer' then return false end
-        if amenity == 'payment_centre' then return false end
-        if amenity == 'bicycle_rental' then return false end
-        if amenity == 'boat_rental' then return false end
-        if amenity == 'car_rental' then return false end
-        if amenity == 'fuel' then return false end
-        if amenity == 'motorcycle_rental' then return false end
-
-        -- All other amenities are rejected for ATP
+    for key in pairs(tags) do
+        if rejected_keys[key] then return true end
+    end
+
+    if tags['building'] and not (tags['shop'] or tags['brand'] or tags['brand:wikidata']) then
         return true
     end
 
+    local landuse = tags['landuse']
+    if landuse and rejected_landuses[landuse] then return true end
+
+    local amenity = tags['amenity']
+    if amenity and not accepted_amenities[amenity] then return true end
+
     return false
 end
 
 function osm2pgsql.process_way(object)
     local tags = object.tags
-    if is_definitely_not_a_place(tags) then return end
-
-    if object.is_closed then
-        tables.polygons:insert({
-            osm_type = 'W',
-            tags = object.tags,
-            members = object.nodes,
-            geom = object:as_polygon(),
-            version = object.version,
-        })
-    end
+    if not object.is_closed or is_definitely_not_a_place(tags) then return end
+    local row = place_row(tags)
+    if not row then return end
+
+    local geom = object:as_polygon()
+    row.osm_type = 'W'
+    row.members = object.nodes
+    row.geom = geom
+    row.centroid = geom:centroid()
+    row.version = object.version
+    tables.polygons:insert(row)
 end
 
 function osm2pgsql.process_node(object)
     local tags = object.tags
     if is_definitely_not_a_place(tags) then return end
+    local row = place_row(tags)
+    if not row then return end
 
-    tables.points:insert({
-        tags = object.tags,
-        geom = object:as_point(),
-        version = object.version,
-    })
+    row.geom = object:as_point()
+    row.version = object.version
+    tables.points:insert(row)
 end
 
 function osm2pgsql.process_relation(object)
     local tags = object.tags
-    if is_definitely_not_a_place(tags) then return end
-
-    local relation_type = object.tags['type']
-
-    if relation_type == 'multipolygon' then
-        tables.polygons:insert({
-            osm_type = 'R',
-            tags = object.tags,
-            members = object.members,
-            geom = object:as_multipolygon(),
-            version = object.version,
-        })
-    end
+    if tags['type'] ~= 'multipolygon' or is_definitely_not_a_place(tags) then return end
+    local row = place_row(tags)
+    if not row then return end
+
+    local geom = object:as_multipolygon()
+    row.osm_type = 'R'
+    row.members = object.members
+    row.geom = geom
+    row.centroid = geom:centroid()
+    row.version = object.version
+    tables.polygons:insert(row)
 end
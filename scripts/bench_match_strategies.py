@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""Compare les stratégies de génération des candidats (MATCH_STRATEGY).
+
+RÔLE
+    mv-match peut générer les paires (ATP, OSM) de plusieurs façons (voir
+    src/matching.py) : "grid", jointure par égalité sur les cellules de 500 m
+    de la grille ; "radius", toutes les paires à moins de 500 m par l'index
+    GIST ; "knn", les quelques plus proches voisins de chaque POI ATP, par
+    parcours ordonné de l'index GIST. Ce script les exécute sur les mêmes
+    données (les tables atp_fr et mv_places de la base configurée) et affiche,
+    pour chacune, la durée de génération des candidats, celle de la
+    déduplication (match_query) et le nombre de lignes. Il vérifie enfin que chaque
+    stratégie donne exactement les mêmes matches que "radius".
+
+FONCTIONNEMENT
+    Tout se passe dans des tables temporaires, dans une transaction annulée à
+    la fin : la base n'est pas modifiée. Chaque stratégie est exécutée --runs
+    fois ; la meilleure durée est retenue (les suivantes profitent du cache).
+
+LANCEMENT
+        uv run --env-file .env python scripts/bench_match_strategies.py
+        uv run --env-file .env python scripts/bench_match_strategies.py --runs 3
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Le script vit dans scripts/ : la racine du dépôt doit être importable.
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from src.matching import candidates_query, match_query, place_cells_query  # noqa: E402
+from src.pipeline._db import connect  # noqa: E402
+
+STRATEGIES = ("grid", "radius", "knn")
+
+
+def timed(cur, query: str) -> float:
+    start = time.perf_counter()
+    cur.execute(query)
+    return time.perf_counter() - start
+
+
+def run(cur, strategy: str, runs: int) -> tuple[float, float, int, int]:
+    """Meilleures durées (candidats, matches) et nombres de lignes."""
+    candidates, matches = f"bench_{strategy}_candidate", f"bench_{strategy}_match"
+    best_candidates = best_matches = float("inf")
+    for _ in range(runs):
+        cur.execute(f"DROP TABLE IF EXISTS {candidates}, {matches}, bench_place_cells")
+        # Comme mv-match : les cellules de la grille sont calculées une fois
+        # pour toutes les clés, et comptées dans la durée des candidats.
+        elapsed, cells = 0.0, None
+        if strategy == "grid":
+            elapsed += timed(
+                cur, "CREATE TEMP TABLE bench_place_cells AS " + place_cells_query()
+            )
+            cur.execute("ANALYZE bench_place_cells")
+            cells = "bench_place_cells"
+        elapsed += timed(
+            cur,
+            f"CREATE TEMP TABLE {candidates} AS "
+            + candidates_query(strategy=strategy, cells=cells),
+        )
+        best_candidates = min(best_candidates, elapsed)
+        cur.execute(f"CREATE INDEX ON {candidates} (atp_id)")
+        cur.execute(f"ANALYZE {candidates}")
+        best_matches = min(
+            best_matches,
+            timed(
+                cur,
+                f"CREATE TEMP TABLE {matches} AS "
+                + match_query(candidates, candidates),
+            ),
+        )
+    cur.execute(f"SELECT count(*) FROM {candidates}")
+    n_candidates = cur.fetchone()[0]
+    cur.execute(f"SELECT count(*) FROM {matches}")
+    n_matches = cur.fetchone()[0]
+    return best_candidates, best_matches, n_candidates, n_matches
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=2, help="exécutions par stratégie (défaut : 2)")
+    args = parser.parse_args()
+
+    conn = connect()
+    try:
+        with conn.cursor() as cur:
+            print(f"{'stratégie':<10} {'candidats':>12} {'matches':>12} {'lignes cand.':>14} {'lignes match':>14}")
+            for strategy in STRATEGIES:
+                t_candidates, t_matches, n_candidates, n_matches = run(cur, strategy, args.runs)
+                print(
+                    f"{strategy:<10} {t_candidates:>10.2f} s {t_matches:>10.2f} s "
+                    f"{n_candidates:>14} {n_matches:>14}"
+                )
+
+            # Mêmes matches (objet OSM, POI ATP) que la stratégie de référence ?
+            for strategy in STRATEGIES:
+                if strategy == "radius":
+                    continue
+                cur.execute(f"""
+                    SELECT count(*) FROM (
+                        (SELECT osm_id, node_type, id FROM bench_radius_match
+                         EXCEPT SELECT osm_id, node_type, id FROM bench_{strategy}_match)
+                        UNION ALL
+                        (SELECT osm_id, node_type, id FROM bench_{strategy}_match
+                         EXCEPT SELECT osm_id, node_type, id FROM bench_radius_match)
+                    ) d
+                """)
+                differences = cur.fetchone()[0]
+                print(
+                    f"{strategy} : matches identiques à radius"
+                    if not differences
+                    else f"{strategy} : {differences} match(es) différent(s) de radius"
+                )
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""Mesure le débit d'osm2pgsql avec le style osm2pgsql/generic.lua.
+
+RÔLE
+    Le traitement Lua de chaque objet OSM (filtre, extraction et normalisation
+    des colonnes) est l'un des principaux coûts du rafraîchissement
+    hebdomadaire. Ce script importe un PBF de référence avec le style, plusieurs
+    fois, et affiche la durée de chaque import (meilleure et médiane) ; avec
+    --baseline, le même PBF est aussi importé avec le style d'une autre révision
+    git, pour comparer avant / après une modification du style.
+
+FONCTIONNEMENT
+    1. Télécharge le PBF de référence (Monaco par défaut, quelques Mo) dans
+       data/bench/ s'il n'y est pas déjà, ou utilise celui donné par --pbf.
+    2. Importe le PBF (osm2pgsql --create, sans --slim) dans le schéma
+       jetable "bench" d'une base de travail (--database ou BENCH_DB_NAME),
+       --runs fois par style. Jamais dans la base du projet : osm2pgsql y
+       réécrirait ses propriétés (osm2pgsql_properties), et un style qui
+       ignore OSM2PGSQL_SCHEMA y remplacerait les tables de public.
+    3. Supprime le schéma "bench".
+
+    Un style de référence (--baseline) qui ne lit pas OSM2PGSQL_SCHEMA est
+    refusé.
+
+LANCEMENT
+    Nécessite osm2pgsql et une base PostgreSQL de travail, sur le serveur et
+    avec les identifiants de la base du projet (.env) ; PostGIS y est activé
+    au besoin :
+
+        createdb osm_bench
+        uv run --env-file .env python scripts/bench_osm2pgsql_style.py --database osm_bench
+        uv run --env-file .env python scripts/bench_osm2pgsql_style.py \\
+            --database osm_bench --baseline HEAD~1 --runs 5 \\
+            --pbf data/osm/bretagne-latest.osm.pbf
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import replace
+from pathlib import Path
+
+# Le script vit dans scripts/ : la racine du dépôt doit être importable.
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import psycopg  # noqa: E402
+
+from src.config import get_database  # noqa: E402
+from src.utils import download_large_file  # noqa: E402
+
+STYLE = ROOT / "osm2pgsql" / "generic.lua"
+FIXTURE_URL = "https://download.geofabrik.de/europe/monaco-latest.osm.pbf"
+FIXTURE_PATH = ROOT / "data" / "bench" / "monaco-latest.osm.pbf"
+SCHEMA = "bench"
+
+
+def bench_database(name: str):
+    """Réglages de connexion à la base de travail `name`."""
+    db = get_database()
+    if name == db.name:
+        sys.exit(f"{name} est la base du projet : utiliser une base de travail")
+    return replace(db, name=name)
+
+
+def import_once(db, style: Path, pbf: Path) -> float:
+    """Importe `pbf` avec `style` dans le schéma de bench, renvoie la durée (s)."""
+    env = os.environ.copy()
+    env["PGPASSWORD"] = db.password
+    env["OSM2PGSQL_SCHEMA"] = SCHEMA
+    env["OSM2PGSQL_REGION"] = "bench"
+    start = time.perf_counter()
+    subprocess.run(
+        [
+            "osm2pgsql",
+            "--create",
+            "--output", "flex",
+            "-S", str(style),
+            "-d", db.name,
+            "-U", db.user,
+            "-H", db.host,
+            "-P", db.port,
+            "--log-level", "warn",
+            str(pbf),
+        ],
+        check=True,
+        env=env,
+    )
+    return time.perf_counter() - start
+
+
+def bench(db, label: str, style: Path, pbf: Path, runs: int) -> list[float]:
+    durations = [import_once(db, style, pbf) for _ in range(runs)]
+    print(
+        f"{label:<12} best {min(durations):7.2f} s   "
+        f"median {statistics.median(durations):7.2f} s   "
+        f"({', '.join(f'{d:.2f}' for d in durations)})"
+    )
+    return durations
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pbf", type=Path, help=f"PBF à importer (défaut : {FIXTURE_URL})")
+    parser.add_argument("--runs", type=int, default=3, help="imports par style (défaut : 3)")
+    parser.add_argument(
+        "--baseline",
+        metavar="REV",
+        help="révision git dont le style sert de référence (ex. HEAD~1)",
+    )
+    parser.add_argument(
+        "--database",
+        default=os.environ.get("BENCH_DB_NAME"),
+        help="base de travail où importer (défaut : $BENCH_DB_NAME)",
+    )
+    args = parser.parse_args()
+    if not args.database:
+        parser.error("--database (ou BENCH_DB_NAME) est requis")
+    db = bench_database(args.database)
+
+    pbf = args.pbf
+    if pbf is None:
+        pbf = FIXTURE_PATH
+        if not pbf.exists():
+            pbf.parent.mkdir(parents=True, exist_ok=True)
+            download_large_file(FIXTURE_URL, pbf)
+    print(f"{pbf.name}, {pbf.stat().st_size / 1e6:.1f} Mo, {args.runs} import(s) par style")
+
+    with psycopg.connect(**db.connect_kwargs) as conn:
+        conn.execute("CREATE EXTENSION IF NOT EXISTS postgis")
+        conn.execute(f"CREATE SCHEMA IF NOT EXISTS {SCHEMA}")
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            if args.baseline:
+                # Le style de référence, tel qu'il était dans cette révision.
+                baseline = Path(tmp) / "baseline.lua"
+                text = subprocess.run(
+                    ["git", "show", f"{args.baseline}:osm2pgsql/generic.lua"],
+                    cwd=ROOT,
+                    check=True,
+                    capture_output=True,
+                ).stdout
+                # Sans OSM2PGSQL_SCHEMA, le style écrirait dans public.
+                if b"OSM2PGSQL_SCHEMA" not in text:
+                    sys.exit(
+                        f"Le style de {args.baseline} ne lit pas OSM2PGSQL_SCHEMA : refusé"
+                    )
+                baseline.write_bytes(text)
+                before = bench(db, args.baseline, baseline, pbf, args.runs)
+            after = bench(db, "working tree", STYLE, pbf, args.runs)
+            if args.baseline:
+                print(f"speed-up     {min(before) / min(after):.2f}x (best vs best)")
+    finally:
+        with psycopg.connect(**db.connect_kwargs) as conn:
+            conn.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+
+
+if __name__ == "__main__":
+    main()
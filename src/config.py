@@ -36,6 +36,14 @@ def get_float(name: str, default: float) -> float:
     return float(os.environ.get(name) or default)
 
 
+def get_bool(name: str, default: bool) -> bool:
+    """Get environment variable as bool (1/true/yes/on) with default."""
+    value = os.environ.get(name)
+    if not value:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
 def get_version() -> str:
     """Get application version from env or git."""
     if v := os.environ.get("APP_VERSION"):
@@ -100,6 +108,12 @@ class Pipeline:
 
     workers: int
     min_free_gb: float
+    atp_keep_world: bool
+    maintenance_work_mem: str
+    atp_full_fetch_days: int
+    host_connections: int
+    download_connections: int
+    match_strategy: str
 
 
 @dataclass(frozen=True)
@@ -159,12 +173,29 @@ def get_app() -> Optional[App]:
     )
 
 
+# Values of MATCH_STRATEGY (see src/matching.py).
+MATCH_STRATEGIES = ("grid", "radius", "knn")
+
+
 @lru_cache(maxsize=1)
 def get_pipeline() -> Pipeline:
     """Get pipeline configuration with defaults."""
+    match_strategy = os.environ.get("MATCH_STRATEGY") or "grid"
+    if match_strategy not in MATCH_STRATEGIES:
+        raise ConfigError(
+            f"MATCH_STRATEGY must be one of {', '.join(MATCH_STRATEGIES)}, "
+            f"got '{match_strategy}'"
+        )
+
     return Pipeline(
         workers=get_int("PIPELINE_WORKERS", max(1, (os.cpu_count() or 4) // 2)),
         min_free_gb=get_float("OSM2PGSQL_MIN_FREE_GB", 15),
+        atp_keep_world=get_bool("ATP_KEEP_WORLD", False),
+        maintenance_work_mem=os.environ.get("PIPELINE_MAINTENANCE_WORK_MEM") or "1GB",
+        atp_full_fetch_days=get_int("ATP_FULL_FETCH_DAYS", 7),
+        host_connections=get_int("PIPELINE_HOST_CONNECTIONS", 6),
+        download_connections=get_int("PIPELINE_DOWNLOAD_CONNECTIONS", 8),
+        match_strategy=match_strategy,
     )
 
 
@@ -2,6 +2,243 @@ from psycopg import Cursor
 from psycopg.rows import dict_row
 from typing import Any
 
+from src.config import get_pipeline
+
+
+# Keys an OSM object and an ATP POI may share to be considered the same place.
+# Both mv_places and atp_fr store these pre-normalized and index each of them.
+MATCH_KEYS = (
+    "brand_wikidata",
+    "brand_norm",
+    "name_norm",
+    "email_norm",
+    "website_norm",
+    "phone_norm",
+)
+
+# SQL expression of each normalized key, for the generated columns of atp_fr
+# and of the OSM tables: both sides must normalize with the very same rules.
+NORM_COLUMNS = {
+    "brand_norm": "LOWER(brand)",
+    "name_norm": "LOWER(name)",
+    "email_norm": "LOWER(email)",
+    "website_norm": "LOWER(REGEXP_REPLACE(website, '^https?://', '', 'i'))",
+    "phone_norm": "normalize_phone(phone)",
+}
+
+# One candidate set per key, so each branch is a plain equi-join the planner
+# can drive from the key indexes instead of filtering a spatial join. Distances
+# are planar, in metres, in the projected CRS both sides share (local_srid):
+# from atp_fr.xy to mv_places.match_xy, the point or the envelope of an area.
+_CANDIDATES_BY_KEY = """
+        SELECT
+            atp.id AS atp_id,
+            osm.osm_id,
+            osm.node_type,
+            ST_Distance(osm.match_xy, atp.xy) AS atp_distance,
+            (atp.tags_offered & osm.tags_missing) <> 0 AS is_importable
+        FROM {atp} atp
+        INNER JOIN {places} osm
+            ON osm.{key} = atp.{key} AND osm.local_srid = atp.local_srid
+        WHERE ST_DWithin(osm.match_xy, atp.xy, 500)
+"""
+
+
+# KNN strategy: for each ATP POI and match key, only the nearest neighbours.
+# Three are enough for the ambiguity rules of match_query (at most one point
+# and one area): three neighbours always include two of the same kind, so a
+# POI with more than three is rejected either way, and one with up to three
+# gets them all. The ST_DWithin bounds the ordered index scan to 500 m.
+KNN_NEIGHBOURS = 3
+
+_KNN_CANDIDATES_BY_KEY = """
+        SELECT
+            atp.id AS atp_id,
+            osm.osm_id,
+            osm.node_type,
+            osm.atp_distance,
+            (atp.tags_offered & osm.tags_missing) <> 0 AS is_importable
+        FROM {atp} atp
+        CROSS JOIN LATERAL (
+            SELECT
+                p.osm_id,
+                p.node_type,
+                p.tags_missing,
+                ST_Distance(p.match_xy, atp.xy) AS atp_distance
+            FROM {places} p
+            WHERE p.{key} = atp.{key}
+              AND p.local_srid = atp.local_srid
+              AND ST_DWithin(p.match_xy, atp.xy, 500)
+            ORDER BY p.match_xy <-> atp.xy
+            LIMIT {k}
+        ) osm
+        WHERE atp.{key} IS NOT NULL
+"""
+
+# Grid strategy: a hash equi-join on (territory, 500 m grid cell, key), which
+# PostgreSQL can run as a parallel hash join instead of one GIST probe per
+# POI; the exact distance is only checked on the pairs it yields. Each POI is
+# joined to its own cell and the 8 around it, each object to every cell its
+# match_xy overlaps (see migrations 020 and 021), listed once for all keys in
+# {cells} (see place_cells_query). An object overlapping several of those
+# cells comes out more than once; the UNION keeps it once.
+_GRID_CANDIDATES_BY_KEY = """
+        SELECT
+            atp.id AS atp_id,
+            osm.osm_id,
+            osm.node_type,
+            ST_Distance(osm.match_xy, atp.xy) AS atp_distance,
+            (atp.tags_offered & osm.tags_missing) <> 0 AS is_importable
+        FROM {atp} atp
+        CROSS JOIN (VALUES (-1), (0), (1)) AS dx (d)
+        CROSS JOIN (VALUES (-1), (0), (1)) AS dy (d)
+        INNER JOIN {cells} osm
+            ON osm.{key} = atp.{key}
+            AND osm.local_srid = atp.local_srid
+            AND osm.cx = atp.cell_x + dx.d
+            AND osm.cy = atp.cell_y + dy.d
+        WHERE ST_DWithin(osm.match_xy, atp.xy, 500)
+"""
+
+# One row per (object, grid cell its match_xy overlaps), with the columns the
+# grid join reads.
+_PLACE_CELLS = """
+    SELECT
+        p.osm_id, p.node_type, p.local_srid, p.match_xy, p.tags_missing, {keys},
+        cx, cy
+    FROM {places} p
+    CROSS JOIN generate_series(p.cell_x, p.cell_x_max) AS cx
+    CROSS JOIN generate_series(p.cell_y, p.cell_y_max) AS cy
+"""
+
+
+def place_cells_query(places: str = "mv_places") -> str:
+    """The grid cells of the `places` objects, for the "grid" strategy.
+
+    Materialize it once (e.g. in a temporary table) and pass it as the
+    `cells` of candidates_query: every match key is then joined against the
+    same rows instead of expanding the cells again.
+    """
+    keys = ", ".join(f"p.{key}" for key in MATCH_KEYS)
+    return _PLACE_CELLS.format(keys=keys, places=places)
+
+
+_STRATEGIES = {
+    "grid": _GRID_CANDIDATES_BY_KEY,
+    "radius": _CANDIDATES_BY_KEY,
+    "knn": _KNN_CANDIDATES_BY_KEY,
+}
+
+
+def candidates_query(
+    places: str = "mv_places",
+    atp: str = "atp_fr",
+    strategy: str | None = None,
+    cells: str | None = None,
+) -> str:
+    """Every (ATP, OSM) pair sharing a match key within 500 m.
+
+    `places` is the OSM side of the join and `atp` the ATP side; pass a
+    subquery to restrict either, e.g. to the objects touched by a replication
+    diff or to the POIs of the spiders that changed. `strategy` defaults to
+    the MATCH_STRATEGY setting. "grid" and "radius" return every pair, found
+    through the grid cells or the GIST indexes; "knn" only the
+    KNN_NEIGHBOURS nearest objects of each POI per key, which match_query
+    deduplicates into the same matches.
+
+    "grid" reads the cells of the `places` objects from `cells`, a table
+    built from place_cells_query(places). Without it, each key expands them
+    again: fine when few POIs are joined, since the key indexes of `places`
+    then drive the join.
+    """
+    strategy = strategy or get_pipeline().match_strategy
+    if strategy not in _STRATEGIES:
+        raise ValueError(f"Unknown match strategy: {strategy!r}")
+    cells = cells or f"({place_cells_query(places)})"
+    return "UNION".join(
+        _STRATEGIES[strategy].format(
+            key=key, places=places, atp=atp, cells=cells, k=KNN_NEIGHBOURS
+        )
+        for key in MATCH_KEYS
+    )
+
+
+def match_query(
+    candidates: str = "atp_osm_candidate", all_candidates: str = "atp_osm_candidate"
+) -> str:
+    """Deduplicate candidate pairs into one match per OSM object.
+
+    Pairs come from `candidates` (the `all_candidates` table or a subquery of
+    it). ATP POIs with more than one point or more than one area nearby are
+    ambiguous and dropped; the counts always look at *every* candidate of the
+    POI, not only at those in `candidates`. Each object keeps its nearest
+    remaining POI, and the match is returned only if that pair is importable
+    (the POI has a tag the object lacks). So only objects with at least one
+    importable pair are deduplicated, and the wide atp_fr / mv_places rows are
+    only read for the matches kept. The columns are the ones apply_on_node
+    reads: the mv-match step stores the result in atp_osm_match, so that
+    get_filtered is a single indexed lookup.
+    """
+    return f"""
+    WITH receiving AS (
+        SELECT DISTINCT osm_id, node_type
+        FROM {candidates}
+        WHERE is_importable
+    ),
+    ambiguity AS (
+        SELECT
+            atp_id,
+            count(*) FILTER (WHERE node_type = 'node')               AS pt_cnt,
+            count(*) FILTER (WHERE node_type IN ('way', 'relation')) AS poly_cnt
+        FROM {all_candidates}
+        WHERE atp_id IN (
+            SELECT c.atp_id
+            FROM {candidates} c
+            INNER JOIN receiving r ON r.osm_id = c.osm_id AND r.node_type = c.node_type
+        )
+        GROUP BY atp_id
+    ),
+    nearest AS (
+        SELECT DISTINCT ON (c.osm_id, c.node_type)
+            c.osm_id,
+            c.node_type,
+            c.atp_id,
+            c.atp_distance,
+            c.is_importable
+        FROM {candidates} c
+        INNER JOIN receiving r ON r.osm_id = c.osm_id AND r.node_type = c.node_type
+        INNER JOIN ambiguity a ON a.atp_id = c.atp_id
+        WHERE a.pt_cnt <= 1 AND a.poly_cnt <= 1
+        ORDER BY c.osm_id, c.node_type, c.atp_distance
+    )
+    SELECT
+        osm.osm_id,
+        osm.node_type,
+        osm.version,
+        osm.tags,
+        osm.members,
+        ST_X(osm.centroid) AS lon,
+        ST_Y(osm.centroid) AS lat,
+        atp.id,
+        atp.brand,
+        atp.brand_wikidata,
+        atp.spider_id,
+        atp.source_uri,
+        atp.source_type,
+        atp.postcode,
+        atp.departement_number,
+        atp.opening_hours as atp_opening_hours,
+        atp.phone as atp_phone,
+        atp.email as atp_email,
+        atp.website as atp_website,
+        n.is_importable,
+        n.atp_distance
+    FROM nearest n
+    INNER JOIN atp_fr atp ON atp.id = n.atp_id
+    INNER JOIN mv_places osm ON osm.osm_id = n.osm_id AND osm.node_type = n.node_type
+    WHERE n.is_importable
+    """
+
 
 def get_filtered(
     cursor: Cursor,
@@ -10,59 +247,24 @@ def get_filtered(
     departement_number: str = None,
 ) -> Cursor:
     query = """
-        WITH joined_poi AS (
-        SELECT
-            *,
-            osm.tags as old_tags,
-            ST_X(ST_Centroid(osm.geom)) AS lon,
-            ST_Y(ST_Centroid(osm.geom)) AS lat,
-            atp.opening_hours as atp_opening_hours,
-            atp.phone as atp_phone,
-            atp.email as atp_email,
-            atp.website as atp_website,
-            atp.country as atp_country,
-            atp.city as atp_city,
-            atp.source_uri as atp_source_uri,
-            ST_Distance(osm.geom::geography, ST_GeomFromGeoJSON(atp.geom)::geography) AS atp_distance,
-            count(*) FILTER (WHERE osm.node_type = 'node')                 OVER (PARTITION BY atp.id) AS pt_cnt,
-            count(*) FILTER (WHERE osm.node_type IN ('way', 'relation'))   OVER (PARTITION BY atp.id) AS poly_cnt
-        FROM
-            mv_places osm
-        INNER JOIN atp_fr atp ON
-            ST_DWithin(
-                osm.geom::geography,
-                ST_GeomFromGeoJSON(atp.geom)::geography,
-                500
-            )
-        WHERE
-            {where_options} AND
-            (
-                osm.brand_wikidata = atp.brand_wikidata
-                OR LOWER(osm.brand) = LOWER(atp.brand)
-                OR LOWER(osm.name) = LOWER(atp."name")
-                OR LOWER(osm.email) = LOWER(atp.email)
-                OR LOWER(REGEXP_REPLACE(osm.website, '^https?://', '', 'i')) = LOWER(REGEXP_REPLACE(atp.website, '^https?://', '', 'i'))
-                OR normalize_phone(osm.phone) = normalize_phone(atp.phone)
-            )
-        )
-        SELECT DISTINCT ON (osm_id, node_type) *
-        FROM joined_poi
-        WHERE pt_cnt <= 1 AND poly_cnt <= 1
-        ORDER BY osm_id, node_type, atp_distance
+        SELECT *
+        FROM atp_osm_match
+        WHERE {where_options}
+        ORDER BY osm_id, node_type
     """
     options = []
     params = []
     if brand:
-        options.append("atp.brand_wikidata = %s")
+        options.append("brand_wikidata = %s")
         params.append(brand)
     if postcode:
-        options.append("atp.postcode = %s")
+        options.append("postcode = %s")
         params.append(postcode)
     if departement_number:
-        options.append("atp.departement_number = %s")
+        options.append("departement_number = %s")
         params.append(departement_number)
 
-    where_options = " AND ".join(options)
+    where_options = " AND ".join(options) or "TRUE"
 
     return cursor.execute(query.format(where_options=where_options), params)
 
@@ -0,0 +1,125 @@
+"""
+AllThePlaces run helpers.
+
+Every ATP run publishes its spider outputs both as one archive and one by
+one, next to each other::
+
+    runs/<run>/output.zip                 — every spider, worldwide
+    runs/<run>/output/<spider>.geojson    — one FeatureCollection per spider
+    runs/<run>/stats.json                 — per-spider metadata
+
+Internal module (not a step file): ``atp.py`` uses it to fetch only the
+spiders that produced French POIs, instead of the whole archive.
+"""
+
+import logging
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+
+from src.utils import download_slot
+
+logger = logging.getLogger(__name__)
+
+# Parallel per-spider downloads (small files: the latency dominates). The
+# connections actually open stay within the download_slot budget.
+FETCH_WORKERS = 8
+
+
+def spider_hash(crc: int, size: int) -> str:
+    """Content hash of a spider output: CRC-32 plus uncompressed size.
+
+    The same value a zip central directory gives for free, so spiders
+    fetched one by one compare with those extracted from the archive.
+    """
+    return f"{crc:08x}-{size}"
+
+
+def file_hash(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    """spider_hash of a file on disk."""
+    crc = 0
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            crc = zlib.crc32(chunk, crc)
+    return spider_hash(crc, path.stat().st_size)
+
+
+def spider_url(output_url: str, spider: str) -> str:
+    """URL of one spider's GeoJSON, next to the run's ``output.zip``."""
+    return f"{output_url.removesuffix('.zip')}/{spider}.geojson"
+
+
+def targeted_spiders(
+    run_spiders: set[str], known_spiders: set[str], fr_spiders: set[str]
+) -> list[str] | None:
+    """Spiders to fetch one by one for this run, or None if the list is stale.
+
+    ``run_spiders`` are the spiders of the new run (from its stats),
+    ``known_spiders`` those whose output was already examined (hashed), and
+    ``fr_spiders`` those that produced French POIs last time. The list is
+    stale — and the whole archive needed — when nothing was examined yet,
+    when the run has spiders never examined (any of them may cover France),
+    or when a French spider is gone from the run (its rows must go).
+    """
+    if not known_spiders or not run_spiders:
+        return None
+    if run_spiders - known_spiders:
+        logger.info(
+            "%d new spider(s) in the run, fetching the full archive",
+            len(run_spiders - known_spiders),
+        )
+        return None
+    if fr_spiders - run_spiders:
+        logger.info(
+            "%d French spider(s) gone from the run, fetching the full archive",
+            len(fr_spiders - run_spiders),
+        )
+        return None
+    return sorted(fr_spiders)
+
+
+def _fetch_spider(session: requests.Session, url: str, path: Path) -> bool:
+    with download_slot(url), session.get(url, stream=True, timeout=60) as resp:
+        if resp.status_code == 404:
+            return False
+        resp.raise_for_status()
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            for chunk in resp.iter_content(chunk_size=1024 * 1024):
+                f.write(chunk)
+        tmp_path.replace(path)
+    return True
+
+
+def fetch_spiders(
+    output_url: str, spiders: list[str], dest_dir: Path, workers: int = FETCH_WORKERS
+) -> bool:
+    """Download the given spiders' GeoJSON into ``dest_dir``, in parallel.
+
+    Returns False if any of them is missing from the run: the caller then
+    falls back to the archive. Other HTTP errors are raised.
+    """
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    with requests.Session() as session:
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=workers)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            found = list(
+                executor.map(
+                    lambda spider: _fetch_spider(
+                        session,
+                        spider_url(output_url, spider),
+                        dest_dir / f"{spider}.geojson",
+                    ),
+                    spiders,
+                )
+            )
+    missing = found.count(False)
+    if missing:
+        logger.info("%d spider output(s) missing from the run", missing)
+        return False
+    logger.info("Fetched %d spider output(s)", len(spiders))
+    return True
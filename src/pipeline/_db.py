@@ -1,26 +1,230 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import psycopg
 
 from src.config import get_database
 
+logger = logging.getLogger(__name__)
+
+# Full rebuilds are written to SHADOW_SCHEMA, then swapped into public; the
+# generation they replace moves to PREVIOUS_SCHEMA, for rollback.
+SHADOW_SCHEMA = "shadow"
+PREVIOUS_SCHEMA = "previous"
+
 
 def connect():
     return psycopg.connect(**get_database().connect_kwargs)
 
 
-def last_import_date(conn, import_type):
+def last_import_date(conn, import_type, region=None):
+    """Date of the last import of `import_type`, of one OSM `region` if given."""
     with conn.cursor() as cur:
         cur.execute(
-            "SELECT date FROM data_imports WHERE type=%s ORDER BY date DESC LIMIT 1",
-            (import_type,),
+            "SELECT date FROM data_imports "
+            "WHERE type=%s AND region IS NOT DISTINCT FROM %s "
+            "ORDER BY date DESC LIMIT 1",
+            (import_type, region),
         )
         row = cur.fetchone()
         return row[0] if row else None
 
 
-def record_import(conn, import_type, date, status):
+def record_import(conn, import_type, date, status, region=None):
     with conn.cursor() as cur:
         cur.execute(
-            "INSERT INTO data_imports (type, date, status) VALUES (%s, %s, %s)",
-            (import_type, date, status),
+            "INSERT INTO data_imports (type, date, status, region) VALUES (%s, %s, %s, %s)",
+            (import_type, date, status, region),
         )
     conn.commit()
+
+
+def has_column(cur, table, column):
+    cur.execute(
+        "SELECT EXISTS (SELECT 1 FROM pg_attribute "
+        "WHERE attrelid = to_regclass(%s) AND attname = %s AND NOT attisdropped)",
+        (table, column),
+    )
+    return cur.fetchone()[0]
+
+
+def is_generated(cur, table, column):
+    """True when `column` of `table` is a stored generated column."""
+    cur.execute(
+        "SELECT EXISTS (SELECT 1 FROM pg_attribute "
+        "WHERE attrelid = to_regclass(%s) AND attname = %s AND attgenerated = 's')",
+        (table, column),
+    )
+    return cur.fetchone()[0]
+
+
+def relation_kind(cur, name):
+    """Return the pg_class relkind of `name` ('r' table, 'm' materialized view…), or None."""
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (name,))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+_KIND_NAMES = {"r": "TABLE", "m": "MATERIALIZED VIEW", "v": "VIEW"}
+
+
+def drop_relation(cur, name):
+    """Drop `name` whatever its kind, so a materialized view can become a table."""
+    kind = relation_kind(cur, name)
+    if kind in _KIND_NAMES:
+        cur.execute(f"DROP {_KIND_NAMES[kind]} {name} CASCADE")
+
+
+def _move_relation(cur, name, from_schema, to_schema):
+    kind = relation_kind(cur, f"{from_schema}.{name}")
+    if kind in _KIND_NAMES:
+        cur.execute(f"ALTER {_KIND_NAMES[kind]} {from_schema}.{name} SET SCHEMA {to_schema}")
+
+
+def prepare_shadow(cur, *names):
+    """Empty the shadow slots of `names` before a full rebuild writes them."""
+    cur.execute(f"CREATE SCHEMA IF NOT EXISTS {SHADOW_SCHEMA}")
+    for name in names:
+        drop_relation(cur, f"{SHADOW_SCHEMA}.{name}")
+
+
+def request_rebuild(cur, name):
+    """Make the next run of the step owning `name` rebuild it from scratch."""
+    cur.execute(
+        "INSERT INTO pending_rebuilds (relation) VALUES (%s) ON CONFLICT DO NOTHING",
+        (name,),
+    )
+
+
+def rebuild_requested(cur, name):
+    cur.execute("SELECT EXISTS (SELECT 1 FROM pending_rebuilds WHERE relation = %s)", (name,))
+    return cur.fetchone()[0]
+
+
+def _exchange(conn, moves, then=None, attempts=5):
+    """Run the SET SCHEMA `moves` in one short transaction, then `then(cur)`.
+
+    The ALTERs need an exclusive lock on each relation. Rather than queue
+    behind a long web query (and stall every query arriving after it), give
+    up after a few seconds and retry.
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SET LOCAL lock_timeout = '5s'")
+                cur.execute(f"CREATE SCHEMA IF NOT EXISTS {PREVIOUS_SCHEMA}")
+                for name, from_schema, to_schema in moves:
+                    _move_relation(cur, name, from_schema, to_schema)
+                if then is not None:
+                    then(cur)
+            conn.commit()
+            return
+        except psycopg.errors.LockNotAvailable:
+            conn.rollback()
+            if attempt == attempts:
+                raise
+            logger.warning("Relations busy, retrying the swap (%d/%d)", attempt, attempts)
+            time.sleep(attempt * 5)
+
+
+def swap_in(conn, *names, then=None):
+    """Atomically replace public `names` with their shadow copies.
+
+    The replaced generation moves to the previous schema (dropping the one
+    before it). `then(cur)` runs in the same transaction. The shadow copies
+    must already be committed.
+    """
+
+    def finish(cur):
+        cur.execute(
+            "DELETE FROM pending_rebuilds WHERE relation = ANY(%s)", (list(names),)
+        )
+        if then is not None:
+            then(cur)
+
+    with conn.cursor() as cur:
+        built = [n for n in names if relation_kind(cur, f"{SHADOW_SCHEMA}.{n}")]
+        for name in built:
+            drop_relation(cur, f"{PREVIOUS_SCHEMA}.{name}")
+    conn.commit()
+    moves = []
+    for name in built:
+        moves.append((name, "public", PREVIOUS_SCHEMA))
+        moves.append((name, SHADOW_SCHEMA, "public"))
+    _exchange(conn, moves, finish)
+
+
+def retire(conn, *names, then=None):
+    """Move public `names` to the previous schema, dropping the generation there.
+
+    For builds that cannot be written to the shadow schema and swapped in:
+    the public slots are freed for them instead. `then(cur)` runs in the
+    same transaction.
+    """
+    with conn.cursor() as cur:
+        for name in names:
+            drop_relation(cur, f"{PREVIOUS_SCHEMA}.{name}")
+    conn.commit()
+    _exchange(conn, [(name, "public", PREVIOUS_SCHEMA) for name in names], then)
+
+
+def roll_back(conn, *names, then=None):
+    """Swap the previous generation of `names` back in place of the current one.
+
+    `then(cur)` runs in the same transaction.
+    """
+    with conn.cursor() as cur:
+        kept = [n for n in names if relation_kind(cur, f"{PREVIOUS_SCHEMA}.{n}")]
+        for name in kept:
+            drop_relation(cur, f"{SHADOW_SCHEMA}.{name}")
+    conn.commit()
+    if not kept:
+        raise RuntimeError(f"No previous generation of {', '.join(names)} to roll back to")
+    moves = []
+    for name in kept:
+        moves.append((name, "public", SHADOW_SCHEMA))
+        moves.append((name, PREVIOUS_SCHEMA, "public"))
+        moves.append((name, SHADOW_SCHEMA, PREVIOUS_SCHEMA))
+    _exchange(conn, moves, then)
+
+
+def copy_rows(cur, table, columns, types, rows):
+    """Stream `rows` into `table` with a binary COPY.
+
+    `types` are the PostgreSQL type names of `columns`, used to encode the
+    values. A bytea value is sent as is and decoded by the column type's
+    binary input function (e.g. WKB into a geography column).
+    """
+    with cur.copy(
+        f"COPY {table} ({', '.join(columns)}) FROM STDIN (FORMAT BINARY)"
+    ) as copy:
+        copy.set_types(types)
+        for row in rows:
+            copy.write_row(row)
+
+
+def create_indexes(statements, workers, maintenance_work_mem):
+    """Run CREATE INDEX `statements` concurrently, one connection each.
+
+    Index builds on the same table only take SHARE locks, so they do not
+    block each other; each one also gets `maintenance_work_mem` to sort in
+    memory.
+    """
+
+    def build(statement):
+        conn = connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT set_config('maintenance_work_mem', %s, false)",
+                    (maintenance_work_mem,),
+                )
+                cur.execute(statement)
+            conn.commit()
+        finally:
+            conn.close()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for fut in [executor.submit(build, s) for s in statements]:
+            fut.result()
@@ -0,0 +1,101 @@
+"""
+Geofabrik replication helpers.
+
+Every Geofabrik extract publishes daily change files next to its PBF, under
+``<region>-updates/``::
+
+    <region>-updates/state.txt              — latest sequence number + timestamp
+    <region>-updates/000/004/123.osc.gz     — changes of sequence 4123
+    <region>-updates/000/004/123.state.txt  — state right after sequence 4123
+
+Internal module (not a step file): ``osm.py`` uses it to keep the slim
+osm2pgsql database current with ``--append`` instead of re-importing the PBFs.
+"""
+
+import gzip
+import logging
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from pathlib import Path
+
+import requests
+
+from src.pipeline._upstream import fetch_text
+
+logger = logging.getLogger(__name__)
+
+# osmChange element → osm2pgsql object type letter
+_OBJECT_TYPES = {"node": "N", "way": "W", "relation": "R"}
+
+
+def sequence_path(sequence: int) -> str:
+    """Return the ``AAA/BBB/CCC`` path of a sequence number (4123 → 000/004/123)."""
+    digits = f"{sequence:09d}"
+    return f"{digits[0:3]}/{digits[3:6]}/{digits[6:9]}"
+
+
+def parse_state(text: str) -> tuple[int, datetime]:
+    """Parse a replication ``state.txt`` into (sequence number, timestamp)."""
+    sequence = timestamp = None
+    for line in text.splitlines():
+        key, _, value = line.partition("=")
+        if key == "sequenceNumber":
+            sequence = int(value)
+        elif key == "timestamp":
+            timestamp = datetime.fromisoformat(
+                value.replace("\\:", ":").replace("Z", "+00:00")
+            )
+    if sequence is None or timestamp is None:
+        raise ValueError("Replication state has no sequenceNumber/timestamp")
+    return sequence, timestamp
+
+
+def fetch_state_text(updates_url: str) -> str:
+    """The region's ``state.txt``, as seen at the start of the pipeline run."""
+    return fetch_text(f"{updates_url}/state.txt")
+
+
+def fetch_state(updates_url: str) -> tuple[int, datetime]:
+    return parse_state(fetch_state_text(updates_url))
+
+
+def download_changes(
+    updates_url: str, since: int, until: int, dest_dir: Path
+) -> list[Path]:
+    """Download change files ``since + 1`` … ``until`` into ``dest_dir``.
+
+    Files are named by their zero-padded sequence number so that a plain sort
+    gives the order in which they must be applied.
+    """
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for sequence in range(since + 1, until + 1):
+        path = dest_dir / f"{sequence:09d}.osc.gz"
+        if not path.exists():
+            resp = requests.get(
+                f"{updates_url}/{sequence_path(sequence)}.osc.gz", timeout=60
+            )
+            resp.raise_for_status()
+            tmp_path = path.with_suffix(".tmp")
+            tmp_path.write_bytes(resp.content)
+            tmp_path.replace(path)
+        paths.append(path)
+    return paths
+
+
+def changed_objects(paths: list[Path]) -> set[tuple[str, int]]:
+    """Return the (``N``/``W``/``R``, id) of every object touched by the change files.
+
+    Streams the XML so memory stays bounded by the number of distinct ids, not
+    by the size of the files.
+    """
+    objects = set()
+    for path in paths:
+        with gzip.open(path, "rb") as f:
+            for _, elem in ET.iterparse(f, events=("end",)):
+                osm_type = _OBJECT_TYPES.get(elem.tag)
+                if osm_type is None:
+                    continue
+                objects.add((osm_type, int(elem.get("id"))))
+                elem.clear()
+    return objects
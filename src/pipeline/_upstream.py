@@ -0,0 +1,161 @@
+"""
+Upstream metadata client.
+
+The small metadata documents of the pipeline — Geofabrik ``state.txt`` files,
+the ATP run history — are read by several steps of a run. They all go through
+this module, which:
+
+- shares one keep-alive ``requests.Session`` (pooled across threads);
+- sends conditional requests: each document's ETag / Last-Modified is kept
+  with its body in ``data/upstream-cache.json``, so an unchanged document
+  costs a ``304 Not Modified``;
+- memoizes every answer for the process, i.e. the pipeline run: all steps
+  see the same snapshot, whichever asks first.
+
+Internal module (not a step file). Large files go through
+``src.utils.download_large_file`` instead.
+"""
+
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+
+import requests
+
+from src.pipeline.constants import UPSTREAM_CACHE_PATH
+
+logger = logging.getLogger(__name__)
+
+# Connections kept alive per host; also the fan-out of fetch_all.
+POOL_SIZE = 16
+
+_lock = threading.Lock()
+_session = None
+# url → threading.Lock, so that concurrent callers fetch a document once.
+_url_locks = {}
+# Per-run snapshot: url → body (GET) or headers (HEAD).
+_texts = {}
+_heads = {}
+# Persistent conditional-request cache: url → {etag, last_modified, text}.
+_validators = None
+
+
+def _get_session() -> requests.Session:
+    global _session
+    with _lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE
+            )
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+        return _session
+
+
+def _url_lock(url: str) -> threading.Lock:
+    with _lock:
+        return _url_locks.setdefault(url, threading.Lock())
+
+
+def _load_validators() -> dict:
+    global _validators
+    with _lock:
+        if _validators is None:
+            try:
+                _validators = json.loads(UPSTREAM_CACHE_PATH.read_text())
+            except (OSError, ValueError):
+                _validators = {}
+        return _validators
+
+
+def _save_validators(url: str, entry: dict) -> None:
+    with _lock:
+        _validators[url] = entry
+        UPSTREAM_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = UPSTREAM_CACHE_PATH.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(_validators))
+        tmp_path.replace(UPSTREAM_CACHE_PATH)
+
+
+def fetch_text(url: str, timeout: int = 30) -> str:
+    """GET ``url`` once per run, conditionally on the cached validators.
+
+    HTTP errors are raised, and not memoized: a later caller retries.
+    """
+    with _url_lock(url):
+        if url in _texts:
+            return _texts[url]
+
+        cached = _load_validators().get(url)
+        headers = {}
+        if cached:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        resp = _get_session().get(url, headers=headers, timeout=timeout)
+        if resp.status_code == 304 and cached:
+            logger.debug("%s not modified", url)
+            text = cached["text"]
+        else:
+            resp.raise_for_status()
+            text = resp.text
+            if "ETag" in resp.headers or "Last-Modified" in resp.headers:
+                _save_validators(
+                    url,
+                    {
+                        "etag": resp.headers.get("ETag"),
+                        "last_modified": resp.headers.get("Last-Modified"),
+                        "text": text,
+                    },
+                )
+        _texts[url] = text
+        return text
+
+
+def _head(url: str, timeout: int) -> dict:
+    with _url_lock(url):
+        if url not in _heads:
+            resp = _get_session().head(url, timeout=timeout, allow_redirects=True)
+            resp.raise_for_status()
+            _heads[url] = resp.headers
+        return _heads[url]
+
+
+def fetch_last_modified(url: str, timeout: int = 30) -> datetime | None:
+    """Last-Modified of ``url`` from a HEAD request, once per run."""
+    value = _head(url, timeout).get("Last-Modified")
+    return parsedate_to_datetime(value) if value else None
+
+
+def fetch_content_length(url: str, timeout: int = 30) -> int | None:
+    """Content-Length of ``url`` from a HEAD request, once per run."""
+    value = _head(url, timeout).get("Content-Length")
+    return int(value) if value and value.isdigit() else None
+
+
+def fetch_all(func, items):
+    """Return ``[func(item) for item in items]``, computed concurrently.
+
+    For fanning several metadata requests out over the pooled session. The
+    first exception raised by ``func`` is re-raised.
+    """
+    items = list(items)
+    if not items:
+        return []
+    with ThreadPoolExecutor(max_workers=min(POOL_SIZE, len(items))) as executor:
+        return list(executor.map(func, items))
+
+
+def reset() -> None:
+    """Forget the run snapshot (the on-disk validators are kept)."""
+    global _validators
+    with _lock:
+        _texts.clear()
+        _heads.clear()
+        _validators = None
@@ -1,36 +1,84 @@
+import contextlib
 import json
 import logging
 import shutil
 import zipfile
 from datetime import datetime, timezone
+from pathlib import Path
 from src.pipeline.constants import (
     ATP_DIR,
     GEOJSON_DIR,
-    SPLIT_DIR,
+    NDGEOJSON_DIR,
     PARQUET_PATH,
+    SPIDER_OUTPUT_DIR,
     SPIDERS_PATH,
     ATP_HISTORY_URL,
 )
 import duckdb
-import requests
 
-from src.config import get_database
-from src.pipeline._db import connect, last_import_date, record_import
-from src.pipeline.ndgeojson_to_parquet import convert_to_parquet
+from src.config import get_database, get_pipeline
+from src.pipeline._db import (
+    SHADOW_SCHEMA,
+    connect,
+    copy_rows,
+    create_indexes,
+    has_column,
+    last_import_date,
+    prepare_shadow,
+    record_import,
+    relation_kind,
+    swap_in,
+)
+from src.pipeline._atp_runs import (
+    fetch_spiders,
+    file_hash,
+    spider_hash,
+    targeted_spiders,
+)
+from src.pipeline._upstream import fetch_text
+from src.matching import NORM_COLUMNS
+from src.pipeline.atp2osm import invalidate_matches
+from src.pipeline.ndgeojson_to_parquet import FR_FILTER, convert_to_parquet
 from src.utils import delete_file_if_exists, download_large_file
 
 
 logger = logging.getLogger(__name__)
 
 
+def _targeted_spiders(conn):
+    """Spiders to fetch one by one for the run in spiders.json, or None to
+    fetch the full archive (see _atp_runs.targeted_spiders).
+    """
+    max_age = get_pipeline().atp_full_fetch_days
+    if max_age <= 0 or not SPIDERS_PATH.exists():
+        return None
+    with conn.cursor() as cur:
+        if relation_kind(cur, "atp_spiders") is None:
+            return None
+        # Spiders that stopped covering France are only noticed in a full
+        # fetch, and new French ones only in the spider list: refresh both
+        # regularly.
+        cur.execute("""
+            SELECT max(fetched_at) >= NOW() - make_interval(days => %s)
+            FROM atp_fetches WHERE mode = 'full'
+        """, (max_age,))
+        if not cur.fetchone()[0]:
+            return None
+        cur.execute("SELECT spider FROM atp_spider_hashes")
+        known = {spider for (spider,) in cur.fetchall()}
+        cur.execute("SELECT spider FROM atp_spiders")
+        fr_spiders = {spider for (spider,) in cur.fetchall()}
+    with open(SPIDERS_PATH) as f:
+        run_spiders = {entry["spider"] for entry in json.load(f)}
+    return targeted_spiders(run_spiders, known, fr_spiders)
+
+
 def download_atp():
     conn = connect()
     try:
         last_date = last_import_date(conn, "atp")
 
-        resp = requests.get(ATP_HISTORY_URL, timeout=30)
-        resp.raise_for_status()
-        runs = list(reversed(resp.json()))
+        runs = list(reversed(json.loads(fetch_text(ATP_HISTORY_URL))))
 
         ATP_DIR.mkdir(parents=True, exist_ok=True)
 
@@ -60,8 +108,8 @@ def download_atp():
 
             delete_file_if_exists(ATP_DIR / "output.zip")
             delete_file_if_exists(SPIDERS_PATH)
-
-            download_large_file(zip_url, ATP_DIR / "output.zip")
+            if SPIDER_OUTPUT_DIR.exists():
+                shutil.rmtree(SPIDER_OUTPUT_DIR)
 
             if stats_url:
                 stats_path = ATP_DIR / "stats.json"
@@ -70,7 +118,26 @@ def download_atp():
                     out.write(json.dumps(json.loads(infile.read())["results"]))
                 stats_path.unlink()
 
-            logger.info("Downloaded ATP run %s", run_id)
+            spiders = _targeted_spiders(conn)
+            if spiders is not None and fetch_spiders(zip_url, spiders, SPIDER_OUTPUT_DIR):
+                mode = "targeted"
+            else:
+                if SPIDER_OUTPUT_DIR.exists():
+                    shutil.rmtree(SPIDER_OUTPUT_DIR)
+                download_large_file(zip_url, ATP_DIR / "output.zip")
+                mode = "full"
+
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    INSERT INTO atp_fetches (run_id, mode) VALUES (%s, %s)
+                    ON CONFLICT (run_id)
+                        DO UPDATE SET mode = EXCLUDED.mode, fetched_at = NOW()
+                    """,
+                    (run_id, mode),
+                )
+            conn.commit()
+            logger.info("Downloaded ATP run %s (%s fetch)", run_id, mode)
             return
 
         raise RuntimeError("No ATP run could be downloaded")
@@ -79,43 +146,434 @@ def download_atp():
         conn.close()
 
 
-def extract_atp():
+def _spider_outputs(stack):
+    """Return ({spider: hash}, extract(spider), full) for the downloaded run.
+
+    Reads either output.zip (full: every spider of the run, hashed from the
+    zip central directory without decompressing) or the spiders fetched one
+    by one (targeted: the others are left as they are). None if neither is
+    there.
+    """
     zip_path = ATP_DIR / "output.zip"
-    if not zip_path.exists():
-        logger.info("No ATP zip found, skipping extraction")
-        return
+    if zip_path.exists():
+        zf = stack.enter_context(zipfile.ZipFile(zip_path, "r"))
+        members = {
+            Path(info.filename).stem: info
+            for info in zf.infolist()
+            if info.filename.endswith(".geojson") and not info.is_dir()
+        }
+
+        def extract(spider):
+            with (
+                zf.open(members[spider]) as src,
+                open(GEOJSON_DIR / f"{spider}.geojson", "wb") as dst,
+            ):
+                shutil.copyfileobj(src, dst, 1024 * 1024)
 
-    if GEOJSON_DIR.exists():
-        shutil.rmtree(GEOJSON_DIR)
-    GEOJSON_DIR.mkdir(parents=True)
+        hashes = {
+            spider: spider_hash(info.CRC, info.file_size)
+            for spider, info in members.items()
+        }
+        return hashes, extract, True
 
-    with zipfile.ZipFile(zip_path, "r") as zf:
-        zf.extractall(GEOJSON_DIR)
+    if SPIDER_OUTPUT_DIR.exists():
+        files = {f.stem: f for f in SPIDER_OUTPUT_DIR.glob("*.geojson")}
 
-    geojson_files = list(GEOJSON_DIR.rglob("*.geojson"))
-    if not geojson_files:
-        raise FileNotFoundError(f"No .geojson files found in {GEOJSON_DIR}")
+        def extract(spider):
+            files[spider].replace(GEOJSON_DIR / f"{spider}.geojson")
 
-    for f in geojson_files:
-        if f.parent != GEOJSON_DIR:
-            f.rename(GEOJSON_DIR / f.name)
+        return {spider: file_hash(f) for spider, f in files.items()}, extract, False
 
-    logger.info("Extracted ATP zip (%d geojson files)", len(geojson_files))
+    return None
+
+
+def extract_atp():
+    """Extract the spider outputs that changed since the last import.
+
+    Each spider's hash is compared with atp_spider_hashes; only the changed
+    ones are extracted, and they are queued in atp_spider_changes together
+    with the spiders gone from the run, for atp-import to replace.
+    """
+    with contextlib.ExitStack() as stack:
+        outputs = _spider_outputs(stack)
+        if outputs is None:
+            logger.info("No ATP download found, skipping extraction")
+            return
+        hashes, extract, full = outputs
+        if not hashes:
+            raise FileNotFoundError(f"No .geojson files found in {ATP_DIR}")
+
+        # A new extraction restarts the conversion: NDJSON left by an earlier
+        # run may hold an older version of a spider.
+        for directory in (GEOJSON_DIR, NDGEOJSON_DIR):
+            if directory.exists():
+                shutil.rmtree(directory)
+        GEOJSON_DIR.mkdir(parents=True)
+
+        conn = stack.enter_context(connect())
+        # Without rows in atp_fr, every spider must be loaded again.
+        populated = _atp_fr_populated(conn)
+        if not populated and not full:
+            # atp-import would load these few spiders as the whole of atp_fr.
+            # Without hashes, the next atp-download fetches the full archive.
+            with conn.cursor() as cur:
+                cur.execute("TRUNCATE atp_spider_hashes, atp_spider_changes")
+            conn.commit()
+            delete_file_if_exists(PARQUET_PATH)
+            raise RuntimeError(
+                "atp_fr needs a full load but only some spiders were fetched: "
+                "run atp-download again"
+            )
+        with conn.cursor() as cur:
+            if not populated:
+                cur.execute("TRUNCATE atp_spider_hashes")
+            cur.execute("SELECT spider, content_hash FROM atp_spider_hashes")
+            known = dict(cur.fetchall())
+
+            changed = {
+                spider: content_hash
+                for spider, content_hash in hashes.items()
+                if known.get(spider) != content_hash
+            }
+            # A targeted fetch says nothing about the spiders it skipped.
+            removed = known.keys() - hashes.keys() if full else set()
+            cur.execute("TRUNCATE atp_spider_changes")
+            cur.executemany(
+                "INSERT INTO atp_spider_changes (spider, content_hash) VALUES (%s, %s)",
+                [*changed.items(), *((spider, None) for spider in removed)],
+            )
+
+        for spider in changed:
+            extract(spider)
+
+        # latest.parquet now only gets the changed spiders: drop the previous
+        # one before queueing, so atp-import never reads it for this run.
+        # With removals only, atp-import does not read it.
+        if changed:
+            delete_file_if_exists(PARQUET_PATH)
+        conn.commit()
+
+    logger.info(
+        "Extracted %d changed spider(s) out of %d, %d removed",
+        len(changed),
+        len(hashes),
+        len(removed),
+    )
 
 
 def create_parquet_atp():
-    """Step 5: Create parquet from split NDJSON files."""
-    if not SPLIT_DIR.exists() or not any(SPLIT_DIR.glob("*.geojson")):
-        logger.info("No split NDJSON files found, skipping parquet creation")
+    """Step 4: Create parquet from NDJSON files."""
+    if not NDGEOJSON_DIR.exists() or not any(NDGEOJSON_DIR.glob("*.geojson")):
+        logger.info("No NDJSON files found, skipping parquet creation")
         return
     delete_file_if_exists(PARQUET_PATH)
-    convert_to_parquet(SPLIT_DIR, PARQUET_PATH)
+    convert_to_parquet(
+        NDGEOJSON_DIR, PARQUET_PATH, keep_world=get_pipeline().atp_keep_world
+    )
     logger.info("Created parquet from NDJSON files")
 
 
+# atp_fr columns, loaded by binary COPY. geog arrives as WKB and is parsed
+# by the geography type itself.
+_ATP_FR_COLUMNS = {
+    "id": "text",
+    "country": "text",
+    "city": "text",
+    "postcode": "text",
+    "departement_number": "text",
+    "brand_wikidata": "text",
+    "brand": "text",
+    "name": "text",
+    "opening_hours": "text",
+    "website": "text",
+    "phone": "text",
+    "email": "text",
+    "end_date": "text",
+    "spider_id": "text",
+    "source_type": "text",
+    "source_uri": "text",
+    "geog": "bytea",
+}
+
+# Created UNLOGGED for the load only: WAL would slow the COPY down, and a
+# crash mid-load just leaves a shadow copy to rebuild. import_atp sets it
+# LOGGED before the swap, so the live atp_fr survives crashes and is
+# replicated. The match keys are normalized once here rather than on
+# every join, and the point projected once to its territory's CRS (xy, see
+# migrations 020 and 023) and placed in its 500 m grid cell (migration 021).
+# tags_offered flags the tags the POI could fill (migration 022): POIs with
+# none can still make a match ambiguous, but never lead to an edit. {table} is
+# the shadow copy being built.
+_CREATE_ATP_FR = """
+    CREATE UNLOGGED TABLE {table} (
+        id TEXT,
+        country TEXT,
+        city TEXT,
+        postcode TEXT,
+        departement_number TEXT,
+        brand_wikidata TEXT,
+        brand TEXT,
+        name TEXT,
+        opening_hours TEXT,
+        website TEXT,
+        phone TEXT,
+        email TEXT,
+        end_date TEXT,
+        spider_id TEXT,
+        source_type TEXT,
+        source_uri TEXT,
+        geog geography(Point, 4326),
+        {norm_columns},
+        local_srid INTEGER GENERATED ALWAYS AS (local_srid(geog::geometry)) STORED,
+        xy geometry(Point, 0)
+            GENERATED ALWAYS AS (local_xy(geog::geometry, local_srid(geog::geometry))) STORED,
+        cell_x INTEGER GENERATED ALWAYS AS (
+            grid_cell(ST_X(local_xy(geog::geometry, local_srid(geog::geometry))))
+        ) STORED,
+        cell_y INTEGER GENERATED ALWAYS AS (
+            grid_cell(ST_Y(local_xy(geog::geometry, local_srid(geog::geometry))))
+        ) STORED,
+        tags_offered SMALLINT
+            GENERATED ALWAYS AS (tag_mask(opening_hours, email, phone, website)) STORED
+    )
+"""
+
+_CREATE_ATP_FR = _CREATE_ATP_FR.replace(
+    "{norm_columns}",
+    ",\n        ".join(
+        f"{column} TEXT GENERATED ALWAYS AS ({expression}) STORED"
+        for column, expression in NORM_COLUMNS.items()
+    ),
+)
+
+_ATP_FR_INDEXES = [
+    "CREATE INDEX atp_fr_xy_idx ON {table} USING GIST (xy)",
+    "CREATE INDEX atp_fr_id_idx ON {table} (id)",
+    "CREATE INDEX atp_fr_brand_wikidata_idx ON {table} (brand_wikidata)",
+    "CREATE INDEX atp_fr_brand_norm_idx ON {table} (brand_norm)",
+    "CREATE INDEX atp_fr_name_norm_idx ON {table} (name_norm)",
+    "CREATE INDEX atp_fr_website_norm_idx ON {table} (website_norm)",
+    "CREATE INDEX atp_fr_phone_norm_idx ON {table} (phone_norm)",
+    "CREATE INDEX atp_fr_email_norm_idx ON {table} (email_norm)",
+    "CREATE INDEX atp_fr_departement_number_idx ON {table} (departement_number)",
+    "CREATE INDEX atp_fr_spider_idx ON {table} (spider_id)",
+    "CREATE INDEX atp_fr_source_type_idx ON {table} (source_type)",
+]
+
+# Rows fetched from DuckDB per fetchmany() call, streamed to COPY as plain
+# tuples (pyarrow is not a dependency, so no Arrow record batches).
+_COPY_BATCH_ROWS = 50_000
+
+
+def _atp_fr_populated(conn):
+    # An atp_fr from before the projected, grid and tags_offered columns
+    # counts as empty: it is reloaded in full rather than updated or kept.
+    with conn.cursor() as cur:
+        if relation_kind(cur, "atp_fr") is None or not has_column(
+            cur, "atp_fr", "tags_offered"
+        ):
+            return False
+        cur.execute("SELECT EXISTS (SELECT 1 FROM atp_fr)")
+        return cur.fetchone()[0]
+
+
+# FR_FILTER only keeps valid postcodes, so no NULL postcode reaches atp_fr
+# (no DELETE, no dead tuples).
+_SELECT_ATP_FR = f"""
+    SELECT
+        id,
+        country,
+        city,
+        postcode,
+        CASE
+            WHEN SUBSTRING(postcode, 1, 2) IN ('97', '98')
+                THEN SUBSTRING(postcode, 1, 3)
+            ELSE SUBSTRING(postcode, 1, 2)
+        END AS departement_number,
+        brand_wikidata,
+        brand,
+        name,
+        opening_hours,
+        website,
+        phone,
+        email,
+        end_date,
+        spider_id,
+        NULL::VARCHAR AS source_type,
+        source_uri,
+        ST_AsWKB(ST_PointOnSurface(geom)) AS geog
+    FROM read_parquet('{PARQUET_PATH}')
+    WHERE geom IS NOT NULL AND {FR_FILTER}
+"""
+
+
+def _atp_fr_rows(ddb):
+    """Stream the atp_fr rows of latest.parquet, for copy_rows, fetched from
+    DuckDB _COPY_BATCH_ROWS row tuples at a time."""
+    result = ddb.execute(_SELECT_ATP_FR)
+    return (
+        row
+        for batch in iter(lambda: result.fetchmany(_COPY_BATCH_ROWS), [])
+        for row in batch
+    )
+
+
+def _attach_postgres(ddb):
+    db = get_database()
+    db_url = (
+        f"dbname={db.name} "
+        f"user={db.user} "
+        f"host={db.host} "
+        f"password={db.password} "
+        f"port={db.port}"
+    )
+    ddb.execute("INSTALL postgres; LOAD postgres;")
+    ddb.execute(f"ATTACH '{db_url}' AS pg (TYPE postgres);")
+
+
+def _record_spider_hashes(cur, full=False):
+    """Move the hashes queued in atp_spider_changes to atp_spider_hashes."""
+    if full:
+        cur.execute("TRUNCATE atp_spider_hashes")
+    cur.execute("""
+        DELETE FROM atp_spider_hashes
+        WHERE spider IN (SELECT spider FROM atp_spider_changes)
+    """)
+    cur.execute("""
+        INSERT INTO atp_spider_hashes (spider, content_hash)
+        SELECT spider, content_hash FROM atp_spider_changes
+        WHERE content_hash IS NOT NULL
+    """)
+    cur.execute("TRUNCATE atp_spider_changes")
+
+
+def _update_atp_fr(conn, pending):
+    """Replace the atp_fr rows of the spiders queued in atp_spider_changes.
+
+    Delete plus insert by spider_id, in one transaction: the web app sees
+    either the old or the new rows of a spider. The ids of both the deleted
+    and the inserted rows are queued in atp_changes for mv-match.
+    latest.parquet only holds the changed spiders here. It is missing when
+    every changed spider came out empty, and left over from an earlier run
+    (so not read) when every change is a spider that disappeared.
+    """
+    logger.info("Updating atp_fr for %d changed spider(s)...", pending)
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT EXISTS (SELECT 1 FROM atp_spider_changes WHERE content_hash IS NOT NULL)"
+        )
+        read_parquet = cur.fetchone()[0] and PARQUET_PATH.exists()
+    ddb = duckdb.connect()
+    ddb.execute("INSTALL spatial; LOAD spatial;")
+    parquet_spiders = []
+    if read_parquet:
+        # Spiders may also be renamed inside a file: delete by the ids found
+        # in the data too, not only by file name.
+        parquet_spiders = [
+            spider
+            for (spider,) in ddb.execute(f"""
+                SELECT DISTINCT spider_id FROM read_parquet('{PARQUET_PATH}')
+                WHERE geom IS NOT NULL AND spider_id IS NOT NULL AND {FR_FILTER}
+            """).fetchall()
+        ]
+
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TEMP TABLE changed_spiders ON COMMIT DROP AS
+            SELECT spider FROM atp_spider_changes
+        """)
+        cur.executemany(
+            "INSERT INTO changed_spiders (spider) VALUES (%s)",
+            [(spider,) for spider in parquet_spiders],
+        )
+        cur.execute("""
+            WITH stale AS (
+                DELETE FROM atp_fr
+                WHERE spider_id IN (SELECT spider FROM changed_spiders)
+                RETURNING id
+            )
+            INSERT INTO atp_changes (atp_id)
+            SELECT DISTINCT id FROM stale WHERE id IS NOT NULL
+            ON CONFLICT DO NOTHING
+        """)
+        if read_parquet:
+            copy_rows(
+                cur,
+                "atp_fr",
+                list(_ATP_FR_COLUMNS),
+                list(_ATP_FR_COLUMNS.values()),
+                _atp_fr_rows(ddb),
+            )
+        cur.execute("""
+            INSERT INTO atp_changes (atp_id)
+            SELECT DISTINCT id FROM atp_fr
+            WHERE spider_id IN (SELECT spider FROM changed_spiders) AND id IS NOT NULL
+            ON CONFLICT DO NOTHING
+        """)
+        cur.execute("SELECT spider FROM changed_spiders")
+        changed = [spider for (spider,) in cur.fetchall()]
+        _record_spider_hashes(cur)
+    conn.commit()
+
+    # atp_spiders is descriptive only: refreshed after the commit, through
+    # DuckDB which maps the stats JSON onto its columns.
+    if SPIDERS_PATH.exists():
+        _attach_postgres(ddb)
+        ddb.execute(
+            "CREATE TEMP TABLE changed_spiders AS SELECT unnest(?::VARCHAR[]) AS spider",
+            [changed],
+        )
+        ddb.execute("""
+            DELETE FROM pg.atp_spiders
+            WHERE spider IN (SELECT spider FROM changed_spiders)
+        """)
+        if parquet_spiders:
+            ddb.execute(
+                f"""
+                INSERT INTO pg.atp_spiders BY NAME
+                SELECT * FROM read_json('{SPIDERS_PATH}')
+                WHERE spider IN (SELECT unnest(?::VARCHAR[]))
+                """,
+                [parquet_spiders],
+            )
+        ddb.execute("DETACH pg")
+
+
+def _last_fetch_mode(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT mode FROM atp_fetches ORDER BY fetched_at DESC LIMIT 1")
+        row = cur.fetchone()
+    return row[0] if row else None
+
+
 def import_atp():
     conn = connect()
     try:
+        # Without stored hashes every spider is queued: a full load is faster
+        # than replacing them one by one.
+        with conn.cursor() as cur:
+            cur.execute("SELECT count(*) FROM atp_spider_changes")
+            pending = cur.fetchone()[0]
+            cur.execute("SELECT EXISTS (SELECT 1 FROM atp_spider_hashes)")
+            hashed = cur.fetchone()[0]
+        if pending and hashed and _atp_fr_populated(conn):
+            date = (
+                datetime.fromtimestamp(PARQUET_PATH.stat().st_mtime, tz=timezone.utc)
+                if PARQUET_PATH.exists()
+                else datetime.now(timezone.utc)
+            )
+            _update_atp_fr(conn, pending)
+            record_import(conn, "atp", date, "success")
+            logger.info("ATP incremental import complete")
+            return
+        if not pending and hashed and _atp_fr_populated(conn):
+            # Nothing changed since the last import, or every change was
+            # already applied: there may be no parquet at all.
+            logger.info("No ATP spider changed, skipping")
+            last_date = last_import_date(conn, "atp") or datetime.now(timezone.utc)
+            record_import(conn, "atp", last_date, "skipped")
+            return
+
         if not PARQUET_PATH.exists():
             raise FileNotFoundError(
                 f"No parquet file at {PARQUET_PATH} — atp-parquet must run first"
@@ -126,98 +584,84 @@ def import_atp():
         )
         last_date = last_import_date(conn, "atp")
 
-        if last_date is not None and parquet_mtime <= last_date:
+        if (
+            last_date is not None
+            and parquet_mtime <= last_date
+            and _atp_fr_populated(conn)
+        ):
             logger.info(
                 "Parquet not newer than last import (%s), skipping", last_date.date()
             )
             record_import(conn, "atp", parquet_mtime, "skipped")
             return
 
+        if _last_fetch_mode(conn) != "full":
+            # latest.parquet only holds the spiders of a targeted fetch.
+            with conn.cursor() as cur:
+                cur.execute("TRUNCATE atp_spider_hashes, atp_spider_changes")
+            conn.commit()
+            raise RuntimeError(
+                f"{PARQUET_PATH} does not come from a full fetch: "
+                "run the atp steps again from atp-download"
+            )
+
         try:
+            # Built in the shadow schema and swapped in at the end: the web
+            # app keeps reading the current atp_fr during the whole load.
+            table = f"{SHADOW_SCHEMA}.atp_fr"
             with conn.cursor() as cur:
-                cur.execute("DROP TABLE IF EXISTS atp_fr CASCADE")
-                cur.execute("DROP TABLE IF EXISTS atp_spiders CASCADE")
+                prepare_shadow(cur, "atp_fr", "atp_spiders")
+                cur.execute(_CREATE_ATP_FR.format(table=table))
             conn.commit()
 
-            db = get_database()
-            db_url = (
-                f"dbname={db.name} "
-                f"user={db.user} "
-                f"host={db.host} "
-                f"password={db.password} "
-                f"port={db.port}"
-            )
             ddb = duckdb.connect()
-            ddb.execute("INSTALL postgres; LOAD postgres;")
             ddb.execute("INSTALL spatial; LOAD spatial;")
-            ddb.execute(f"ATTACH '{db_url}' AS pg (TYPE postgres);")
 
-            logger.info("Creating atp_fr table from parquet...")
-            ddb.execute(f"""
-                CREATE TABLE pg.atp_fr AS
-                SELECT
-                    id,
-                    properties->>'$.addr:country'    AS country,
-                    properties->>'$.addr:city'        AS city,
-                    properties->>'$.addr:postcode'    AS postcode,
-                    CASE
-                        WHEN SUBSTRING(properties->>'$.addr:postcode', 1, 2) IN ('97', '98')
-                            THEN SUBSTRING(properties->>'$.addr:postcode', 1, 3)
-                        ELSE SUBSTRING(properties->>'$.addr:postcode', 1, 2)
-                    END AS departement_number,
-                    properties->>'$.brand:wikidata'   AS brand_wikidata,
-                    properties->>'$.brand'            AS brand,
-                    properties->>'$.name'             AS name,
-                    properties->>'$.opening_hours'    AS opening_hours,
-                    properties->>'$.website'          AS website,
-                    properties->>'$.phone'            AS phone,
-                    properties->>'$.email'            AS email,
-                    properties->>'$.end_date'         AS end_date,
-                    properties->>'$.@spider'          AS spider_id,
-                    NULL::VARCHAR                     AS source_type,
-                    properties->>'$.@source_uri'      AS source_uri,
-                    ST_AsGeoJSON(geom)                AS geom
-                FROM read_parquet('{PARQUET_PATH}')
-                WHERE properties->>'$.addr:country' = 'FR'
-                    AND geom IS NOT NULL
-                    AND REGEXP_MATCHES(COALESCE(properties->>'$.addr:postcode', ''), '^(2[AB]|[0-9]{{2}})[0-9]{{3}}$')
-            """)
+            logger.info("Loading atp_fr from parquet...")
+            with conn.cursor() as cur:
+                copy_rows(
+                    cur,
+                    table,
+                    list(_ATP_FR_COLUMNS),
+                    list(_ATP_FR_COLUMNS.values()),
+                    _atp_fr_rows(ddb),
+                )
+                # The live table must be crash-safe and replicated: WAL-log it
+                # now, before its indexes are built on it.
+                cur.execute(f"ALTER TABLE {table} SET LOGGED")
+            conn.commit()
 
             logger.info("Creating indexes for atp_fr...")
+            pipeline = get_pipeline()
+            create_indexes(
+                [statement.format(table=table) for statement in _ATP_FR_INDEXES],
+                pipeline.workers,
+                pipeline.maintenance_work_mem,
+            )
             with conn.cursor() as cur:
-                cur.execute("DELETE FROM atp_fr WHERE postcode IS NULL;")
-                cur.execute("""
-                    CREATE INDEX IF NOT EXISTS atp_fr_geom_idx
-                        ON atp_fr USING GIST ((ST_GeomFromGeoJSON(geom)::geography));
-                    CREATE INDEX IF NOT EXISTS atp_fr_brand_wikidata_idx
-                        ON atp_fr (brand_wikidata);
-                    CREATE INDEX IF NOT EXISTS atp_fr_brand_lower_idx
-                        ON atp_fr (LOWER(brand));
-                    CREATE INDEX IF NOT EXISTS atp_fr_name_lower_idx
-                        ON atp_fr (LOWER(name));
-                    CREATE INDEX IF NOT EXISTS atp_fr_website_norm_idx
-                        ON atp_fr (LOWER(REGEXP_REPLACE(website, '^https?://', '', 'i')));
-                    CREATE INDEX IF NOT EXISTS atp_fr_phone_norm_idx
-                        ON atp_fr (normalize_phone(phone));
-                    CREATE INDEX IF NOT EXISTS atp_fr_email_lower_idx
-                        ON atp_fr (LOWER(email));
-                    CREATE INDEX IF NOT EXISTS atp_fr_departement_number_idx
-                        ON atp_fr (departement_number);
-                    CREATE INDEX IF NOT EXISTS atp_fr_spider_idx
-                        ON atp_fr (spider_id);
-                    CREATE INDEX IF NOT EXISTS atp_fr_source_type_idx
-                        ON atp_fr (source_type);
-                """)
+                cur.execute(f"ANALYZE {table}")
             conn.commit()
 
             logger.info("Creating atp_spiders table...")
+            _attach_postgres(ddb)
+            # The spider set comes from the parquet, not from a read-back of atp_fr.
             ddb.execute(f"""
-                CREATE TABLE pg.atp_spiders AS
+                CREATE TABLE pg.{SHADOW_SCHEMA}.atp_spiders AS
                 SELECT *
                 FROM read_json('{SPIDERS_PATH}')
-                WHERE spider IN (SELECT DISTINCT spider_id FROM pg.atp_fr)
+                WHERE spider IN (
+                    SELECT DISTINCT spider_id
+                    FROM read_parquet('{PARQUET_PATH}')
+                    WHERE geom IS NOT NULL AND {FR_FILTER}
+                )
             """)
+            ddb.execute("DETACH pg")
+
+            def reset_queues(cur):
+                invalidate_matches(cur)
+                _record_spider_hashes(cur, full=True)
 
+            swap_in(conn, "atp_fr", "atp_spiders", then=reset_queues)
             record_import(conn, "atp", parquet_mtime, "success")
             logger.info("ATP import complete (parquet mtime: %s)", parquet_mtime.date())
 
@@ -230,7 +674,7 @@ def import_atp():
 
 
 def cleanup_atp():
-    for name in ["output.zip", "geojson", "ndgeojson", "split", "stats.json"]:
+    for name in ["output.zip", "output", "geojson", "ndgeojson", "stats.json"]:
         path = ATP_DIR / name
         if not path.exists():
             continue
@@ -1,58 +1,324 @@
 import logging
 
-from src.pipeline._db import connect
+from src.config import get_pipeline
+from src.matching import candidates_query, match_query, place_cells_query
+from src.pipeline._db import (
+    SHADOW_SCHEMA,
+    connect,
+    has_column,
+    prepare_shadow,
+    rebuild_requested,
+    relation_kind,
+    request_rebuild,
+    swap_in,
+)
 
 logger = logging.getLogger(__name__)
 
+# Queue the brands of the given atp_osm_match rows for mv-brand.
+_QUEUE_BRANDS = """
+    INSERT INTO brand_changes (brand_wikidata)
+    SELECT DISTINCT brand_wikidata FROM {matches} m
+    WHERE brand_wikidata IS NOT NULL
+    ON CONFLICT DO NOTHING
+"""
+
+_BRAND_QUERY = """
+    SELECT
+        STRING_AGG(DISTINCT brand, ' / ' ORDER BY brand) AS brand,
+        brand_wikidata,
+        COUNT(*) AS total
+    FROM atp_osm_match
+    WHERE is_importable AND brand_wikidata IS NOT NULL {and_where}
+    GROUP BY brand_wikidata
+"""
+
+
+def invalidate_matches(cur):
+    """Make the next mv-match run rebuild every match from scratch.
+
+    Called after a full reload of atp_fr or mv_places: the stored candidate
+    pairs then refer to rows that may no longer exist.
+    """
+    cur.execute("DROP TABLE IF EXISTS atp_osm_candidate")
+    cur.execute("TRUNCATE places_changes, atp_changes")
+
+
+def _build_matches(conn):
+    """Rebuild atp_osm_candidate and atp_osm_match in the shadow schema, then
+    swap them in: the validate pages keep reading the current matches meanwhile.
+    """
+    candidates = f"{SHADOW_SCHEMA}.atp_osm_candidate"
+    matches = f"{SHADOW_SCHEMA}.atp_osm_match"
+    strategy = get_pipeline().match_strategy
+    with conn.cursor() as cur:
+        prepare_shadow(cur, "atp_osm_candidate", "atp_osm_match")
+        cells = None
+        if strategy == "grid":
+            # Expanded once, then joined by the branch of every match key.
+            cur.execute(
+                f"CREATE TEMP TABLE place_cells ON COMMIT DROP AS {place_cells_query()}"
+            )
+            cur.execute("ANALYZE place_cells")
+            cells = "place_cells"
+        logger.info("Creating atp_osm_candidate (%s strategy)...", strategy)
+        cur.execute(
+            f"CREATE TABLE {candidates} AS "
+            + candidates_query(strategy=strategy, cells=cells)
+        )
+        # Kept with the table, through swaps and rollbacks.
+        cur.execute(f"COMMENT ON TABLE {candidates} IS 'strategy={strategy}'")
+        cur.execute(f"""
+            CREATE INDEX IF NOT EXISTS atp_osm_candidate_atp_id_idx
+                ON {candidates} (atp_id);
+            CREATE INDEX IF NOT EXISTS atp_osm_candidate_osm_id_idx
+                ON {candidates} (osm_id, node_type);
+            CREATE INDEX IF NOT EXISTS atp_osm_candidate_importable_idx
+                ON {candidates} (osm_id, node_type) WHERE is_importable;
+        """)
+        cur.execute(f"ANALYZE {candidates};")
+
+        logger.info("Creating atp_osm_match...")
+        cur.execute(f"CREATE TABLE {matches} AS {match_query(candidates, candidates)}")
+        cur.execute(f"""
+            CREATE INDEX IF NOT EXISTS atp_osm_match_brand_departement_idx
+                ON {matches} (brand_wikidata, departement_number);
+            CREATE INDEX IF NOT EXISTS atp_osm_match_departement_number_idx
+                ON {matches} (departement_number);
+            CREATE INDEX IF NOT EXISTS atp_osm_match_osm_id_idx
+                ON {matches} (osm_id, node_type);
+        """)
+        cur.execute(f"ANALYZE {matches};")
+    conn.commit()
+
+    def queue_brands(cur):
+        # Brands of both the outgoing and the incoming matches.
+        if relation_kind(cur, "atp_osm_match"):
+            cur.execute(_QUEUE_BRANDS.format(matches="atp_osm_match"))
+        cur.execute(_QUEUE_BRANDS.format(matches=matches))
+        cur.execute("TRUNCATE places_changes, atp_changes")
+
+    # atp_osm_match may still be a legacy materialized view, which the swap
+    # moves out of the way like a table.
+    swap_in(conn, "atp_osm_candidate", "atp_osm_match", then=queue_brands)
+
+
+def _update_matches(cur):
+    """Recompute the matches affected by the rows queued in places_changes
+    (mv_places) and atp_changes (atp_fr).
+
+    The candidate pairs of the changed objects and POIs are recomputed, then
+    every object paired with an ATP POI that gained or lost a candidate is
+    deduplicated again, since that POI's ambiguity counts may have moved.
+    Objects that lost a pair to a deleted POI are deduplicated again too.
+
+    With the knn strategy a POI only keeps its nearest objects, which a change
+    nearby can push in or out: every POI that lost a pair or lies within 500 m
+    of a changed object is queued in atp_changes, and its candidates
+    recomputed from the ATP side alone.
+    """
+    knn = get_pipeline().match_strategy == "knn"
+    cur.execute("""
+        CREATE TEMP TABLE stale_pairs ON COMMIT DROP AS
+        SELECT atp_id, osm_id, node_type FROM atp_osm_candidate WITH NO DATA
+    """)
+    cur.execute("""
+        WITH stale AS (
+            DELETE FROM atp_osm_candidate c
+            USING places_changes p
+            WHERE c.osm_id = p.osm_id AND c.node_type = p.node_type
+            RETURNING c.atp_id, c.osm_id, c.node_type
+        )
+        INSERT INTO stale_pairs SELECT * FROM stale
+    """)
+    changed_places = """(
+            SELECT m.*
+            FROM mv_places m
+            INNER JOIN places_changes USING (osm_id, node_type)
+        )"""
+    if knn:
+        cur.execute(f"""
+            INSERT INTO atp_changes (atp_id)
+            SELECT atp_id FROM stale_pairs
+            UNION
+            SELECT atp_id FROM (
+                {candidates_query(places=changed_places, strategy="radius")}
+            ) nearby
+            ON CONFLICT DO NOTHING
+        """)
+    cur.execute("""
+        WITH stale AS (
+            DELETE FROM atp_osm_candidate c
+            USING atp_changes a
+            WHERE c.atp_id = a.atp_id
+            RETURNING c.atp_id, c.osm_id, c.node_type
+        )
+        INSERT INTO stale_pairs SELECT * FROM stale
+    """)
+    cur.execute("""
+        CREATE TEMP TABLE affected_atp ON COMMIT DROP AS
+        SELECT atp_id FROM stale_pairs
+    """)
+    changed_atp = """(
+            SELECT f.*
+            FROM atp_fr f
+            INNER JOIN atp_changes a ON a.atp_id = f.id
+        )"""
+    if knn:
+        fresh = candidates_query(atp=changed_atp)
+    else:
+        cells = None
+        if get_pipeline().match_strategy == "grid":
+            cur.execute(f"""
+                CREATE TEMP TABLE changed_place_cells ON COMMIT DROP AS
+                {place_cells_query(changed_places)}
+            """)
+            cells = "changed_place_cells"
+        # A pair whose both sides changed comes out of both queries; the UNION
+        # keeps it once.
+        fresh = f"""{candidates_query(places=changed_places, cells=cells)}
+            UNION
+            {candidates_query(atp=changed_atp)}"""
+    cur.execute(f"""
+        WITH fresh AS (
+            INSERT INTO atp_osm_candidate
+            {fresh}
+            RETURNING atp_id
+        )
+        INSERT INTO affected_atp SELECT atp_id FROM fresh
+    """)
+    cur.execute("""
+        CREATE TEMP TABLE affected_places ON COMMIT DROP AS
+        SELECT osm_id, node_type FROM places_changes
+        UNION
+        SELECT osm_id, node_type FROM stale_pairs
+        UNION
+        SELECT osm_id, node_type FROM atp_osm_candidate
+        WHERE atp_id IN (SELECT atp_id FROM affected_atp)
+    """)
+
+    cur.execute(f"""
+        WITH stale AS (
+            DELETE FROM atp_osm_match m
+            USING affected_places a
+            WHERE m.osm_id = a.osm_id AND m.node_type = a.node_type
+            RETURNING m.brand_wikidata
+        )
+        {_QUEUE_BRANDS.format(matches="stale")}
+    """)
+    cur.execute(f"""
+        INSERT INTO atp_osm_match
+        {match_query('''(
+            SELECT c.*
+            FROM atp_osm_candidate c
+            INNER JOIN affected_places USING (osm_id, node_type)
+        )''')}
+    """)
+    cur.execute(_QUEUE_BRANDS.format(matches="""(
+        SELECT m.brand_wikidata
+        FROM atp_osm_match m
+        INNER JOIN affected_places USING (osm_id, node_type)
+    )"""))
+    cur.execute("TRUNCATE places_changes, atp_changes")
+
+
+def _built_strategy(cur):
+    """MATCH_STRATEGY of the last full build of atp_osm_candidate, or None."""
+    cur.execute("SELECT obj_description(to_regclass('atp_osm_candidate'), 'pg_class')")
+    comment = cur.fetchone()[0]
+    if comment is None or not comment.startswith("strategy="):
+        return None
+    return comment.removeprefix("strategy=")
+
+
+def create_atp_osm_match():
+    conn = connect()
+    try:
+        with conn.cursor() as cur:
+            if relation_kind(cur, "atp_osm_candidate") is not None:
+                strategy = get_pipeline().match_strategy
+                built = _built_strategy(cur)
+                if built != strategy:
+                    # Candidates of two strategies must not be mixed.
+                    logger.info(
+                        "Match strategy changed (%s → %s), rebuilding the matches",
+                        built,
+                        strategy,
+                    )
+                    request_rebuild(cur, "atp_osm_candidate")
+                    conn.commit()
+            full = (
+                relation_kind(cur, "atp_osm_candidate") is None
+                or relation_kind(cur, "atp_osm_match") is None
+                or not has_column(cur, "atp_osm_candidate", "is_importable")
+                or rebuild_requested(cur, "atp_osm_candidate")
+            )
+        if full:
+            _build_matches(conn)
+            logger.info("atp_osm_match created")
+            return
+
+        with conn.cursor() as cur:
+            cur.execute("SELECT count(*) FROM places_changes")
+            places = cur.fetchone()[0]
+            cur.execute("SELECT count(*) FROM atp_changes")
+            pois = cur.fetchone()[0]
+            if not places and not pois:
+                logger.info("No OSM or ATP change since the last match, skipping")
+                return
+            logger.info(
+                "Updating atp_osm_match for %d changed object(s) and %d ATP POI(s)...",
+                places,
+                pois,
+            )
+            _update_matches(cur)
+        conn.commit()
+        logger.info("atp_osm_match updated")
+    finally:
+        conn.close()
+
 
 def create_mv_places_brand():
     conn = connect()
     try:
         with conn.cursor() as cur:
-            cur.execute("DROP MATERIALIZED VIEW IF EXISTS mv_places_brand;")
-            logger.info("Creating mv_places_brand...")
-            cur.execute("""
-                CREATE MATERIALIZED VIEW mv_places_brand AS
-                WITH joined_poi AS (
-                    SELECT
-                        osm.osm_id,
-                        osm.node_type,
-                        atp.brand            AS atp_brand,
-                        atp.brand_wikidata   AS atp_brand_wikidata,
-                        (
-                            (atp.opening_hours IS NOT NULL AND osm.opening_hours IS NULL)
-                            OR (atp.email    IS NOT NULL AND osm.email    IS NULL)
-                            OR (atp.phone    IS NOT NULL AND osm.phone    IS NULL)
-                            OR (atp.website  IS NOT NULL AND osm.website  IS NULL)
-                        ) AS is_importable,
-                        ST_Distance(osm.geom::geography, ST_GeomFromGeoJSON(atp.geom)::geography) AS atp_distance,
-                        count(*) FILTER (WHERE osm.node_type = 'node')               OVER (PARTITION BY atp.id) AS pt_cnt,
-                        count(*) FILTER (WHERE osm.node_type IN ('way', 'relation')) OVER (PARTITION BY atp.id) AS poly_cnt
-                    FROM mv_places osm
-                    INNER JOIN atp_fr atp ON
-                        ST_DWithin(osm.geom::geography, ST_GeomFromGeoJSON(atp.geom)::geography, 500)
-                    WHERE
-                        osm.brand_wikidata = atp.brand_wikidata
-                        OR LOWER(osm.brand) = LOWER(atp.brand)
-                        OR LOWER(osm.name)  = LOWER(atp."name")
-                        OR LOWER(osm.email) = LOWER(atp.email)
-                        OR LOWER(REGEXP_REPLACE(osm.website, '^https?://', '', 'i')) = LOWER(REGEXP_REPLACE(atp.website, '^https?://', '', 'i'))
-                        OR normalize_phone(osm.phone) = normalize_phone(atp.phone)
-                ),
-                deduped AS (
-                    SELECT DISTINCT ON (osm_id, node_type) *
-                    FROM joined_poi
-                    WHERE pt_cnt <= 1 AND poly_cnt <= 1 AND is_importable
-                    ORDER BY osm_id, node_type, atp_distance
+            full = relation_kind(cur, "mv_places_brand") != "r"
+        if full:
+            # A plain table, so that only the brands in brand_changes need to
+            # be recomputed on the next runs.
+            with conn.cursor() as cur:
+                prepare_shadow(cur, "mv_places_brand")
+                logger.info("Creating mv_places_brand...")
+                cur.execute(
+                    f"CREATE TABLE {SHADOW_SCHEMA}.mv_places_brand AS "
+                    + _BRAND_QUERY.format(and_where="")
                 )
-                SELECT
-                    STRING_AGG(DISTINCT atp_brand, ' / ' ORDER BY atp_brand) AS brand,
-                    atp_brand_wikidata AS brand_wikidata,
-                    COUNT(*)           AS total
-                FROM deduped
-                GROUP BY atp_brand_wikidata
-            """)
-        conn.commit()
-        logger.info("mv_places_brand created")
+                cur.execute(f"""
+                    CREATE INDEX IF NOT EXISTS mv_places_brand_brand_wikidata_idx
+                        ON {SHADOW_SCHEMA}.mv_places_brand (brand_wikidata);
+                """)
+            conn.commit()
+            swap_in(
+                conn,
+                "mv_places_brand",
+                then=lambda cur: cur.execute("TRUNCATE brand_changes"),
+            )
+        else:
+            with conn.cursor() as cur:
+                cur.execute("SELECT count(*) FROM brand_changes")
+                logger.info("Refreshing mv_places_brand for %d brand(s)...", cur.fetchone()[0])
+                cur.execute("""
+                    DELETE FROM mv_places_brand
+                    WHERE brand_wikidata IN (SELECT brand_wikidata FROM brand_changes)
+                """)
+                cur.execute(
+                    "INSERT INTO mv_places_brand "
+                    + _BRAND_QUERY.format(
+                        and_where="AND brand_wikidata IN (SELECT brand_wikidata FROM brand_changes)"
+                    )
+                )
+                cur.execute("TRUNCATE brand_changes")
+            conn.commit()
+        logger.info("mv_places_brand ready")
     finally:
         conn.close()
@@ -10,21 +10,34 @@ from src.config import get_pipeline
 WORKERS = get_pipeline().workers
 
 # File size limits
-MAX_FILE_SIZE = 128 * 1024 * 1024  # 128 MB - maximum size for NDJSON chunks
+MAX_FILE_SIZE = 128 * 1024 * 1024  # 128 MB - target size of the NDJSON shards
 
 # Directory paths
 PROJECT_ROOT = Path(__file__).parent.parent.parent
 ATP_DIR = PROJECT_ROOT / "data" / "atp"
 GEOJSON_DIR = ATP_DIR / "geojson"
+# Spider outputs fetched one by one (targeted fetch), instead of output.zip.
+SPIDER_OUTPUT_DIR = ATP_DIR / "output"
 NDGEOJSON_DIR = ATP_DIR / "ndgeojson"
-SPLIT_DIR = ATP_DIR / "split"
 PARQUET_PATH = ATP_DIR / "latest.parquet"
 SPIDERS_PATH = ATP_DIR / "spiders.json"
 ATP_HISTORY_URL = "https://data.alltheplaces.xyz/runs/history.json"
+# Upstream metadata (state.txt, history.json) with their ETag / Last-Modified.
+UPSTREAM_CACHE_PATH = PROJECT_ROOT / "data" / "upstream-cache.json"
 GEOFABRIK_BASE = "https://download.geofabrik.de"
+OSM_DIR = PROJECT_ROOT / "data" / "osm"
+# osm2pgsql slim-mode node locations, kept between runs so that replication
+# diffs can be applied with --append.
+FLAT_NODES_PATH = OSM_DIR / "nodes.bin"
+# Flat-nodes files of the osm2pgsql generation being imported (shadow schema)
+# and of the one it replaced (previous schema).
+SHADOW_FLAT_NODES_PATH = OSM_DIR / "nodes.shadow.bin"
+PREVIOUS_FLAT_NODES_PATH = OSM_DIR / "nodes.previous.bin"
+OSM_CHANGES_DIR = OSM_DIR / "changes"
 
 # Each entry: geofabrik path suffix (without -latest.osm.pbf).
-# url, state_url and pbf_path are derived automatically.
+# url, updates_url, state_url, pbf_path and state_path are derived automatically.
+# state_path keeps the replication state seen right before the PBF download.
 # DOM are sub-regions of europe/france on Geofabrik.
 # COM in the Pacific are under australia-oceania (French names).
 # Note: Saint-Pierre-et-Miquelon has no dedicated Geofabrik extract.
@@ -44,9 +57,11 @@ _GEOFABRIK_PATHS = {
 
 GEOFABRIK_REGIONS = {
     name: {
-        "url":      f"{GEOFABRIK_BASE}/{path}-latest.osm.pbf",
-        "state_url": f"{GEOFABRIK_BASE}/{path}-updates/state.txt",
-        "pbf_path": PROJECT_ROOT / "data" / "osm" / f"{path.split('/')[-1]}-latest.osm.pbf",
+        "url":         f"{GEOFABRIK_BASE}/{path}-latest.osm.pbf",
+        "updates_url": f"{GEOFABRIK_BASE}/{path}-updates",
+        "state_url":   f"{GEOFABRIK_BASE}/{path}-updates/state.txt",
+        "pbf_path":    OSM_DIR / f"{path.split('/')[-1]}-latest.osm.pbf",
+        "state_path":  OSM_DIR / f"{path.split('/')[-1]}-latest.state.txt",
     }
     for name, path in _GEOFABRIK_PATHS.items()
 }
@@ -4,8 +4,10 @@
 # Options:
 #   lock: "<name>" — steps sharing the same lock name are serialized via a
 #                    mutex; only one runs at a time, others queue behind it.
-#                    Use for bandwidth-heavy operations (e.g. lock="network")
+#                    Use for resource-heavy operations (e.g. lock="cpu")
 #                    where true concurrency would be counterproductive.
+#                    Downloads need none: they share connection slots per
+#                    host instead (src.utils.download_slot).
 #
 # Execution model: each branch runs independently — a step starts as soon as
 # all its direct predecessors are done, with no synchronisation barrier between
@@ -25,23 +27,24 @@ from src.pipeline.atp import (
     extract_atp,
     import_atp,
 )
-from src.pipeline.atp2osm import create_mv_places_brand
-from src.pipeline.ndgeojson_to_parquet import convert_atp, split_atp
-from src.pipeline.osm import download_pbf, run_osm2pgsql, setup_mv_places
+from src.pipeline.atp2osm import create_atp_osm_match, create_mv_places_brand
+from src.pipeline.ndgeojson_to_parquet import convert_atp
+from src.pipeline.osm import download_pbf, run_osm2pgsql, setup_mv_places, update_osm
 
 logger = logging.getLogger(__name__)
 
 PIPELINE = {
     "start": (None, ["osm-download", "atp-download"]),
-    "osm-download": (download_pbf, ["osm-import"], {"lock": "network"}),
-    "osm-import": (run_osm2pgsql, ["osm-views"], {"lock": "cpu"}),
-    "osm-views": (setup_mv_places, ["mv-brand"]),
-    "atp-download": (download_atp, ["atp-extract"], {"lock": "network"}),
+    "osm-download": (download_pbf, ["osm-import"]),
+    "osm-import": (run_osm2pgsql, ["osm-update"], {"lock": "cpu"}),
+    "osm-update": (update_osm, ["osm-views"], {"lock": "cpu"}),
+    "osm-views": (setup_mv_places, ["mv-match"]),
+    "atp-download": (download_atp, ["atp-extract"]),
     "atp-extract": (extract_atp, ["atp-convert"], {"lock": "cpu"}),
-    "atp-convert": (convert_atp, ["atp-split"], {"lock": "cpu"}),
-    "atp-split": (split_atp, ["atp-parquet"], {"lock": "cpu"}),
+    "atp-convert": (convert_atp, ["atp-parquet"], {"lock": "cpu"}),
     "atp-parquet": (create_parquet_atp, ["atp-import"], {"lock": "cpu"}),
-    "atp-import": (import_atp, ["mv-brand"]),
+    "atp-import": (import_atp, ["mv-match"]),
+    "mv-match": (create_atp_osm_match, ["mv-brand"]),
     "mv-brand": (create_mv_places_brand, ["cleanup"]),
     "cleanup": (cleanup_atp, []),
 }
@@ -58,7 +61,7 @@ def record_failure(step_name, exc):
     comment = f"step '{step_name}' failed\n" + "".join(
         traceback.format_exception(type(exc), exc, exc.__traceback__)
     )
-    # mv-brand, cleanup, … don't belong to the osm/atp branches.
+    # mv-match, mv-brand, cleanup, … don't belong to the osm/atp branches.
     import_type = step_name.split("-", 1)[0]
     if import_type not in ("osm", "atp"):
         import_type = "pipeline"
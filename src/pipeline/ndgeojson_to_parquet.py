@@ -11,25 +11,27 @@ can handle GeoJSON files of any size.
 Workflow:
 1. convert_geojson_to_ndgeojson: Converts FeatureCollection GeoJSON to NDJSON format
    (one feature per line). This step is necessary because the original GeoJSON files
-   are in FeatureCollection format which is harder to process in chunks.
-
-2. split_ndgeojson: Splits large NDJSON files into smaller chunks (MAX_FILE_SIZE,
-   see constants.py). This ensures that each file can be safely loaded into memory
-   and processed by DuckDB without hitting memory limits.
-
-3. convert_to_parquet: Converts the split NDJSON files to Parquet format using DuckDB.
-   This is done in two phases:
-   - Phase 1: Each NDJSON chunk is converted to a mini Parquet file in parallel
-   - Phase 2: All mini Parquet files are merged into a single final Parquet file
-
-4. _write_geoparquet_metadata: Adds GeoParquet metadata to the final output for
-   better interoperability with geospatial tools.
-
-The chunk size (MAX_FILE_SIZE) trades off two pressures:
+   are in FeatureCollection format which is harder to process in chunks. Files are
+   processed in a pool of WORKERS processes, in large blocks of bytes.
+
+2. convert_to_parquet: Converts the NDJSON files to Parquet format using DuckDB.
+   Files larger than MAX_FILE_SIZE are cut into (file, start, end) shards on newline
+   boundaries, so that each DuckDB task only reads a bounded piece. A shard is
+   streamed to DuckDB through a named pipe, straight from a memory map of the NDJSON
+   file: there is no second copy of the data on disk. This is done in two phases:
+   - Phase 1: Each NDJSON shard is converted to a mini Parquet file in parallel
+   - Phase 2: All mini Parquet files are merged into a single final Parquet file,
+     sorted by country then along a Hilbert curve
+
+   Each part also reports its bbox and geometry types; they are reduced in Python
+   into the GeoParquet `geo` metadata, written by the merge itself, so the final
+   file is written exactly once.
+
+The shard size (MAX_FILE_SIZE) trades off two pressures:
 - Small enough to keep each DuckDB task within its per-worker memory_limit.
-- Large enough to keep the chunk count (and thus merge/filesystem overhead) low.
+- Large enough to keep the shard count (and thus merge/filesystem overhead) low.
 Note this is independent of `maximum_object_size` in _ndjson_to_parquet, which
-caps a single JSON object (one feature), not the chunk file.
+caps a single JSON object (one feature), not the shard.
 
 This approach, while more complex than direct conversion, ensures reliability
 regardless of the input GeoJSON file sizes.
@@ -37,16 +39,18 @@ regardless of the input GeoJSON file sizes.
 
 import json
 import logging
+import mmap
 import os
+import re
 import shutil
+import threading
 import duckdb
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 from src.pipeline.constants import (
     GEOJSON_DIR,
     MAX_FILE_SIZE,
     NDGEOJSON_DIR,
-    SPLIT_DIR,
     WORKERS,
 )
 
@@ -55,8 +59,57 @@ logger = logging.getLogger(__name__)
 
 _NDJSON_COLS = "{id: 'VARCHAR', properties: 'JSON', geometry: 'JSON'}"
 
+# Typed parquet column → ATP property. Every other property goes to the
+# `tags` MAP(VARCHAR, VARCHAR) column.
+ATP_COLUMNS = {
+    "country": "addr:country",
+    "city": "addr:city",
+    "postcode": "addr:postcode",
+    "brand": "brand",
+    "brand_wikidata": "brand:wikidata",
+    "name": "name",
+    "opening_hours": "opening_hours",
+    "website": "website",
+    "phone": "phone",
+    "email": "email",
+    "end_date": "end_date",
+    "spider_id": "@spider",
+    "source_uri": "@source_uri",
+}
+
+# Flattens the `properties` JSON of an NDJSON feature into ATP_COLUMNS + tags.
+_FLATTEN_COLUMNS = ",\n".join(
+    [f"properties->>'$.{key}' AS {column}" for column, key in ATP_COLUMNS.items()]
+    + [
+        "map_from_entries(list_filter("
+        """map_entries(json_transform(properties, '"MAP(VARCHAR, VARCHAR)"')), """
+        "e -> e.key NOT IN ("
+        + ", ".join(f"'{key}'" for key in ATP_COLUMNS.values())
+        + "))) AS tags"
+    ]
+)
+
+# Features kept in atp_fr: French address with a valid postcode. Applied while
+# converting each shard (unless keep_world) and again by import_atp.
+FR_FILTER = """
+    country = 'FR'
+    AND REGEXP_MATCHES(COALESCE(postcode, ''), '^(2[AB]|[0-9]{2})[0-9]{3}$')
+"""
+
+
+def convert_to_parquet(
+    input_dir: Path, output_path: Path, keep_world: bool = False
+) -> None:
+    """Convert a directory of NDJSON files into one parquet file.
 
-def convert_to_parquet(input_dir: Path, output_path: Path) -> None:
+    The properties are flattened into the typed ATP_COLUMNS plus a `tags` map.
+    Rows are sorted by country, then along a Hilbert curve, so that each row
+    group covers a small area: readers filtering on the `bbox` column (the
+    GeoParquet bbox covering) skip most of the file. Per-brand reads are
+    pruned by the bloom filters on brand_wikidata.
+
+    Only the features matching FR_FILTER are kept, unless keep_world is set.
+    """
     output_path.parent.mkdir(parents=True, exist_ok=True)
     if output_path.exists():
         output_path.unlink()
@@ -73,22 +126,30 @@ def convert_to_parquet(input_dir: Path, output_path: Path) -> None:
         with duckdb.connect() as con:
             con.install_extension("spatial")
 
-        # Step 1: each NDJSON file → mini parquet (parallelized, max 16 MB input each)
-        logger.info("Step 1/2 — converting %d NDJSON files to parquet...", len(files))
+        # Step 1: each NDJSON shard → mini parquet (parallelized, ~MAX_FILE_SIZE input each)
+        shards = [shard for f in files for shard in _ndjson_shards(f)]
+        logger.info(
+            "Step 1/2 — converting %d NDJSON files (%d shards) to parquet...",
+            len(files),
+            len(shards),
+        )
 
-        def convert_one(args: tuple) -> Path:
-            i, file_path = args
+        def convert_one(args: tuple) -> tuple[Path, tuple]:
+            i, shard = args
             out = duck_temp / f"part_{i:06d}.parquet"
-            logger.info("[%d/%d] %s", i + 1, len(files), file_path.name)
-            _ndjson_to_parquet(file_path, out)
-            return out
+            logger.info("[%d/%d] %s", i + 1, len(shards), shard[0].name)
+            stats = _ndjson_to_parquet(
+                shard, out, duck_temp / f"part_{i:06d}.fifo", keep_world
+            )
+            return out, stats
 
         with ThreadPoolExecutor(max_workers=WORKERS) as executor:
-            parts = list(executor.map(convert_one, enumerate(files)))
+            results = list(executor.map(convert_one, enumerate(shards)))
 
-        parts = [p for p in parts if p.exists() and p.stat().st_size > 0]
+        parts = [p for p, _ in results if p.exists() and p.stat().st_size > 0]
         if not parts:
             raise RuntimeError("No parquet parts generated")
+        geo_meta = _geoparquet_metadata([stats for _, stats in results])
 
         # Step 2: merge all mini parquets → final parquet (parquet→parquet streams fine)
         logger.info("Step 2/2 — merging %d parquet parts...", len(parts))
@@ -98,42 +159,172 @@ def convert_to_parquet(input_dir: Path, output_path: Path) -> None:
             con.load_extension("spatial")
             con.execute(f"SET threads={WORKERS}")
             con.execute("SET memory_limit='2GB'")
+            if geo_meta is None:
+                # No feature at all: let DuckDB write its default metadata.
+                options = ""
+            else:
+                # Our own `geo` metadata, from the per-part statistics —
+                # no scan of the merged file needed.
+                options = (
+                    ", GEOPARQUET_VERSION 'NONE'"
+                    f", KV_METADATA {{geo: '{json.dumps(geo_meta)}'}}"
+                )
+            if geo_meta is None:
+                order = "country"
+            else:
+                xmin, ymin, xmax, ymax = geo_meta["columns"]["geom"]["bbox"]
+                order = (
+                    "country, ST_Hilbert(geom, "
+                    f"{{'min_x': {xmin}, 'min_y': {ymin}, 'max_x': {xmax}, 'max_y': {ymax}}}"
+                    "::BOX_2D)"
+                )
+            # Row groups smaller than the default keep the per-row-group
+            # bbox (and brand_wikidata bloom filters) selective.
             con.execute(f"""
-                COPY (SELECT * FROM read_parquet('{glob_parts}'))
+                COPY (
+                    SELECT * FROM read_parquet('{glob_parts}')
+                    ORDER BY {order}
+                )
                 TO '{str(output_path)}'
-                (FORMAT PARQUET, COMPRESSION 'ZSTD')
+                (FORMAT PARQUET, COMPRESSION 'ZSTD', ROW_GROUP_SIZE 65536,
+                 BLOOM_FILTER_FALSE_POSITIVE_RATIO 0.01{options})
             """)
 
-            bbox_res = con.execute(f"""
-                SELECT
-                    min(ST_XMin(geom)), min(ST_YMin(geom)),
-                    max(ST_XMax(geom)), max(ST_YMax(geom))
-                FROM read_parquet('{str(output_path)}')
-            """).fetchone()
-
-            geom_types = [
-                t[0]
-                for t in con.execute(
-                    f"SELECT DISTINCT ST_GeometryType(geom) FROM read_parquet('{str(output_path)}')"
-                ).fetchall()
-                if t and t[0] is not None
-            ]
-
     finally:
         shutil.rmtree(duck_temp, ignore_errors=True)
 
-    _write_geoparquet_metadata(output_path, bbox_res, geom_types)
     logger.info("Created %s", output_path)
 
 
-def _ndjson_to_parquet(file_path: Path, out_path: Path) -> None:
+# ST_GeometryType → GeoParquet geometry type name
+_GEOPARQUET_TYPES = {
+    "POINT": "Point",
+    "LINESTRING": "LineString",
+    "POLYGON": "Polygon",
+    "MULTIPOINT": "MultiPoint",
+    "MULTILINESTRING": "MultiLineString",
+    "MULTIPOLYGON": "MultiPolygon",
+    "GEOMETRYCOLLECTION": "GeometryCollection",
+}
+
+
+def _geoparquet_metadata(part_stats: list) -> dict | None:
+    """Reduce the (xmin, ymin, xmax, ymax, geometry types) of every part into
+    the GeoParquet ``geo`` metadata, or None if no part holds a feature.
+
+    No ``crs`` member: GeoParquet then means OGC:CRS84, i.e. WGS 84 lon/lat.
+    """
+    part_stats = [st for st in part_stats if st and st[0] is not None]
+    if not part_stats:
+        return None
+    xmins, ymins, xmaxs, ymaxs, types = zip(*part_stats)
+    bbox = [min(xmins), min(ymins), max(xmaxs), max(ymaxs)]
+    geometry_types = sorted(
+        {_GEOPARQUET_TYPES.get(t, t) for part_types in types for t in part_types}
+    )
+    return {
+        "version": "1.1.0",
+        "primary_column": "geom",
+        "columns": {
+            "geom": {
+                "encoding": "WKB",
+                "geometry_types": geometry_types,
+                "bbox": bbox,
+                # Row-group statistics of these fields bound each row group.
+                "covering": {
+                    "bbox": {
+                        corner: ["bbox", corner]
+                        for corner in ("xmin", "ymin", "xmax", "ymax")
+                    }
+                },
+            }
+        },
+    }
+
+
+def _ndjson_shards(file_path: Path) -> list[tuple[Path, int, int]]:
+    """Cut an NDJSON file into (file, start, end) byte ranges of about MAX_FILE_SIZE.
+
+    Each range ends right after a newline — the one ending the line that
+    crosses the size limit — so every shard holds whole features.
+    """
+    size = file_path.stat().st_size
+    if size <= MAX_FILE_SIZE:
+        return [(file_path, 0, size)]
+
+    shards = []
+    with open(file_path, "rb") as f, mmap.mmap(
+        f.fileno(), 0, access=mmap.ACCESS_READ
+    ) as mm:
+        start = 0
+        while start < size:
+            nl = mm.find(b"\n", min(start + MAX_FILE_SIZE, size) - 1)
+            end = size if nl < 0 else nl + 1
+            shards.append((file_path, start, end))
+            start = end
+    return shards
+
+
+def _ndjson_to_parquet(
+    shard: tuple[Path, int, int],
+    out_path: Path,
+    fifo_path: Path,
+    keep_world: bool = False,
+) -> tuple:
+    """Convert one shard; returns the part statistics (see _ndjson_source_to_parquet)."""
+    file_path, start, end = shard
+    if start == 0 and end == file_path.stat().st_size:
+        return _ndjson_source_to_parquet(file_path, out_path, keep_world)
+
+    # DuckDB only reads whole files: hand it the byte range through a named
+    # pipe, fed from a memory map of the NDJSON file.
+    os.mkfifo(fifo_path)
+    errors = []
+
+    def feed():
+        try:
+            with open(file_path, "rb") as f, mmap.mmap(
+                f.fileno(), 0, access=mmap.ACCESS_READ
+            ) as mm, memoryview(mm) as view, open(fifo_path, "wb") as pipe:
+                pipe.write(view[start:end])
+        except BrokenPipeError:
+            pass  # DuckDB stopped reading; its own error is the one to report
+        except Exception as exc:
+            errors.append(exc)
+
+    feeder = threading.Thread(target=feed, daemon=True)
+    feeder.start()
+    try:
+        stats = _ndjson_source_to_parquet(fifo_path, out_path, keep_world)
+    finally:
+        while feeder.is_alive():
+            # DuckDB failed before opening the pipe: open and close its read
+            # end until the feeder gets unblocked, then a broken pipe.
+            os.close(os.open(fifo_path, os.O_RDONLY | os.O_NONBLOCK))
+            feeder.join(timeout=0.1)
+        fifo_path.unlink()
+    if errors:
+        raise errors[0]
+    return stats
+
+
+def _ndjson_source_to_parquet(
+    file_path: Path, out_path: Path, keep_world: bool = False
+) -> tuple:
+    """Write the features of an NDJSON source to a parquet part.
+
+    Returns (xmin, ymin, xmax, ymax, geometry types) of the part, read back
+    from the part itself: its bbox columns hold the extent of every feature.
+    """
+    where = "TRUE" if keep_world else FR_FILTER
+    columns = ", ".join(ATP_COLUMNS)
     with duckdb.connect() as con:
         con.load_extension("spatial")
         con.execute("SET memory_limit='512MB'")
         con.execute("SET threads=1")
         con.execute(f"""
             COPY (
-                SELECT id, properties, geom,
+                SELECT id, {columns}, tags, geom,
                     {{
                         'xmin': ST_XMin(geom),
                         'ymin': ST_YMin(geom),
@@ -143,7 +334,7 @@ def _ndjson_to_parquet(file_path: Path, out_path: Path) -> None:
                 FROM (
                     SELECT
                         id,
-                        properties,
+                        {_FLATTEN_COLUMNS},
                         ST_GeomFromGeoJSON(geometry::VARCHAR) AS geom
                     FROM read_json('{file_path.as_posix()}',
                         format='newline_delimited',
@@ -151,47 +342,23 @@ def _ndjson_to_parquet(file_path: Path, out_path: Path) -> None:
                         maximum_object_size=16777216)
                     WHERE geometry IS NOT NULL
                 )
+                WHERE {where}
             ) TO '{out_path.as_posix()}' (FORMAT PARQUET, COMPRESSION 'ZSTD')
         """)
-
-
-def _write_geoparquet_metadata(output_path: Path, bbox_res, geom_types: list) -> None:
-    try:
-        import pyarrow.parquet as pq
-
-        if not bbox_res or any(v is None for v in bbox_res):
-            return
-
-        table = pq.read_table(str(output_path), memory_map=True)
-        xmin, ymin, xmax, ymax = bbox_res
-        geo_meta = {
-            "version": "1.1.0",
-            "primary_column": "geom",
-            "columns": {
-                "geom": {
-                    "encoding": "WKB",
-                    "geometry_types": geom_types or ["Unknown"],
-                    "crs": "EPSG:4326",
-                }
-            },
-            "bbox": [xmin, ymin, xmax, ymax],
-        }
-        existing_md = table.schema.metadata or {}
-        new_md = {
-            **existing_md,
-            b"geo": json.dumps(geo_meta, ensure_ascii=False).encode(),
-        }
-        pq.write_table(
-            table.replace_schema_metadata(new_md), str(output_path), compression="ZSTD"
-        )
-
-    except ImportError:
-        logger.info("pyarrow not available — skipping GeoParquet metadata")
+        return con.execute(f"""
+            SELECT
+                min(bbox.xmin), min(bbox.ymin), max(bbox.xmax), max(bbox.ymax),
+                list(DISTINCT ST_GeometryType(geom)::VARCHAR)
+            FROM read_parquet('{out_path.as_posix()}')
+        """).fetchone()
 
 
 def convert_geojson_to_ndgeojson(geojson_dir: Path, ndgeojson_dir: Path) -> None:
     """Convert FeatureCollection GeoJSON to NDJSON (one feature per line).
 
+    Files are converted in a process pool: the work is CPU-bound Python, which
+    threads would serialize on the GIL.
+
     Re-entrant: keeps any NDJSON already produced and deletes each source
     geojson as soon as its NDJSON is durably written. A crash can be resumed by
     re-running this step — only the un-deleted geojson files are reprocessed.
@@ -202,7 +369,9 @@ def convert_geojson_to_ndgeojson(geojson_dir: Path, ndgeojson_dir: Path) -> None
     if not files:
         raise FileNotFoundError(f"No .geojson files in {geojson_dir}")
 
-    with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+    # Largest first, so that the big spiders do not end up alone at the tail.
+    files.sort(key=lambda f: f.stat().st_size, reverse=True)
+    with ProcessPoolExecutor(max_workers=WORKERS) as executor:
         futures = [
             executor.submit(_geojson_to_ndgeojson_single, f, ndgeojson_dir)
             for f in files
@@ -213,6 +382,26 @@ def convert_geojson_to_ndgeojson(geojson_dir: Path, ndgeojson_dir: Path) -> None
     logger.info("Converted FC geojson to NDJSON")
 
 
+# Bytes read from a FeatureCollection at a time by _geojson_to_ndgeojson_single.
+_CONVERT_BLOCK_SIZE = 64 * 1024 * 1024
+# Trailing whitespace of a line, then the comma separating two features.
+_TRAILING_SPACES = re.compile(rb"[ \t\r\f\v]+\n")
+_TRAILING_COMMA = re.compile(rb",\n")
+_EMPTY_LINES = re.compile(rb"\n\n+")
+
+
+def _features_block(lines: bytes) -> bytes:
+    """Turn complete FeatureCollection lines into NDJSON lines.
+
+    Per line: strip the trailing whitespace, then one trailing comma, and drop
+    the line if nothing is left. Done with regexes over the whole block rather
+    than a Python loop per line.
+    """
+    lines = _TRAILING_SPACES.sub(b"\n", lines)
+    lines = _TRAILING_COMMA.sub(b"\n", lines)
+    return _EMPTY_LINES.sub(b"\n", lines).lstrip(b"\n")
+
+
 def _geojson_to_ndgeojson_single(in_path: Path, NDGEOJSON_DIR: Path) -> None:
     out_path = NDGEOJSON_DIR / in_path.name
 
@@ -231,21 +420,29 @@ def _geojson_to_ndgeojson_single(in_path: Path, NDGEOJSON_DIR: Path) -> None:
     written = 0
 
     with open(in_path, "rb") as f_in, open(tmp_path, "wb") as f_out:
-        first = True
-        prev = None
-        for line in f_in:
-            if first:
-                first = False
-                continue  # skip FeatureCollection header
-            if prev is not None:
-                clean = prev.rstrip()
-                if clean.endswith(b","):
-                    clean = clean[:-1]
-                if clean:
-                    f_out.write(clean + b"\n")
-                    written += 1
-            prev = line
-        # prev is the last line `]}` — skip it
+        pending = b""
+        header_skipped = False
+        while True:
+            block = f_in.read(_CONVERT_BLOCK_SIZE)
+            pending += block
+            if not header_skipped:
+                nl = pending.find(b"\n")
+                if nl < 0:
+                    if block:
+                        continue
+                    break
+                pending = pending[nl + 1 :]  # skip FeatureCollection header
+                header_skipped = True
+            # Convert the complete lines but always hold the last one back:
+            # once the input is exhausted, it is the `]}` footer — skip it.
+            cut = pending.rfind(b"\n", 0, len(pending) - 1) + 1
+            features = _features_block(pending[:cut])
+            pending = pending[cut:]
+            if features:
+                f_out.write(features)
+                written += features.count(b"\n")
+            if not block:
+                break
         f_out.flush()
         os.fsync(f_out.fileno())
 
@@ -259,80 +456,6 @@ def _geojson_to_ndgeojson_single(in_path: Path, NDGEOJSON_DIR: Path) -> None:
     in_path.unlink()  # source consumed — free it immediately
 
 
-def split_ndgeojson(NDGEOJSON_DIR: Path, split_dir: Path) -> None:
-    """Split NDJSON files larger than MAX_FILE_SIZE; move smaller files as-is.
-
-    Re-entrant: keeps any chunks already produced and consumes each source
-    NDJSON in place (move or split+unlink), so a crash is resumed by simply
-    re-running — only the un-consumed NDJSON files are reprocessed.
-    """
-    split_dir.mkdir(parents=True, exist_ok=True)
-
-    files = sorted(NDGEOJSON_DIR.glob("*.geojson"))
-    if not files:
-        raise FileNotFoundError(f"No .geojson files in {NDGEOJSON_DIR}")
-
-    with ThreadPoolExecutor(max_workers=WORKERS) as executor:
-        futures = [
-            executor.submit(_split_or_move_ndgeojson, f, split_dir) for f in files
-        ]
-        for fut in futures:
-            fut.result()
-
-    logger.info("Split complete")
-
-
-def _split_or_move_ndgeojson(in_path: Path, split_dir: Path) -> None:
-    if in_path.stat().st_size <= MAX_FILE_SIZE:
-        # move is atomic on same fs and deletes the source — re-entrant as-is.
-        shutil.move(str(in_path), split_dir / in_path.name)
-        return
-    _split_ndgeojson_file(in_path, split_dir)
-
-
-def _split_ndgeojson_file(in_path: Path, split_dir: Path) -> None:
-    """Split a >MAX_FILE_SIZE NDJSON file into <=MAX_FILE_SIZE chunks named `{base}_{n}`.
-
-    Reads one window (<=MAX_FILE_SIZE) at a time via seek instead of loading the whole
-    file, so peak RAM is one window, not the full (~2 GB) file. The source is
-    kept intact until every chunk is written, then unlinked.
-
-    Crash-safe: because the source is untouched until the final unlink and the
-    chunk boundaries are deterministic, a crash mid-split is recovered by simply
-    re-running — the same `_1, _2, …` chunks are regenerated byte-identically
-    (overwriting any partial leftovers), with no loss and no duplicates.
-    """
-    base_name = in_path.stem
-    size = in_path.stat().st_size
-
-    chunk_num = 0
-    start = 0
-    with open(in_path, "rb") as f:
-        while start < size:
-            end = min(start + MAX_FILE_SIZE, size)
-            if end < size:
-                f.seek(start)
-                window = f.read(end - start)
-                nl = window.rfind(b"\n")
-                if nl <= 0:
-                    # Single line > MAX_FILE_SIZE — emit it whole rather than hard-split
-                    # (a hard split would corrupt the JSON object). Impossible in theory
-                    boundary = end
-                else:
-                    boundary = start + nl + 1
-            else:
-                boundary = size
-
-            f.seek(start)
-            chunk = f.read(boundary - start)
-            chunk_num += 1
-            (split_dir / f"{base_name}_{chunk_num}.geojson").write_bytes(chunk)
-            start = boundary
-
-    in_path.unlink()  # all chunks written — source consumed
-    logger.debug("Split %s into %d chunks", in_path.name, chunk_num)
-
-
 # Wrapper functions for pipeline runner (no parameters)
 def convert_atp() -> None:
     """Step: Convert FeatureCollection GeoJSON to NDJSON."""
@@ -340,11 +463,3 @@ def convert_atp() -> None:
         logger.info("No GeoJSON files found, skipping conversion")
         return
     convert_geojson_to_ndgeojson(GEOJSON_DIR, NDGEOJSON_DIR)
-
-
-def split_atp() -> None:
-    """Step: Split NDJSON files larger than MAX_FILE_SIZE."""
-    if not NDGEOJSON_DIR.exists() or not any(NDGEOJSON_DIR.glob("*.geojson")):
-        logger.info("No NDJSON files found, skipping split")
-        return
-    split_ndgeojson(NDGEOJSON_DIR, SPLIT_DIR)
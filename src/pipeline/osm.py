@@ -2,17 +2,47 @@ import logging
 import os
 import shutil
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from email.utils import parsedate_to_datetime
 from src.pipeline.constants import (
     PROJECT_ROOT,
+    FLAT_NODES_PATH,
     GEOFABRIK_REGIONS,
+    OSM_CHANGES_DIR,
+    PREVIOUS_FLAT_NODES_PATH,
+    SHADOW_FLAT_NODES_PATH,
 )
 
-import requests
-
 from src.config import get_database, get_pipeline
-from src.pipeline._db import connect, last_import_date, record_import
+from src.pipeline._db import (
+    SHADOW_SCHEMA,
+    connect,
+    drop_relation,
+    has_column,
+    is_generated,
+    last_import_date,
+    prepare_shadow,
+    rebuild_requested,
+    record_import,
+    relation_kind,
+    request_rebuild,
+    retire,
+    swap_in,
+)
+from src.pipeline._replication import (
+    changed_objects,
+    download_changes,
+    fetch_state,
+    fetch_state_text,
+    parse_state,
+)
+from src.pipeline._upstream import (
+    fetch_all,
+    fetch_content_length,
+    fetch_last_modified,
+)
+from src.matching import NORM_COLUMNS
+from src.pipeline.atp2osm import invalidate_matches
 from src.utils import delete_file_if_exists, download_large_file
 
 logger = logging.getLogger(__name__)
@@ -25,21 +55,14 @@ def _geofabrik_timestamp(region: dict) -> datetime:
     header of the PBF file for regions that don't publish a state file.
     """
     try:
-        resp = requests.get(region["state_url"], timeout=30)
-        resp.raise_for_status()
-        for line in resp.text.splitlines():
-            if line.startswith("timestamp="):
-                ts = line[len("timestamp="):].replace("\\:", ":")
-                return datetime.fromisoformat(ts.replace("Z", "+00:00"))
+        return parse_state(fetch_state_text(region["updates_url"]))[1]
     except Exception:
         pass
 
     # Fallback: Last-Modified header on the PBF file
-    resp = requests.head(region["url"], timeout=30, allow_redirects=True)
-    resp.raise_for_status()
-    last_modified = resp.headers.get("Last-Modified")
+    last_modified = fetch_last_modified(region["url"])
     if last_modified:
-        return parsedate_to_datetime(last_modified)
+        return last_modified
 
     raise ValueError(f"Cannot determine data timestamp for {region['url']}")
 
@@ -49,59 +72,190 @@ def _newest_geofabrik_timestamp() -> datetime:
 
     We refresh when any region has data newer than our last import,
     so we compare last_import_date against the maximum (newest) timestamp.
+    The regions are queried concurrently, and only once per pipeline run.
     """
-    timestamps = []
-    for name, region in GEOFABRIK_REGIONS.items():
+
+    def timestamp(item):
+        name, region = item
         try:
-            timestamps.append(_geofabrik_timestamp(region))
+            return _geofabrik_timestamp(region)
         except Exception as exc:
             logger.error("Could not fetch timestamp for %s: %s", name, exc)
             raise
+
+    timestamps = fetch_all(timestamp, GEOFABRIK_REGIONS.items())
     if not timestamps:
         raise RuntimeError("No Geofabrik timestamps could be fetched")
     return max(timestamps)
 
 
-def download_pbf():
-    newest_ts = _newest_geofabrik_timestamp()
+def _replicated_regions(conn) -> dict:
+    """Return {region: (sequence_number, timestamp)} of the regions kept current by diffs."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT region, sequence_number, timestamp FROM osm_replication")
+        return {region: (seq, ts) for region, seq, ts in cur.fetchall()}
+
+
+def _slim_ready(conn) -> bool:
+    """True when the live slim database takes diffs and per-region re-imports.
+
+    Databases imported with an older style (points/polygons without the
+    region or the match columns, or with match keys normalized by the style)
+    need one more full import.
+    """
+    if not FLAT_NODES_PATH.exists():
+        return False
+    with conn.cursor() as cur:
+        return all(
+            has_column(cur, table, column)
+            for table, column in (
+                ("points", "region"),
+                ("polygons", "region"),
+                ("polygons", "centroid"),
+            )
+        ) and all(
+            is_generated(cur, table, "name_norm") for table in ("points", "polygons")
+        )
 
-    conn = connect()
-    try:
-        last_date = last_import_date(conn, "osm")
 
+def _osm_data_timestamp(conn) -> datetime:
+    replicated = _replicated_regions(conn)
+    if replicated:
+        return max(ts for _, ts in replicated.values())
+    return _newest_geofabrik_timestamp()
+
+
+def _regions_to_import(conn) -> dict:
+    """Return the regions whose PBF must be imported, {} if none.
+
+    Without a live slim database: every region (full import), once any of them
+    is newer than the last import. Otherwise only the regions that diffs do not
+    keep current, and whose extract is newer than their own last import.
+    """
+    if not _slim_ready(conn):
+        if FLAT_NODES_PATH.exists():
+            logger.info("OSM tables are from an older style, re-importing all regions...")
+            return dict(GEOFABRIK_REGIONS)
+        newest_ts = _newest_geofabrik_timestamp()
+        last_date = last_import_date(conn, "osm")
         if last_date and last_date >= newest_ts:
             logger.info(
                 "OSM data already up-to-date (last import: %s), skipping download",
                 last_date.date(),
             )
             record_import(conn, "osm", last_date, "skipped")
-            return
+            return {}
+        logger.info(
+            "New OSM data available (newest: %s), downloading all regions...",
+            newest_ts.date(),
+        )
+        return dict(GEOFABRIK_REGIONS)
+
+    replicated = _replicated_regions(conn)
+    pending = {
+        name: region
+        for name, region in GEOFABRIK_REGIONS.items()
+        if name not in replicated
+    }
+    timestamps = fetch_all(_geofabrik_timestamp, pending.values())
+    stale = {}
+    for (name, region), ts in zip(pending.items(), timestamps):
+        last_date = last_import_date(conn, "osm", region=name)
+        if last_date is None or last_date < ts:
+            stale[name] = region
+    if stale:
+        logger.info("Re-importing region(s) not followed by diffs: %s", ", ".join(stale))
+    else:
+        logger.info("OSM database follows Geofabrik diffs, skipping full download")
+    return stale
+
+
+def download_pbf():
+    conn = connect()
+    try:
+        regions = _regions_to_import(conn)
     finally:
         conn.close()
+    if not regions:
+        return
 
-    logger.info("New OSM data available (newest: %s), downloading all regions...", newest_ts.date())
-    for name, region in GEOFABRIK_REGIONS.items():
+    def download(item):
+        name, region = item
         pbf_path = region["pbf_path"]
         if pbf_path.exists():
             logger.info("PBF %s already present, skipping", name)
-            continue
+            return
         logger.info("Downloading %s...", name)
         pbf_path.parent.mkdir(parents=True, exist_ok=True)
+        # Taken *before* the download: the PBF is at least this recent, so
+        # replaying diffs from this sequence on never misses a change.
         try:
-            download_large_file(region["url"], pbf_path)
-        except Exception:
-            delete_file_if_exists(pbf_path)
-            raise
+            region["state_path"].write_text(fetch_state_text(region["updates_url"]))
+        except Exception as exc:
+            logger.warning("No replication state for %s (%s), diffs disabled", name, exc)
+            delete_file_if_exists(region["state_path"])
+        # Only renamed to pbf_path once complete; on failure the .part file
+        # is kept so that the next run resumes it.
+        download_large_file(region["url"], pbf_path)
         logger.info("Downloaded %s", name)
 
+    # All regions at once, largest first: the small extracts download next to
+    # the France one instead of after it. download_slot caps the connections
+    # actually open per host.
+    with ThreadPoolExecutor(max_workers=len(regions)) as executor:
+        futures = [
+            executor.submit(download, item) for item in _largest_first(regions)
+        ]
+        for future in futures:
+            future.result()
+
+
+def _largest_first(regions: dict) -> list:
+    """The (name, region) items, largest extract first (HEAD sizes)."""
+    sizes = fetch_all(
+        lambda region: fetch_content_length(region["url"]) or 0, regions.values()
+    )
+    return [
+        item
+        for item, _ in sorted(
+            zip(regions.items(), sizes), key=lambda pair: pair[1], reverse=True
+        )
+    ]
+
+
+def _region_timestamp(region: dict) -> datetime:
+    """Data timestamp of a downloaded region: its saved state, else upstream."""
+    if region["state_path"].exists():
+        return parse_state(region["state_path"].read_text())[1]
+    return _geofabrik_timestamp(region)
+
+
+def _set_replication(cur, regions: dict):
+    """Replay diffs from the state seen when each region was downloaded."""
+    for name, region in regions.items():
+        if not region["state_path"].exists():
+            continue
+        seq, ts = parse_state(region["state_path"].read_text())
+        cur.execute(
+            """
+            INSERT INTO osm_replication (region, sequence_number, timestamp)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (region) DO UPDATE
+                SET sequence_number = EXCLUDED.sequence_number,
+                    timestamp = EXCLUDED.timestamp,
+                    updated_at = NOW()
+            """,
+            (name, seq, ts),
+        )
+
 
 def _require_free_space(path, needed_bytes):
     """Fast-fail if the filesystem holding `path` has less than `needed_bytes` free.
 
-    osm2pgsql --create drops and recreates points/polygons with CASCADE, which
-    also drops mv_places and mv_places_brand. If it then runs out of disk it
-    exits non-zero with the views already gone — leaving the site broken. Bail
-    out *before* that happens, with a clear message.
+    osm2pgsql --create drops and recreates points/polygons. If it then runs out
+    of disk it exits non-zero with the tables already gone, and the next
+    mv_places rebuild has nothing to read from. Bail out *before* that happens,
+    with a clear message.
     """
     free = shutil.disk_usage(path).free
     if free < needed_bytes:
@@ -112,123 +266,614 @@ def _require_free_space(path, needed_bytes):
         )
 
 
-def run_osm2pgsql():
-    pbf_paths = [
-        r["pbf_path"]
-        for r in GEOFABRIK_REGIONS.values()
-        if r["pbf_path"].exists()
-    ]
-    if not pbf_paths:
-        logger.info("No PBF files found, skipping osm2pgsql")
-        return
+# The normalized match keys, added to the tables osm2pgsql created as
+# generated columns: its COPYs name the columns they fill, and PostgreSQL
+# computes these from them, exactly as for atp_fr.
+_ADD_NORM_COLUMNS = "ALTER TABLE {table} " + ", ".join(
+    f"ADD COLUMN {column} TEXT GENERATED ALWAYS AS ({expression}) STORED"
+    for column, expression in NORM_COLUMNS.items()
+)
 
-    # Fast-fail on low disk before the destructive CASCADE-dropping import.
-    # Heuristic: need ~3x total PBF size (tables + indexes + temp), floor 15 GB.
-    # Override the floor with OSM2PGSQL_MIN_FREE_GB.
-    total_pbf = sum(p.stat().st_size for p in pbf_paths)
-    floor = get_pipeline().min_free_gb * 1e9
-    needed = max(floor, 3 * total_pbf)
-    _require_free_space(pbf_paths[0].parent, needed)
 
+# Tables osm2pgsql creates: the flex output ones (generic.lua) and the slim
+# middle ones. A full import moves them all to the previous schema first.
+OSM2PGSQL_TABLES = (
+    "points",
+    "polygons",
+    "planet_osm_nodes",
+    "planet_osm_ways",
+    "planet_osm_rels",
+    "osm2pgsql_properties",
+)
+
+
+def _osm2pgsql(*args, flat_nodes=FLAT_NODES_PATH, schema="public", region=None):
+    """Run osm2pgsql in slim mode, so that the database accepts --append diffs.
+
+    All tables go to `schema`: --middle-schema for the middle ones, and the
+    style reads OSM2PGSQL_SCHEMA for its own (unlike --schema, this works with
+    osm2pgsql < 1.9 too). The rows written are tagged with `region`, read by
+    the style from OSM2PGSQL_REGION.
+    """
     db = get_database()
-    logger.info("Importing %d PBF file(s) into PostGIS...", len(pbf_paths))
     env = os.environ.copy()
     env["PGPASSWORD"] = db.password
+    env["OSM2PGSQL_SCHEMA"] = schema
+    if region:
+        env["OSM2PGSQL_REGION"] = region
     subprocess.run(
         [
             "osm2pgsql",
             "--output", "flex",
             "-S", str(PROJECT_ROOT / "osm2pgsql" / "generic.lua"),
+            "--slim",
+            "--flat-nodes", str(flat_nodes),
+            "--middle-schema", schema,
             "-d", db.name,
             "-U", db.user,
             "-H", db.host,
             "-P", db.port,
-            *[str(p) for p in pbf_paths],
+            *args,
         ],
         check=True,
         env=env,
     )
 
-    for p in pbf_paths:
-        p.unlink()
-    logger.info("osm2pgsql import complete (%d file(s))", len(pbf_paths))
 
+def run_osm2pgsql():
+    regions = {
+        name: r
+        for name, r in GEOFABRIK_REGIONS.items()
+        if r["pbf_path"].exists()
+    }
+    if not regions:
+        logger.info("No PBF files found, skipping osm2pgsql")
+        return
 
-def setup_mv_places():
-    newest_ts = _newest_geofabrik_timestamp()
     conn = connect()
     try:
-        last_date = last_import_date(conn, "osm")
-        if last_date and last_date >= newest_ts:
-            logger.info("OSM views already up-to-date (%s), skipping", last_date.date())
-            record_import(conn, "osm", last_date, "skipped")
+        if _slim_ready(conn):
+            _reimport_regions(conn, regions)
+        else:
+            _import_all(conn, regions)
+        for name, region in regions.items():
+            record_import(conn, "osm", _region_timestamp(region), "success", region=name)
+    finally:
+        conn.close()
+
+    for region in regions.values():
+        region["pbf_path"].unlink()
+        delete_file_if_exists(region["state_path"])
+    logger.info("osm2pgsql import complete (%d file(s))", len(regions))
+
+
+def _import_all(conn, regions):
+    """Import every region into a new generation of the osm2pgsql tables.
+
+    One osm2pgsql run per region, so that each tags its rows: --create with the
+    largest extract, then --append of the others. osm2pgsql writes straight
+    into public: besides its tables, it creates indexes, functions and
+    properties in the --middle-schema, and none of them could be left behind
+    by a swap. The live generation moves to the previous schema first, with
+    its flat-nodes file; the web app only reads mv_places, which keeps
+    serving until osm-views rebuilds it.
+    """
+    pbf_paths = [r["pbf_path"] for r in regions.values()]
+
+    # Fast-fail on low disk: the new generation is imported next to the live one.
+    # Heuristic: need ~3x total PBF size (tables + indexes + temp), floor 15 GB.
+    # Override the floor with OSM2PGSQL_MIN_FREE_GB.
+    total_pbf = sum(p.stat().st_size for p in pbf_paths)
+    floor = get_pipeline().min_free_gb * 1e9
+    needed = max(floor, 3 * total_pbf)
+    _require_free_space(pbf_paths[0].parent, needed)
+
+    def forget_replication(cur):
+        # Nothing incremental may run on the tables until the import is done.
+        cur.execute("DELETE FROM osm_replication")
+        cur.execute("TRUNCATE osm_changes, osm_region_changes")
+        # Last, right before the commit: the flat-nodes file must follow
+        # the tables it belongs to.
+        os.replace(FLAT_NODES_PATH, PREVIOUS_FLAT_NODES_PATH)
+
+    delete_file_if_exists(SHADOW_FLAT_NODES_PATH)
+    if FLAT_NODES_PATH.exists():
+        # A complete slim generation: keep it for rollback.
+        delete_file_if_exists(PREVIOUS_FLAT_NODES_PATH)
+        retire(conn, *OSM2PGSQL_TABLES, then=forget_replication)
+    else:
+        # The tables of a run that crashed before its end, or of a legacy
+        # (non-slim) import, which cannot take diffs nor be rolled back to.
+        with conn.cursor() as cur:
+            for table in OSM2PGSQL_TABLES:
+                drop_relation(cur, table)
+        conn.commit()
+
+    logger.info("Importing %d PBF file(s) into PostGIS...", len(pbf_paths))
+    ordered = sorted(
+        regions.items(),
+        key=lambda item: item[1]["pbf_path"].stat().st_size,
+        reverse=True,
+    )
+    # The flat-nodes file only takes its name once the tables are complete,
+    # so that _slim_ready() stays false after a crash mid-import.
+    for i, (name, region) in enumerate(ordered):
+        _osm2pgsql(
+            "--append" if i else "--create",
+            str(region["pbf_path"]),
+            flat_nodes=SHADOW_FLAT_NODES_PATH,
+            region=name,
+        )
+
+    with conn.cursor() as cur:
+        # One rewrite of each table, once every region is in.
+        for table in ("points", "polygons"):
+            cur.execute(_ADD_NORM_COLUMNS.format(table=table))
+        # The diffs to replay start from the state seen at download time.
+        cur.execute("DELETE FROM osm_replication")
+        cur.execute("TRUNCATE osm_changes, osm_region_changes")
+        _set_replication(cur, regions)
+        # New points/polygons: osm-views rebuilds mv_places from scratch,
+        # while the current one keeps serving.
+        request_rebuild(cur, "mv_places")
+        invalidate_matches(cur)
+        os.replace(SHADOW_FLAT_NODES_PATH, FLAT_NODES_PATH)
+    conn.commit()
+
+
+def _reimport_regions(conn, regions):
+    """Re-import some regions into the live slim database.
+
+    Their rows are deleted from points/polygons, then their PBF is applied with
+    --append: objects still there come back, deleted ones stay gone. The other
+    regions are left untouched, and osm-views only re-derives the slice of
+    mv_places of these regions (osm_region_changes).
+
+    Geofabrik extracts overlap at their borders: an object in two of them
+    keeps the region that owned it before, so that it stays in exactly one
+    slice of mv_places. An object gone from the re-imported extract but still
+    in a neighbouring one only comes back with that region's next diff or
+    import.
+
+    Re-entrant: a crash before the bookkeeping below is recovered by re-running,
+    the PBF files being kept until then.
+    """
+    names = list(regions)
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM points WHERE region = ANY(%s)", (names,))
+        cur.execute("DELETE FROM polygons WHERE region = ANY(%s)", (names,))
+    conn.commit()
+
+    for name, region in regions.items():
+        logger.info("Re-importing %s...", name)
+        _osm2pgsql("--append", str(region["pbf_path"]), region=name)
+
+    with conn.cursor() as cur:
+        # osm2pgsql tagged the shared objects with the re-imported region:
+        # give them back to their owner, still recorded in mv_places, and
+        # queue them so that their row in the owner's slice is re-derived.
+        if has_column(cur, "mv_places", "region"):
+            cur.execute(
+                """
+                WITH kept AS (
+                    UPDATE points p SET region = m.region
+                    FROM mv_places m
+                    WHERE p.region = ANY(%(names)s)
+                      AND m.osm_id = p.node_id AND m.node_type = 'node'
+                      AND NOT m.region = ANY(%(names)s)
+                    RETURNING p.node_id
+                )
+                INSERT INTO osm_changes (osm_type, osm_id)
+                SELECT 'N', node_id FROM kept
+                ON CONFLICT DO NOTHING
+                """,
+                {"names": names},
+            )
+            cur.execute(
+                """
+                WITH kept AS (
+                    UPDATE polygons p SET region = m.region
+                    FROM mv_places m
+                    WHERE p.region = ANY(%(names)s)
+                      AND m.osm_id = p.area_id
+                      AND m.node_type = CASE p.osm_type WHEN 'W' THEN 'way' ELSE 'relation' END
+                      AND NOT m.region = ANY(%(names)s)
+                    RETURNING p.osm_type, p.area_id
+                )
+                INSERT INTO osm_changes (osm_type, osm_id)
+                SELECT osm_type, CASE osm_type WHEN 'R' THEN -area_id ELSE area_id END
+                FROM kept
+                ON CONFLICT DO NOTHING
+                """,
+                {"names": names},
+            )
+        _set_replication(cur, regions)
+        cur.executemany(
+            "INSERT INTO osm_region_changes (region) VALUES (%s) ON CONFLICT DO NOTHING",
+            [(name,) for name in names],
+        )
+    conn.commit()
+
+
+# osm2pgsql re-processes the ways and relations of a moved node, but the
+# change files only list the node: queue the polygons of these parents, read
+# from the middle tables. The predicates are those of osm2pgsql's own lookups,
+# so that they use its indexes: the way nodes are indexed by bucket
+# (planet_osm_index_bucket(), unless --middle-way-node-index-id-shift 0), the
+# relation members by the parts array (legacy middle format) or through
+# planet_osm_member_ids() (new format, the default from osm2pgsql 2.0).
+_QUEUE_MOVED_WAYS = """
+    INSERT INTO new_osm_changes (osm_type, osm_id)
+    SELECT 'W', w.id
+    FROM planet_osm_ways w
+    WHERE {nodes_match}
+      AND EXISTS (
+          SELECT 1 FROM polygons p WHERE p.area_id = w.id AND p.osm_type = 'W'
+      )
+"""
+
+# Relations with a moved node, a changed way or a way queued above.
+_QUEUE_MOVED_RELATIONS = """
+    INSERT INTO new_osm_changes (osm_type, osm_id)
+    SELECT 'R', r.id
+    FROM planet_osm_rels r
+    WHERE ({members_match})
+      AND EXISTS (
+          SELECT 1 FROM polygons p WHERE p.area_id = -r.id AND p.osm_type = 'R'
+      )
+"""
+
+_CHANGED_IDS = "(SELECT array_agg(osm_id) FROM new_osm_changes WHERE osm_type {types})"
+
+
+def _middle_format(cur):
+    """'legacy' or 'new', the layout of the osm2pgsql middle tables."""
+    # osm2pgsql < 1.9 keeps no properties and only knows the legacy format.
+    if relation_kind(cur, "osm2pgsql_properties") is None:
+        return "legacy"
+    cur.execute("SELECT value FROM osm2pgsql_properties WHERE property = 'db_format'")
+    row = cur.fetchone()
+    return "new" if row and row[0] == "2" else "legacy"
+
+
+def _queue_moved_parents(cur):
+    nodes = _CHANGED_IDS.format(types="= 'N'")
+    ways = _CHANGED_IDS.format(types="= 'W'")
+    cur.execute("SELECT to_regproc('planet_osm_index_bucket') IS NOT NULL")
+    if cur.fetchone()[0]:
+        # The bucket overlap narrows down through the index, the node
+        # overlap rechecks.
+        nodes_match = (
+            f"planet_osm_index_bucket(w.nodes) && planet_osm_index_bucket({nodes}) "
+            f"AND w.nodes && {nodes}"
+        )
+    else:
+        nodes_match = f"w.nodes && {nodes}"
+    cur.execute(_QUEUE_MOVED_WAYS.format(nodes_match=nodes_match))
+
+    if _middle_format(cur) == "new":
+        members_match = (
+            f"planet_osm_member_ids(r.members, 'N'::char(1)) && {nodes} "
+            f"OR planet_osm_member_ids(r.members, 'W'::char(1)) && {ways}"
+        )
+    else:
+        # parts mixes node, way and relation ids: an id shared across types
+        # only queues a relation more, which is harmless.
+        members_match = "r.parts && " + _CHANGED_IDS.format(types="IN ('N', 'W')")
+    cur.execute(_QUEUE_MOVED_RELATIONS.format(members_match=members_match))
+
+
+def update_osm():
+    """Apply the Geofabrik diffs published since the last import or update.
+
+    Every region whose state.txt moved forward gets its missing change files
+    downloaded and applied with osm2pgsql --append, one run per region so that
+    the rows keep their region. The touched objects are queued in osm_changes
+    for osm-views. Regions not followed by diffs are re-imported from their
+    PBF by osm-download / osm-import instead.
+
+    Re-entrant: replaying a diff that is already applied is harmless, so a crash
+    between osm2pgsql and the bookkeeping below is recovered by re-running.
+    """
+    conn = connect()
+    try:
+        replicated = _replicated_regions(conn)
+        if not replicated or not _slim_ready(conn):
+            logger.info("No slim import to update, skipping")
+            return
+
+        regions = {
+            name: region
+            for name, region in GEOFABRIK_REGIONS.items()
+            if name in replicated
+        }
+        states = fetch_all(
+            lambda region: fetch_state(region["updates_url"]), regions.values()
+        )
+        change_files = {}
+        targets = {}
+        for (name, region), (latest_seq, latest_ts) in zip(regions.items(), states):
+            seq = replicated[name][0]
+            if latest_seq <= seq:
+                continue
+            logger.info("%s: fetching diffs %d → %d", name, seq + 1, latest_seq)
+            change_files[name] = download_changes(
+                region["updates_url"], seq, latest_seq, OSM_CHANGES_DIR / name
+            )
+            targets[name] = (latest_seq, latest_ts)
+
+        if not change_files:
+            logger.info("OSM data already up-to-date, no diff to apply")
             return
 
+        all_files = [path for paths in change_files.values() for path in paths]
+        logger.info("Applying %d change file(s)...", len(all_files))
+        for name, paths in change_files.items():
+            _osm2pgsql("--append", *[str(p) for p in paths], region=name)
+        objects = changed_objects(all_files)
+
+        with conn.cursor() as cur:
+            cur.execute("CREATE TEMP TABLE new_osm_changes (LIKE osm_changes) ON COMMIT DROP")
+            with cur.copy("COPY new_osm_changes (osm_type, osm_id) FROM STDIN") as copy:
+                for obj in objects:
+                    copy.write_row(obj)
+            _queue_moved_parents(cur)
+            cur.execute("""
+                INSERT INTO osm_changes
+                SELECT * FROM new_osm_changes
+                ON CONFLICT DO NOTHING
+            """)
+            for name, (seq, ts) in targets.items():
+                cur.execute(
+                    "UPDATE osm_replication "
+                    "SET sequence_number = %s, timestamp = %s, updated_at = NOW() "
+                    "WHERE region = %s",
+                    (seq, ts, name),
+                )
+        conn.commit()
+        for name, (_, ts) in targets.items():
+            record_import(conn, "osm", ts, "success", region=name)
+        logger.info(
+            "Applied diffs for %d region(s), %d object(s) changed",
+            len(targets),
+            len(objects),
+        )
+    finally:
+        conn.close()
+
+    shutil.rmtree(OSM_CHANGES_DIR, ignore_errors=True)
+
+
+# {points_where} / {polygons_where} restrict the rows, for incremental refreshes.
+_MV_PLACES_QUERY = """
+    -- The style (osm2pgsql/generic.lua) already extracts and normalizes the
+    -- match columns: no tags->> nor normalization left for PostgreSQL.
+    -- match_xy is what the distance tests use: the point itself, or the
+    -- 5-point envelope of an area rather than its full outline, projected to
+    -- the CRS of its territory (local_srid, see migrations 020 and 023). cell_x..
+    -- cell_y_max are the 500 m grid cells it overlaps (migration 021), and
+    -- tags_missing the tags ATP could fill in (migration 022).
+    SELECT
+        node_id    AS osm_id,
+        'node'     AS node_type,
+        tags,
+        name,
+        brand_wikidata,
+        brand,
+        city,
+        postcode,
+        opening_hours,
+        website,
+        phone,
+        email,
+        version,
+        NULL::jsonb AS members,
+        geom,
+        geom       AS centroid,
+        s.local_srid,
+        x.match_xy,
+        grid_cell(ST_XMin(x.match_xy)) AS cell_x,
+        grid_cell(ST_YMin(x.match_xy)) AS cell_y,
+        grid_cell(ST_XMax(x.match_xy)) AS cell_x_max,
+        grid_cell(ST_YMax(x.match_xy)) AS cell_y_max,
+        tag_mask(opening_hours, email, phone, website) # 15 AS tags_missing,
+        region,
+        brand_norm,
+        name_norm,
+        email_norm,
+        website_norm,
+        phone_norm
+    FROM points
+    CROSS JOIN LATERAL (SELECT local_srid(geom) AS local_srid) s
+    CROSS JOIN LATERAL (SELECT local_xy(geom, s.local_srid) AS match_xy) x
+    {points_where}
+
+    UNION ALL
+
+    SELECT
+        area_id    AS osm_id,
+        CASE osm_type WHEN 'W' THEN 'way' ELSE 'relation' END AS node_type,
+        tags,
+        name,
+        brand_wikidata,
+        brand,
+        city,
+        postcode,
+        opening_hours,
+        website,
+        phone,
+        email,
+        version,
+        members,
+        geom,
+        centroid,
+        s.local_srid,
+        x.match_xy,
+        grid_cell(ST_XMin(x.match_xy)) AS cell_x,
+        grid_cell(ST_YMin(x.match_xy)) AS cell_y,
+        grid_cell(ST_XMax(x.match_xy)) AS cell_x_max,
+        grid_cell(ST_YMax(x.match_xy)) AS cell_y_max,
+        tag_mask(opening_hours, email, phone, website) # 15 AS tags_missing,
+        region,
+        brand_norm,
+        name_norm,
+        email_norm,
+        website_norm,
+        phone_norm
+    FROM polygons
+    CROSS JOIN LATERAL (SELECT local_srid(centroid) AS local_srid) s
+    CROSS JOIN LATERAL (SELECT local_xy(ST_Envelope(geom), s.local_srid) AS match_xy) x
+    {polygons_where}
+"""
+
+
+def _build_mv_places(conn):
+    # mv_places is a plain table (not a materialized view) so that diffs can
+    # be applied to it row by row. It is built in the shadow schema, so that
+    # the web app keeps reading the current one until the swap.
+    with conn.cursor() as cur:
+        prepare_shadow(cur, "mv_places")
+        logger.info("Creating mv_places and indexes...")
+        cur.execute(
+            f"CREATE TABLE {SHADOW_SCHEMA}.mv_places AS "
+            + _MV_PLACES_QUERY.format(points_where="", polygons_where="")
+        )
+        cur.execute(f"""
+            CREATE INDEX IF NOT EXISTS mv_places_match_xy_idx
+                ON {SHADOW_SCHEMA}.mv_places USING GIST (match_xy);
+            CREATE INDEX IF NOT EXISTS mv_places_osm_id_idx
+                ON {SHADOW_SCHEMA}.mv_places (osm_id, node_type);
+            CREATE INDEX IF NOT EXISTS mv_places_brand_wikidata_idx
+                ON {SHADOW_SCHEMA}.mv_places ((brand_wikidata));
+            CREATE INDEX IF NOT EXISTS mv_places_brand_norm_idx
+                ON {SHADOW_SCHEMA}.mv_places (brand_norm);
+            CREATE INDEX IF NOT EXISTS mv_places_name_norm_idx
+                ON {SHADOW_SCHEMA}.mv_places (name_norm);
+            CREATE INDEX IF NOT EXISTS mv_places_website_norm_idx
+                ON {SHADOW_SCHEMA}.mv_places (website_norm);
+            CREATE INDEX IF NOT EXISTS mv_places_phone_norm_idx
+                ON {SHADOW_SCHEMA}.mv_places (phone_norm);
+            CREATE INDEX IF NOT EXISTS mv_places_email_norm_idx
+                ON {SHADOW_SCHEMA}.mv_places (email_norm);
+            CREATE INDEX IF NOT EXISTS mv_places_cell_idx
+                ON {SHADOW_SCHEMA}.mv_places (local_srid, cell_x, cell_y);
+            CREATE INDEX IF NOT EXISTS mv_places_region_idx
+                ON {SHADOW_SCHEMA}.mv_places (region);
+        """)
+        cur.execute(f"ANALYZE {SHADOW_SCHEMA}.mv_places")
+    conn.commit()
+
+    def reset_queues(cur):
+        cur.execute("TRUNCATE osm_changes, osm_region_changes")
+        invalidate_matches(cur)
+
+    swap_in(conn, "mv_places", then=reset_queues)
+
+
+def _update_region_places(cur):
+    """Re-derive the mv_places slice of the regions queued in osm_region_changes.
+
+    Both the outgoing and the incoming rows are queued in places_changes.
+    """
+    cur.execute("""
+        WITH stale AS (
+            DELETE FROM mv_places
+            WHERE region IN (SELECT region FROM osm_region_changes)
+            RETURNING osm_id, node_type
+        )
+        INSERT INTO places_changes (osm_id, node_type)
+        SELECT osm_id, node_type FROM stale
+        ON CONFLICT DO NOTHING
+    """)
+    region_where = "WHERE region IN (SELECT region FROM osm_region_changes)"
+    cur.execute(
+        "INSERT INTO mv_places "
+        + _MV_PLACES_QUERY.format(points_where=region_where, polygons_where=region_where)
+    )
+    cur.execute("""
+        INSERT INTO places_changes (osm_id, node_type)
+        SELECT osm_id, node_type FROM mv_places
+        WHERE region IN (SELECT region FROM osm_region_changes)
+        ON CONFLICT DO NOTHING
+    """)
+    cur.execute("TRUNCATE osm_region_changes")
+
+
+def _update_mv_places(cur):
+    """Re-derive the mv_places rows of the objects queued in osm_changes.
+
+    Besides the objects of the change files, osm-update queues the ways and
+    relations whose outline moved with one of their nodes.
+    """
+    # osm2pgsql stores relations as negative area ids.
+    cur.execute("""
+        CREATE TEMP TABLE changed_places ON COMMIT DROP AS
+        SELECT
+            CASE osm_type WHEN 'R' THEN -osm_id ELSE osm_id END AS osm_id,
+            CASE osm_type WHEN 'N' THEN 'node' WHEN 'W' THEN 'way' ELSE 'relation' END AS node_type
+        FROM osm_changes
+    """)
+    cur.execute("""
+        DELETE FROM mv_places m
+        USING changed_places c
+        WHERE m.osm_id = c.osm_id AND m.node_type = c.node_type
+    """)
+    cur.execute(
+        "INSERT INTO mv_places "
+        + _MV_PLACES_QUERY.format(
+            points_where="""
+        WHERE node_id IN (
+            SELECT osm_id FROM changed_places WHERE node_type = 'node'
+        )""",
+            polygons_where="""
+        WHERE (area_id, CASE osm_type WHEN 'W' THEN 'way' ELSE 'relation' END) IN (
+            SELECT osm_id, node_type FROM changed_places WHERE node_type <> 'node'
+        )""",
+        )
+    )
+    cur.execute("""
+        INSERT INTO places_changes (osm_id, node_type)
+        SELECT osm_id, node_type FROM changed_places
+        ON CONFLICT DO NOTHING
+    """)
+    cur.execute("TRUNCATE osm_changes")
+
+
+def setup_mv_places():
+    conn = connect()
+    try:
+        data_ts = _osm_data_timestamp(conn)
         try:
             with conn.cursor() as cur:
-                cur.execute("DROP MATERIALIZED VIEW IF EXISTS mv_places CASCADE;")
-                logger.info("Creating mv_places and indexes...")
-                cur.execute("""
-                    CREATE MATERIALIZED VIEW mv_places AS
-                    SELECT
-                        node_id                                              AS osm_id,
-                        'node'                                               AS node_type,
-                        tags                                                 AS tags,
-                        tags->>'name'                                        AS name,
-                        tags->>'brand:wikidata'                              AS brand_wikidata,
-                        tags->>'brand'                                       AS brand,
-                        tags->>'addr:city'                                   AS city,
-                        tags->>'addr:postcode'                               AS postcode,
-                        tags->>'opening_hours'                               AS opening_hours,
-                        COALESCE(tags->>'website', tags->>'contact:website') AS website,
-                        COALESCE(tags->>'phone', tags->>'contact:phone')     AS phone,
-                        COALESCE(tags->>'email', tags->>'contact:email')     AS email,
-                        version,
-                        NULL::jsonb                                          AS members,
-                        geom
-                    FROM points
-
-                    UNION ALL
-
-                    SELECT
-                        area_id                                              AS osm_id,
-                        CASE osm_type WHEN 'W' THEN 'way' ELSE 'relation' END AS node_type,
-                        tags                                                 AS tags,
-                        tags->>'name'                                        AS name,
-                        tags->>'brand:wikidata'                              AS brand_wikidata,
-                        tags->>'brand'                                       AS brand,
-                        tags->>'addr:city'                                   AS city,
-                        tags->>'addr:postcode'                               AS postcode,
-                        tags->>'opening_hours'                               AS opening_hours,
-                        COALESCE(tags->>'website', tags->>'contact:website') AS website,
-                        COALESCE(tags->>'phone', tags->>'contact:phone')     AS phone,
-                        COALESCE(tags->>'email', tags->>'contact:email')     AS email,
-                        version,
-                        members,
-                        geom
-                    FROM polygons
-                """)
-
-                cur.execute("""
-                    CREATE INDEX IF NOT EXISTS mv_places_geog_idx
-                        ON mv_places USING GIST ((geom::geography));
-                    CREATE INDEX IF NOT EXISTS mv_places_brand_wikidata_idx
-                        ON mv_places ((brand_wikidata));
-                    CREATE INDEX IF NOT EXISTS mv_places_brand_lower_idx
-                        ON mv_places (LOWER(brand));
-                    CREATE INDEX IF NOT EXISTS mv_places_name_lower_idx
-                        ON mv_places (LOWER(name));
-                    CREATE INDEX IF NOT EXISTS mv_places_website_norm_idx
-                        ON mv_places (LOWER(REGEXP_REPLACE(website, '^https?://', '', 'i')));
-                    CREATE INDEX IF NOT EXISTS mv_places_phone_norm_idx
-                        ON mv_places (normalize_phone(phone));
-                    CREATE INDEX IF NOT EXISTS mv_places_email_lower_idx
-                        ON mv_places (LOWER(email));
-                """)
-
-            conn.commit()
-            record_import(conn, "osm", newest_ts, "success")
-            logger.info("mv_places created (data date: %s)", newest_ts.date())
+                full = (
+                    relation_kind(cur, "mv_places") != "r"
+                    or not has_column(cur, "mv_places", "tags_missing")
+                    or rebuild_requested(cur, "mv_places")
+                )
+            if full:
+                _build_mv_places(conn)
+            else:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT region FROM osm_region_changes")
+                    regions = [region for (region,) in cur.fetchall()]
+                    cur.execute("SELECT count(*) FROM osm_changes")
+                    pending = cur.fetchone()[0]
+                    if not pending and not regions:
+                        conn.rollback()
+                        last_date = last_import_date(conn, "osm")
+                        logger.info("OSM views already up-to-date, skipping")
+                        record_import(conn, "osm", last_date or data_ts, "skipped")
+                        return
+                    if regions:
+                        logger.info("Refreshing mv_places for region(s) %s...", ", ".join(regions))
+                        _update_region_places(cur)
+                    if pending:
+                        logger.info("Refreshing mv_places for %d changed object(s)...", pending)
+                        _update_mv_places(cur)
+                conn.commit()
+
+            record_import(conn, "osm", data_ts, "success")
+            logger.info("mv_places ready (data date: %s)", data_ts.date())
 
         except Exception:
             logger.exception("setup_mv_places failed")
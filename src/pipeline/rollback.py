@@ -0,0 +1,94 @@
+"""
+Swap the previous generation of rebuilt relations back in.
+
+Every full rebuild is written to the ``shadow`` schema and swapped into
+``public``; the generation it replaced is kept in ``previous``. Running::
+
+    python -m src.pipeline.rollback <group>
+
+exchanges ``previous`` and ``public`` again for one group of relations, in a
+single transaction. Running it twice undoes the rollback. Downstream relations
+are flagged for a refresh; run the pipeline from the next step to apply it
+(e.g. ``from mv-match`` after ``atp``).
+"""
+
+import logging
+import os
+import sys
+
+from src.pipeline._db import PREVIOUS_SCHEMA, connect, request_rebuild, roll_back
+from src.pipeline.atp2osm import _QUEUE_BRANDS, invalidate_matches
+from src.pipeline.constants import FLAT_NODES_PATH, PREVIOUS_FLAT_NODES_PATH
+from src.pipeline.osm import OSM2PGSQL_TABLES
+
+logger = logging.getLogger(__name__)
+
+
+def _check_osm():
+    # The flat-nodes file belongs with its tables. Previous tables without
+    # theirs (left by a legacy, non-slim import) cannot take diffs, and
+    # rolling back to them would lose the current file.
+    for path in (FLAT_NODES_PATH, PREVIOUS_FLAT_NODES_PATH):
+        if not path.exists():
+            raise RuntimeError(f"Cannot roll back osm: {path} is missing")
+
+
+def _after_osm(cur):
+    _check_osm()
+    # The previous generation's replication position is not kept: forget the
+    # current one, so that the next run re-imports from fresh PBFs.
+    cur.execute("DELETE FROM osm_replication")
+    cur.execute("TRUNCATE osm_changes")
+    request_rebuild(cur, "mv_places")
+    invalidate_matches(cur)
+    tmp_path = FLAT_NODES_PATH.with_suffix(".swap")
+    os.replace(FLAT_NODES_PATH, tmp_path)
+    os.replace(PREVIOUS_FLAT_NODES_PATH, FLAT_NODES_PATH)
+    os.replace(tmp_path, PREVIOUS_FLAT_NODES_PATH)
+
+
+def _after_atp(cur):
+    # The spider hashes describe the rolled-back rows: forget them, so that
+    # the next atp-extract reloads every spider.
+    cur.execute("TRUNCATE atp_spider_hashes, atp_spider_changes")
+    invalidate_matches(cur)
+
+
+def _after_matches(cur):
+    # Both generations' brands, for the next mv-brand run.
+    for matches in ("atp_osm_match", f"{PREVIOUS_SCHEMA}.atp_osm_match"):
+        cur.execute(_QUEUE_BRANDS.format(matches=matches))
+
+
+# group → (relations, then)
+GROUPS = {
+    "osm": (OSM2PGSQL_TABLES, _after_osm),
+    "places": (("mv_places",), invalidate_matches),
+    "atp": (("atp_fr", "atp_spiders"), _after_atp),
+    "matches": (("atp_osm_candidate", "atp_osm_match"), _after_matches),
+    "brands": (("mv_places_brand",), None),
+}
+
+
+def main(args):
+    if len(args) != 1 or args[0] not in GROUPS:
+        print(
+            f"Usage: python -m src.pipeline.rollback <{'|'.join(GROUPS)}>",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+    names, then = GROUPS[args[0]]
+    # Refuse before anything is moved.
+    if args[0] == "osm":
+        _check_osm()
+    conn = connect()
+    try:
+        roll_back(conn, *names, then=then)
+    finally:
+        conn.close()
+    logger.info("Rolled back %s", ", ".join(names))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main(sys.argv[1:])
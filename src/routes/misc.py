@@ -46,6 +46,7 @@ def home():
         data_imports = cursor.execute("""
             SELECT DISTINCT ON (type) type, date, status, created_at
             FROM data_imports
+            WHERE region IS NULL
             ORDER BY type, created_at DESC
         """).fetchall()
     data_imports = {row["type"]: row for row in data_imports}
@@ -16,7 +16,8 @@ logger = logging.getLogger(__name__)
 def _get_last_import_date(osmdb, import_type):
     with osmdb.cursor() as cursor:
         cursor.execute(
-            "SELECT date FROM data_imports WHERE type = %s ORDER BY date DESC LIMIT 1",
+            "SELECT date FROM data_imports WHERE type = %s AND region IS NULL "
+            "ORDER BY date DESC LIMIT 1",
             (import_type,),
         )
         row = cursor.fetchone()
@@ -1,12 +1,19 @@
 import os
 import time
 import functools
+import json
 import logging
 import requests
 import random
+import threading
 
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
 from typing import Callable, Any, TypeVar, cast
+from urllib.parse import urlsplit
+
+from src.config import get_pipeline
 
 
 logger = logging.getLogger(__name__)
@@ -65,29 +72,289 @@ def clean_debug_folder():
 print
 
 
+# Below this size a file is fetched over a single connection.
+_MIN_SEGMENT_SIZE = 8 * 1024 * 1024
+# Save the .part manifest every time this many bytes have been written.
+_MANIFEST_FLUSH_BYTES = 16 * 1024 * 1024
+
+
+class UpstreamChangedError(RuntimeError):
+    """The remote file changed while it was being downloaded."""
+
+
+# Download connections shared by every download of the process: a budget per
+# host (PIPELINE_HOST_CONNECTIONS) and one overall (PIPELINE_DOWNLOAD_CONNECTIONS).
+_slots_lock = threading.Lock()
+_host_slots = {}
+_total_slots = None
+
+
+@contextmanager
+def download_slot(url: str):
+    """Hold one download connection to *url*'s host for the duration of the block.
+
+    Concurrent downloads (OSM regions, ATP spiders, the segments of one file)
+    share the connection budget instead of taking turns with a global lock.
+    """
+    global _total_slots
+    host = urlsplit(url).netloc
+    with _slots_lock:
+        pipeline = get_pipeline()
+        if _total_slots is None:
+            _total_slots = threading.BoundedSemaphore(pipeline.download_connections)
+        if host not in _host_slots:
+            _host_slots[host] = threading.BoundedSemaphore(pipeline.host_connections)
+        host_slots, total_slots = _host_slots[host], _total_slots
+    # Always host first, then total: no two threads wait on each other.
+    with host_slots, total_slots:
+        yield
+
+
+def _probe(url: str) -> dict | None:
+    """HEAD *url* and return its size and validators, or None if the file
+    cannot be fetched by byte ranges (unknown size, no Range support, no HEAD).
+    """
+    try:
+        resp = requests.head(url, timeout=30, allow_redirects=True)
+    except requests.exceptions.RequestException:
+        return None
+    length = resp.headers.get("Content-Length")
+    if (
+        resp.status_code != 200
+        or resp.headers.get("Accept-Ranges", "").lower() != "bytes"
+        or not (length and length.isdigit())
+    ):
+        return None
+    return {
+        "size": int(length),
+        "etag": resp.headers.get("ETag"),
+        "last_modified": resp.headers.get("Last-Modified"),
+    }
+
+
+class _SegmentedDownload:
+    """Parallel HTTP Range download of one file into a preallocated ``.part``
+    file, with a ``.part.json`` manifest recording each segment's progress.
+    """
+
+    def __init__(self, url, dest_path, remote, connections, chunk_size, progress_interval):
+        self.url = url
+        self.dest_path = dest_path
+        self.remote = remote
+        self.chunk_size = chunk_size
+        self.progress_interval = progress_interval
+        self.part_path = dest_path.with_name(dest_path.name + ".part")
+        self.manifest_path = dest_path.with_name(dest_path.name + ".part.json")
+        self.lock = threading.Lock()
+        self.unsaved = 0
+        self.segments = self._load_manifest()
+        if self.segments is None:
+            self.segments = self._new_segments(connections)
+
+    # ----- manifest -------------------------------------------------------
+
+    def _load_manifest(self):
+        try:
+            manifest = json.loads(self.manifest_path.read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+        if not self.part_path.exists():
+            return None
+        if manifest.get("url") != self.url or manifest.get("remote") != self.remote:
+            logger.info("Remote file changed since the partial download, restarting")
+            return None
+        return manifest["segments"]
+
+    def _save_manifest(self):
+        tmp_path = self.manifest_path.with_suffix(".tmp")
+        tmp_path.write_text(
+            json.dumps({"url": self.url, "remote": self.remote, "segments": self.segments})
+        )
+        os.replace(tmp_path, self.manifest_path)
+        self.unsaved = 0
+
+    def _new_segments(self, connections):
+        size = self.remote["size"]
+        count = max(1, min(connections, size // _MIN_SEGMENT_SIZE))
+        bounds = [size * i // count for i in range(count + 1)]
+        # Preallocate so that segments can be written in place, in any order.
+        with open(self.part_path, "wb") as f:
+            try:
+                os.posix_fallocate(f.fileno(), 0, size)
+            except (AttributeError, OSError):
+                f.truncate(size)
+        # [start, end (exclusive), bytes already written]
+        return [[bounds[i], bounds[i + 1], 0] for i in range(count)]
+
+    # ----- download -------------------------------------------------------
+
+    def _done(self):
+        return sum(seg[2] for seg in self.segments)
+
+    def _report(self):
+        now = time.time()
+        if now - self.last_report < self.progress_interval:
+            return
+        elapsed = now - self.start
+        written = self._done() - self.resumed
+        speed = written / elapsed if elapsed > 0 else 0
+        pct = self._done() / self.remote["size"] * 100
+        logger.info(
+            f"[{elapsed:6.1f}s] "
+            f"{pct:5.1f}% ({self._done():,} / {self.remote['size']:,} bytes) "
+            f"@ {speed / 1024:,.1f} KiB/s"
+        )
+        self.last_report = now
+
+    def _fetch_segment(self, index, retries=3):
+        for attempt in range(retries + 1):
+            try:
+                self._fetch_segment_once(index)
+                return
+            except requests.exceptions.RequestException:
+                if attempt == retries:
+                    raise
+                logger.warning("Segment %d interrupted, retrying", index)
+                time.sleep(2**attempt)
+
+    def _fetch_segment_once(self, index):
+        segment = self.segments[index]
+        start, end = segment[0], segment[1]
+        if start + segment[2] >= end:
+            return
+        headers = {"Range": f"bytes={start + segment[2]}-{end - 1}"}
+        # If-Range makes the server answer 200 with the whole (new) file
+        # instead of a 206 slice when the file no longer matches.
+        etag = self.remote["etag"]
+        if etag and not etag.startswith("W/"):
+            headers["If-Range"] = etag
+        elif self.remote["last_modified"]:
+            headers["If-Range"] = self.remote["last_modified"]
+
+        with (
+            download_slot(self.url),
+            requests.get(self.url, headers=headers, stream=True, timeout=30) as resp,
+        ):
+            resp.raise_for_status()
+            if resp.status_code != 206:
+                raise UpstreamChangedError(f"{self.url} changed during the download")
+            with open(self.part_path, "r+b") as f:
+                f.seek(start + segment[2])
+                for chunk in resp.iter_content(chunk_size=self.chunk_size):
+                    if not chunk:  # skip keep-alive chunks
+                        continue
+                    chunk = chunk[: end - start - segment[2]]
+                    f.write(chunk)
+                    f.flush()
+                    with self.lock:
+                        segment[2] += len(chunk)
+                        self.unsaved += len(chunk)
+                        if self.unsaved >= _MANIFEST_FLUSH_BYTES:
+                            self._save_manifest()
+                        self._report()
+                    if start + segment[2] >= end:
+                        break
+        if start + segment[2] < end:
+            raise requests.exceptions.ConnectionError(
+                f"Segment {index} of {self.url} ended early"
+            )
+
+    def run(self):
+        self.resumed = self._done()
+        if self.resumed:
+            logger.info(
+                f"Resuming download: {self.resumed:,} / {self.remote['size']:,} bytes already there"
+            )
+        self.start = self.last_report = time.time()
+        self._save_manifest()
+
+        errors = []
+        with ThreadPoolExecutor(max_workers=len(self.segments)) as executor:
+            futures = [
+                executor.submit(self._fetch_segment, i) for i in range(len(self.segments))
+            ]
+            for fut in futures:
+                try:
+                    fut.result()
+                except Exception as exc:
+                    errors.append(exc)
+
+        if errors:
+            if any(isinstance(e, UpstreamChangedError) for e in errors):
+                # Never mix segments of two versions of the file.
+                self.part_path.unlink(missing_ok=True)
+                self.manifest_path.unlink(missing_ok=True)
+            else:
+                self._save_manifest()
+            raise errors[0]
+
+        os.replace(self.part_path, self.dest_path)
+        self.manifest_path.unlink(missing_ok=True)
+
+        total_elapsed = time.time() - self.start
+        written = self.remote["size"] - self.resumed
+        avg_speed = written / total_elapsed if total_elapsed > 0 else 0
+        logger.info(
+            f"\nDownload complete: 100.0% ({self.remote['size']:,} bytes, "
+            f"{written:,} fetched in {len(self.segments)} segment(s)) "
+            f"in {total_elapsed:.1f}s ({avg_speed / 1024:,.1f} KiB/s)."
+        )
+
+
 def download_large_file(
     url: str,
     destination: str | Path,
-    chunk_size: int = 8192,
+    chunk_size: int = 1024 * 1024,
     progress_interval: int = 15,
+    connections: int = 4,
 ) -> None:
     """
-    Stream a file from *url* to *destination* while printing a progress
-    percentage roughly every ``progress_interval`` seconds.
+    Download *url* to *destination*, resuming any previous partial download,
+    while logging progress roughly every ``progress_interval`` seconds.
+
+    When the server supports HTTP Range requests, the file is split into up to
+    ``connections`` segments fetched in parallel into a preallocated
+    ``<destination>.part`` file. A ``<destination>.part.json`` manifest keeps
+    each segment's progress, so a re-run after a failure only fetches the
+    missing bytes. The manifest also records the ETag / Last-Modified /
+    Content-Length of the remote file: if any of them changed, the partial
+    download is discarded and started over.
+
+    Other servers are read over a single stream, without resume.
+
+    *destination* only appears, atomically, once the file is complete.
 
     Parameters
     ----------
     url               : URL of the file to download.
     destination       : Local path where the file will be saved.
-    chunk_size        : Number of bytes read per iteration (default 8192).
-    progress_interval : Seconds between progress updates (default 15 s).
+    chunk_size        : Number of bytes read per iteration (default 1 MiB).
+    progress_interval : Seconds between progress updates (default 15 s).
+    connections       : Maximum number of parallel Range requests (default 4).
     """
     dest_path = Path(destination)
     dest_path.parent.mkdir(parents=True, exist_ok=True)
 
+    remote = _probe(url)
+    if remote is None:
+        _download_single_stream(url, dest_path, chunk_size, progress_interval)
+        return
+    if remote["size"] == 0:
+        raise ValueError(f"Downloaded file is empty (0 bytes): {url}")
+
+    _SegmentedDownload(
+        url, dest_path, remote, connections, chunk_size, progress_interval
+    ).run()
+
+
+def _download_single_stream(
+    url: str, dest_path: Path, chunk_size: int, progress_interval: int
+) -> None:
+    part_path = dest_path.with_name(dest_path.name + ".part")
+
     try:
         # ``stream=True`` gives us an iterator over the response body.
-        with requests.get(url, stream=True, timeout=30) as resp:
+        with download_slot(url), requests.get(url, stream=True, timeout=30) as resp:
             resp.raise_for_status()
 
             # Try to obtain the total size from the HTTP header.
@@ -102,7 +369,7 @@ def download_large_file(
             written = 0
             start = last_report = time.time()
 
-            with open(dest_path, "wb") as out_file:
+            with open(part_path, "wb") as out_file:
                 for chunk in resp.iter_content(chunk_size=chunk_size):
                     if not chunk:  # skip keep‑alive chunks
                         continue
@@ -132,8 +399,9 @@ def download_large_file(
 
             # ----- final summary -------------------------------------------------
             if written == 0:
-                dest_path.unlink(missing_ok=True)
+                part_path.unlink(missing_ok=True)
                 raise ValueError(f"Downloaded file is empty (0 bytes): {url}")
+            os.replace(part_path, dest_path)
 
             total_elapsed = time.time() - start
             avg_speed = written / total_elapsed if total_elapsed > 0 else 0
@@ -149,7 +417,7 @@ def download_large_file(
                 )
 
     except requests.exceptions.RequestException:
-        dest_path.unlink(missing_ok=True)
+        part_path.unlink(missing_ok=True)
         raise
 
 
@@ -0,0 +1,121 @@
+import functools
+import hashlib
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.pipeline import _upstream
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def upstream_cache(tmp_path, monkeypatch):
+    """Give each test a fresh upstream snapshot and on-disk cache."""
+    path = tmp_path / "upstream-cache.json"
+    monkeypatch.setattr(_upstream, "UPSTREAM_CACHE_PATH", path)
+    _upstream.reset()
+    yield path
+    _upstream.reset()
+
+
+@pytest.fixture
+def http_server(tmp_path):
+    """Serve a temporary directory over HTTP; yields (base_url, root_dir)."""
+    root = tmp_path / "www"
+    root.mkdir()
+    handler = functools.partial(_QuietHandler, directory=str(root))
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}", root
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+class _RangeHandler(_QuietHandler):
+    """Static file handler with ``Range`` / ``If-Range`` support and a strong ETag.
+
+    Counters and fault injection live on the server object:
+    ``bytes_sent`` totals the body bytes served, and a response is cut short
+    once ``fail_after`` body bytes have been sent overall (None disables it).
+    """
+
+    def _file(self):
+        path = self.translate_path(self.path)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            self.send_error(404)
+            return None
+        return data, '"%s"' % hashlib.md5(data).hexdigest()
+
+    def do_HEAD(self):
+        found = self._file()
+        if found is None:
+            return
+        data, etag = found
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", etag)
+        self.end_headers()
+
+    def do_GET(self):
+        found = self._file()
+        if found is None:
+            return
+        data, etag = found
+        start, end = 0, len(data) - 1
+        partial = False
+        range_header = self.headers.get("Range")
+        if_range = self.headers.get("If-Range")
+        if range_header and (if_range is None or if_range == etag):
+            first, _, last = range_header.removeprefix("bytes=").partition("-")
+            start, end = int(first), int(last) if last else len(data) - 1
+            partial = True
+        body = data[start : end + 1]
+
+        self.send_response(206 if partial else 200)
+        if partial:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", etag)
+        self.end_headers()
+
+        server = self.server
+        with server.lock:
+            budget = len(body)
+            if server.fail_after is not None:
+                budget = max(0, min(budget, server.fail_after - server.bytes_sent))
+            server.bytes_sent += budget
+        self.wfile.write(body[:budget])
+        if budget < len(body):
+            self.close_connection = True
+
+
+@pytest.fixture
+def range_server(tmp_path):
+    """Like ``http_server`` but range-capable; yields (base_url, root_dir, server)."""
+    root = tmp_path / "www"
+    root.mkdir()
+    handler = functools.partial(_RangeHandler, directory=str(root))
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.lock = threading.Lock()
+    server.bytes_sent = 0
+    server.fail_after = None
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}", root, server
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,131 @@
+import zipfile
+from datetime import datetime, timezone
+
+import pytest
+
+from src.pipeline import atp
+from src.pipeline._atp_runs import spider_hash
+
+
+class _Cursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.result = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        self.conn.statements.append(query)
+        # Canned rows for the queries the test cares about.
+        self.result = next(
+            (rows for prefix, rows in self.conn.results.items() if query.startswith(prefix)),
+            [],
+        )
+
+    def executemany(self, query, rows):
+        self.conn.statements.append(query)
+        self.conn.rows.extend(rows)
+
+    def fetchone(self):
+        return self.result[0]
+
+    def fetchall(self):
+        return self.result
+
+
+class _Connection:
+    def __init__(self, results=None):
+        self.statements = []
+        self.rows = []
+        self.results = results or {}
+        self.commits = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def cursor(self):
+        return _Cursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def atp_dir(tmp_path, monkeypatch):
+    for name, path in (
+        ("ATP_DIR", tmp_path),
+        ("GEOJSON_DIR", tmp_path / "geojson"),
+        ("NDGEOJSON_DIR", tmp_path / "ndgeojson"),
+        ("SPIDER_OUTPUT_DIR", tmp_path / "output"),
+        ("PARQUET_PATH", tmp_path / "latest.parquet"),
+    ):
+        monkeypatch.setattr(atp, name, path)
+    return tmp_path
+
+
+def test_unpopulated_atp_fr_refuses_targeted_extract(atp_dir, monkeypatch):
+    # A targeted fetch only holds the French spiders whose output changed:
+    # loading them in full would leave atp_fr with only these.
+    (atp_dir / "output").mkdir()
+    (atp_dir / "output" / "lidl_fr.geojson").write_text('{"features": []}')
+    (atp_dir / "latest.parquet").write_bytes(b"older run")
+    conn = _Connection()
+    monkeypatch.setattr(atp, "connect", lambda: conn)
+    monkeypatch.setattr(atp, "_atp_fr_populated", lambda conn: False)
+
+    with pytest.raises(RuntimeError, match="full load"):
+        atp.extract_atp()
+
+    assert conn.statements == ["TRUNCATE atp_spider_hashes, atp_spider_changes"]
+    assert conn.commits == 1
+    assert not (atp_dir / "geojson" / "lidl_fr.geojson").exists()
+    assert not (atp_dir / "latest.parquet").exists()
+
+
+def test_removed_spider_then_no_change(atp_dir, monkeypatch):
+    # Run 1: a spider is gone from the run, the other one is unchanged.
+    with zipfile.ZipFile(atp_dir / "output.zip", "w") as zf:
+        zf.writestr("output/lidl_fr.geojson", '{"features": []}')
+        info = zf.getinfo("output/lidl_fr.geojson")
+    (atp_dir / "latest.parquet").write_bytes(b"earlier run")
+    known = [("lidl_fr", spider_hash(info.CRC, info.file_size)), ("aldi_fr", "0-1")]
+    conn = _Connection({"SELECT spider, content_hash FROM atp_spider_hashes": known})
+    monkeypatch.setattr(atp, "connect", lambda: conn)
+    monkeypatch.setattr(atp, "_atp_fr_populated", lambda conn: True)
+
+    atp.extract_atp()
+
+    assert conn.rows == [("aldi_fr", None)]
+    assert not (atp_dir / "geojson" / "lidl_fr.geojson").exists()
+    # Removals alone keep the parquet of the earlier run; atp-import skips it.
+    assert (atp_dir / "latest.parquet").exists()
+
+    # Run 2: nothing changed, no parquet left after a cleanup.
+    (atp_dir / "latest.parquet").unlink()
+    conn = _Connection(
+        {
+            "SELECT count(*) FROM atp_spider_changes": [(0,)],
+            "SELECT EXISTS (SELECT 1 FROM atp_spider_hashes)": [(True,)],
+        }
+    )
+    last = datetime(2026, 10, 1, tzinfo=timezone.utc)
+    imports = []
+    monkeypatch.setattr(atp, "connect", lambda: conn)
+    monkeypatch.setattr(atp, "last_import_date", lambda conn, kind: last)
+    monkeypatch.setattr(
+        atp, "record_import", lambda conn, kind, date, status: imports.append((date, status))
+    )
+
+    atp.import_atp()
+
+    assert imports == [(last, "skipped")]
@@ -0,0 +1,83 @@
+import json
+import zipfile
+
+from src.pipeline._atp_runs import (
+    fetch_spiders,
+    file_hash,
+    spider_hash,
+    spider_url,
+    targeted_spiders,
+)
+
+FEATURE = '{"type":"Feature","properties":{"@spider":"%s","addr:country":"FR"},"geometry":null}'
+
+
+def _publish_run(root, spiders):
+    """Lay out a fake ATP run directory: output.zip, output/, stats.json."""
+    run = root / "runs" / "2025-01-04-13-32-30"
+    output = run / "output"
+    output.mkdir(parents=True)
+    with zipfile.ZipFile(run / "output.zip", "w", zipfile.ZIP_DEFLATED) as zf:
+        for spider in spiders:
+            body = '{"type":"FeatureCollection","features":[\n%s\n]}\n' % (
+                FEATURE % spider
+            )
+            (output / f"{spider}.geojson").write_text(body)
+            zf.writestr(f"output/{spider}.geojson", body)
+    (run / "stats.json").write_text(
+        json.dumps({"results": [{"spider": spider} for spider in spiders]})
+    )
+    return run
+
+
+def test_spider_url():
+    assert (
+        spider_url("https://example.org/runs/r1/output.zip", "carrefour_fr")
+        == "https://example.org/runs/r1/output/carrefour_fr.geojson"
+    )
+
+
+def test_targeted_spiders():
+    run = {"a", "b", "c"}
+    assert targeted_spiders(run, run, {"b", "a"}) == ["a", "b"]
+    # Nothing examined yet.
+    assert targeted_spiders(run, set(), set()) is None
+    # A spider never examined may cover France.
+    assert targeted_spiders(run | {"d"}, run, {"a"}) is None
+    # A French spider gone from the run must be deleted.
+    assert targeted_spiders({"a", "b"}, run, {"c"}) is None
+
+
+def test_fetch_spiders(http_server, tmp_path):
+    base_url, root = http_server
+    run = _publish_run(root, ["carrefour_fr", "lidl_fr", "walmart_us"])
+    output_url = f"{base_url}/runs/{run.name}/output.zip"
+    dest = tmp_path / "fetched"
+
+    assert fetch_spiders(output_url, ["carrefour_fr", "lidl_fr"], dest, workers=2)
+
+    assert sorted(f.name for f in dest.iterdir()) == [
+        "carrefour_fr.geojson",
+        "lidl_fr.geojson",
+    ]
+    assert (dest / "lidl_fr.geojson").read_bytes() == (
+        run / "output" / "lidl_fr.geojson"
+    ).read_bytes()
+
+
+def test_fetch_spiders_missing(http_server, tmp_path):
+    base_url, root = http_server
+    run = _publish_run(root, ["carrefour_fr"])
+    output_url = f"{base_url}/runs/{run.name}/output.zip"
+
+    assert not fetch_spiders(
+        output_url, ["carrefour_fr", "gone_fr"], tmp_path / "fetched", workers=2
+    )
+
+
+def test_file_hash_matches_zip(tmp_path):
+    run = _publish_run(tmp_path, ["carrefour_fr", "lidl_fr"])
+    with zipfile.ZipFile(run / "output.zip") as zf:
+        for info in zf.infolist():
+            path = run / info.filename
+            assert file_hash(path) == spider_hash(info.CRC, info.file_size)
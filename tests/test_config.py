@@ -0,0 +1,22 @@
+import pytest
+
+from src.config import ConfigError, get_pipeline
+
+
+@pytest.fixture(autouse=True)
+def fresh_pipeline():
+    get_pipeline.cache_clear()
+    yield
+    get_pipeline.cache_clear()
+
+
+def test_match_strategy_default(monkeypatch):
+    monkeypatch.delenv("MATCH_STRATEGY", raising=False)
+    assert get_pipeline().match_strategy == "grid"
+
+
+@pytest.mark.parametrize("value", ["Grid", "nearest"])
+def test_unknown_match_strategy(monkeypatch, value):
+    monkeypatch.setenv("MATCH_STRATEGY", value)
+    with pytest.raises(ConfigError, match="MATCH_STRATEGY"):
+        get_pipeline()
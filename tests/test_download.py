@@ -0,0 +1,145 @@
+import json
+import os
+import threading
+
+import pytest
+import requests
+
+from src import utils
+from src.config import get_pipeline
+from src.utils import UpstreamChangedError, download_large_file, download_slot
+
+
+@pytest.fixture(autouse=True)
+def small_segments(monkeypatch):
+    monkeypatch.setattr(utils, "_MIN_SEGMENT_SIZE", 1024)
+    monkeypatch.setattr(utils.time, "sleep", lambda seconds: None)
+
+
+def _publish(root, size=64 * 1024):
+    data = os.urandom(size)
+    (root / "file.bin").write_bytes(data)
+    return data
+
+
+def test_parallel_download(range_server, tmp_path):
+    base_url, root, server = range_server
+    data = _publish(root)
+    dest = tmp_path / "out" / "file.bin"
+
+    download_large_file(f"{base_url}/file.bin", dest, chunk_size=4096)
+
+    assert dest.read_bytes() == data
+    assert server.bytes_sent == len(data)
+    assert not dest.with_name("file.bin.part").exists()
+    assert not dest.with_name("file.bin.part.json").exists()
+
+
+def test_resume_after_failure(range_server, tmp_path):
+    base_url, root, server = range_server
+    data = _publish(root)
+    dest = tmp_path / "file.bin"
+
+    server.fail_after = 20 * 1024
+    with pytest.raises(requests.exceptions.RequestException):
+        download_large_file(f"{base_url}/file.bin", dest, chunk_size=1024)
+    assert not dest.exists()
+    manifest = json.loads(dest.with_name("file.bin.part.json").read_text())
+    assert 0 < sum(done for _, _, done in manifest["segments"]) <= 20 * 1024
+
+    server.fail_after = None
+    server.bytes_sent = 0
+    download_large_file(f"{base_url}/file.bin", dest, chunk_size=1024)
+
+    assert dest.read_bytes() == data
+    assert server.bytes_sent < len(data)
+
+
+def test_changed_upstream_restarts(range_server, tmp_path):
+    base_url, root, server = range_server
+    _publish(root)
+    dest = tmp_path / "file.bin"
+
+    server.fail_after = 20 * 1024
+    with pytest.raises(requests.exceptions.RequestException):
+        download_large_file(f"{base_url}/file.bin", dest, chunk_size=1024)
+
+    data = _publish(root)
+    server.fail_after = None
+    server.bytes_sent = 0
+    download_large_file(f"{base_url}/file.bin", dest, chunk_size=1024)
+
+    assert dest.read_bytes() == data
+    assert server.bytes_sent == len(data)
+
+
+def test_change_during_download_discards_segments(range_server, tmp_path):
+    base_url, root, server = range_server
+    _publish(root)
+    segmented = utils._SegmentedDownload(
+        f"{base_url}/file.bin",
+        tmp_path / "file.bin",
+        utils._probe(f"{base_url}/file.bin"),
+        connections=4,
+        chunk_size=1024,
+        progress_interval=15,
+    )
+    _publish(root)  # the If-Range validator no longer matches
+
+    with pytest.raises(UpstreamChangedError):
+        segmented.run()
+    assert not (tmp_path / "file.bin.part").exists()
+    assert not (tmp_path / "file.bin.part.json").exists()
+
+
+def test_fallback_without_range_support(http_server, tmp_path):
+    base_url, root = http_server
+    data = _publish(root)
+    dest = tmp_path / "file.bin"
+
+    download_large_file(f"{base_url}/file.bin", dest)
+
+    assert dest.read_bytes() == data
+    assert not dest.with_name("file.bin.part").exists()
+
+
+def test_empty_file_is_rejected(range_server, tmp_path):
+    base_url, root, _ = range_server
+    (root / "empty.bin").write_bytes(b"")
+
+    with pytest.raises(ValueError):
+        download_large_file(f"{base_url}/empty.bin", tmp_path / "empty.bin")
+
+
+def test_download_slot_caps(monkeypatch):
+    monkeypatch.setenv("PIPELINE_HOST_CONNECTIONS", "2")
+    monkeypatch.setenv("PIPELINE_DOWNLOAD_CONNECTIONS", "3")
+    monkeypatch.setattr(utils, "_host_slots", {})
+    monkeypatch.setattr(utils, "_total_slots", None)
+    get_pipeline.cache_clear()
+
+    lock = threading.Lock()
+    active = {"a": 0, "b": 0, "total": 0}
+    peak = {"a": 0, "b": 0, "total": 0}
+
+    def hold(host):
+        with download_slot(f"http://{host}.example/file"):
+            with lock:
+                for key in (host, "total"):
+                    active[key] += 1
+                    peak[key] = max(peak[key], active[key])
+            threading.Event().wait(0.05)
+            with lock:
+                active[host] -= 1
+                active["total"] -= 1
+
+    threads = [threading.Thread(target=hold, args=(host,)) for host in "aaaabbbb"]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        get_pipeline.cache_clear()
+
+    assert peak == {"a": 2, "b": 2, "total": 3}
@@ -0,0 +1,306 @@
+import json
+
+import duckdb
+import pytest
+
+from src.pipeline import ndgeojson_to_parquet
+from src.pipeline.ndgeojson_to_parquet import (
+    _geojson_to_ndgeojson_single,
+    _ndjson_shards,
+    _ndjson_to_parquet,
+    convert_geojson_to_ndgeojson,
+)
+
+
+def _feature(i):
+    return json.dumps(
+        {
+            "type": "Feature",
+            "id": f"f{i}",
+            "properties": {"name": f"Shop {i}", "note": "a, b\\nc"},
+            "geometry": {"type": "Point", "coordinates": [2.35, 48.85]},
+        }
+    )
+
+
+def _collection(count, eol="\n"):
+    features = [f"{_feature(i)}," for i in range(count - 1)] + [_feature(count - 1)]
+    return (
+        '{"type":"FeatureCollection","features":[' + eol
+        + eol.join(features) + eol
+        + "]}" + eol
+    )
+
+
+@pytest.mark.parametrize("block_size", [7, 100, 1 << 20])
+@pytest.mark.parametrize("eol", ["\n", "\r\n", "  \n"])
+def test_single_file(tmp_path, monkeypatch, block_size, eol):
+    monkeypatch.setattr(ndgeojson_to_parquet, "_CONVERT_BLOCK_SIZE", block_size)
+    src_dir, out_dir = tmp_path / "geojson", tmp_path / "ndgeojson"
+    src_dir.mkdir()
+    out_dir.mkdir()
+    (src_dir / "spider.geojson").write_text(_collection(25, eol))
+
+    _geojson_to_ndgeojson_single(src_dir / "spider.geojson", out_dir)
+
+    lines = (out_dir / "spider.geojson").read_text().splitlines()
+    assert [json.loads(line)["id"] for line in lines] == [f"f{i}" for i in range(25)]
+    assert not (src_dir / "spider.geojson").exists()
+    assert not (out_dir / "spider.geojson.tmp").exists()
+
+
+def test_empty_collection_is_dropped(tmp_path):
+    src_dir, out_dir = tmp_path / "geojson", tmp_path / "ndgeojson"
+    src_dir.mkdir()
+    out_dir.mkdir()
+    (src_dir / "empty.geojson").write_text('{"type":"FeatureCollection","features":[\n]}\n')
+
+    _geojson_to_ndgeojson_single(src_dir / "empty.geojson", out_dir)
+
+    assert not any(out_dir.iterdir())
+    assert not (src_dir / "empty.geojson").exists()
+
+
+def test_directory_resume(tmp_path):
+    src_dir, out_dir = tmp_path / "geojson", tmp_path / "ndgeojson"
+    src_dir.mkdir()
+    out_dir.mkdir()
+    for n in range(1, 6):
+        (src_dir / f"spider{n}.geojson").write_text(_collection(n))
+    # Left over by a crashed run: already converted, source not yet deleted.
+    (out_dir / "spider1.geojson").write_text(_feature(0) + "\n")
+
+    convert_geojson_to_ndgeojson(src_dir, out_dir)
+
+    assert not any(src_dir.iterdir())
+    for n in range(1, 6):
+        lines = (out_dir / f"spider{n}.geojson").read_text().splitlines()
+        assert len(lines) == n
+
+
+def _ndjson(path, count):
+    path.write_text("".join(_feature(i) + "\n" for i in range(count)))
+    return path
+
+
+def test_shards_cut_on_newlines(tmp_path, monkeypatch):
+    monkeypatch.setattr(ndgeojson_to_parquet, "MAX_FILE_SIZE", 1000)
+    path = _ndjson(tmp_path / "big.geojson", 40)
+    data = path.read_bytes()
+
+    shards = _ndjson_shards(path)
+
+    assert len(shards) > 1
+    assert shards[0][1] == 0 and shards[-1][2] == len(data)
+    for (_, _, end), (_, start, _) in zip(shards, shards[1:]):
+        assert end == start
+    for _, start, end in shards:
+        assert data[end - 1 : end] == b"\n"
+        assert end - start < 1000 + len(_feature(0)) + 1
+
+
+def test_small_file_is_one_shard(tmp_path):
+    path = _ndjson(tmp_path / "small.geojson", 3)
+
+    assert _ndjson_shards(path) == [(path, 0, path.stat().st_size)]
+
+
+def _count_rows(source, out_path, keep_world):
+    with duckdb.connect() as con:
+        count = con.execute(f"""
+            SELECT count(*) FROM read_json('{source.as_posix()}',
+                format='newline_delimited',
+                columns={ndgeojson_to_parquet._NDJSON_COLS})
+        """).fetchone()[0]
+    out_path.write_text(str(count))
+
+
+def test_shards_stream_through_a_pipe(tmp_path, monkeypatch):
+    monkeypatch.setattr(ndgeojson_to_parquet, "MAX_FILE_SIZE", 1000)
+    monkeypatch.setattr(ndgeojson_to_parquet, "_ndjson_source_to_parquet", _count_rows)
+    path = _ndjson(tmp_path / "big.geojson", 40)
+
+    total = 0
+    for i, shard in enumerate(_ndjson_shards(path)):
+        out = tmp_path / f"part_{i}.txt"
+        _ndjson_to_parquet(shard, out, tmp_path / f"part_{i}.fifo")
+        total += int(out.read_text())
+        assert not (tmp_path / f"part_{i}.fifo").exists()
+
+    assert total == 40
+
+
+def test_pipe_is_released_when_duckdb_fails(tmp_path, monkeypatch):
+    def fail(source, out_path, keep_world):
+        raise duckdb.Error("boom")
+
+    monkeypatch.setattr(ndgeojson_to_parquet, "MAX_FILE_SIZE", 1000)
+    monkeypatch.setattr(ndgeojson_to_parquet, "_ndjson_source_to_parquet", fail)
+    path = _ndjson(tmp_path / "big.geojson", 40)
+
+    with pytest.raises(duckdb.Error):
+        _ndjson_to_parquet(_ndjson_shards(path)[1], tmp_path / "out", tmp_path / "p.fifo")
+    assert not (tmp_path / "p.fifo").exists()
+
+
+@pytest.mark.parametrize(
+    "properties, kept",
+    [
+        ({"addr:country": "FR", "addr:postcode": "75011"}, True),
+        ({"addr:country": "FR", "addr:postcode": "2A004"}, True),
+        ({"addr:country": "FR", "addr:postcode": "97411"}, True),
+        ({"addr:country": "FR", "addr:postcode": "7501"}, False),
+        ({"addr:country": "FR"}, False),
+        ({"addr:country": "BE", "addr:postcode": "10000"}, False),
+    ],
+)
+def test_fr_filter(tmp_path, properties, kept):
+    path = tmp_path / "f.geojson"
+    path.write_text(json.dumps({"id": "x", "properties": properties, "geometry": None}) + "\n")
+    assert len(_flatten(path, ndgeojson_to_parquet.FR_FILTER)) == int(kept)
+
+
+def _flatten(path, where="TRUE"):
+    with duckdb.connect() as con:
+        return con.execute(f"""
+            SELECT * FROM (
+                SELECT id, {ndgeojson_to_parquet._FLATTEN_COLUMNS}
+                FROM read_json('{path.as_posix()}',
+                    format='newline_delimited',
+                    columns={ndgeojson_to_parquet._NDJSON_COLS})
+            )
+            WHERE {where}
+        """).fetchall()
+
+
+def test_flatten_properties(tmp_path):
+    path = tmp_path / "f.geojson"
+    properties = {
+        "addr:country": "FR",
+        "addr:postcode": "75011",
+        "brand:wikidata": "Q123",
+        "@spider": "bakery_fr",
+        "shop": "bakery",
+        "level": 1,
+    }
+    path.write_text(json.dumps({"id": "x", "properties": properties, "geometry": None}) + "\n")
+
+    (row,) = _flatten(path)
+
+    columns = dict(zip(["id", *ndgeojson_to_parquet.ATP_COLUMNS, "tags"], row))
+    assert columns["country"] == "FR"
+    assert columns["brand_wikidata"] == "Q123"
+    assert columns["spider_id"] == "bakery_fr"
+    assert columns["name"] is None
+    assert columns["tags"] == {"shop": "bakery", "level": "1"}
+
+
+def test_geoparquet_metadata_reduces_part_stats():
+    meta = ndgeojson_to_parquet._geoparquet_metadata(
+        [
+            (2.0, 48.0, 3.0, 49.0, ["POINT"]),
+            (None, None, None, None, []),  # part without any feature
+            (-61.8, 14.4, 2.5, 50.1, ["POINT", "POLYGON"]),
+        ]
+    )
+
+    column = meta["columns"]["geom"]
+    assert column["bbox"] == [-61.8, 14.4, 3.0, 50.1]
+    assert column["geometry_types"] == ["Point", "Polygon"]
+    assert column["covering"]["bbox"]["xmin"] == ["bbox", "xmin"]
+    assert ndgeojson_to_parquet._geoparquet_metadata([(None, None, None, None, [])]) is None
+
+
+@pytest.fixture(scope="module")
+def spatial():
+    try:
+        with duckdb.connect() as con:
+            con.execute("INSTALL spatial; LOAD spatial;")
+    except duckdb.Error as exc:
+        pytest.skip(f"DuckDB spatial extension unavailable: {exc}")
+
+
+_PLACES = [
+    # (country, postcode, lon, lat, brand:wikidata)
+    ("FR", "75011", 2.38, 48.86, "Q1"),
+    ("FR", "13001", 5.38, 43.30, "Q2"),
+    ("FR", "97411", 55.45, -20.88, "Q1"),
+    ("FR", "29200", -4.49, 48.39, None),
+    ("FR", "67000", 7.75, 48.58, "Q3"),
+    ("FR", "7501", 2.35, 48.85, "Q1"),  # invalid postcode
+    ("BE", "1000", 4.35, 50.85, "Q1"),
+    ("DE", "10115", 13.38, 52.53, "Q4"),
+]
+
+
+def _place_feature(i, country, postcode, lon, lat, wikidata):
+    properties = {"addr:country": country, "addr:postcode": postcode, "@spider": f"s{i % 3}"}
+    if wikidata:
+        properties["brand:wikidata"] = wikidata
+    return json.dumps(
+        {
+            "type": "Feature",
+            "id": f"p{i}",
+            "properties": properties,
+            "geometry": {"type": "Point", "coordinates": [lon, lat]},
+        }
+    )
+
+
+@pytest.mark.parametrize("keep_world", [False, True])
+def test_convert_to_parquet(tmp_path, monkeypatch, spatial, keep_world):
+    # Small shards: the larger file goes through the named pipe.
+    monkeypatch.setattr(ndgeojson_to_parquet, "MAX_FILE_SIZE", 600)
+    src_dir = tmp_path / "ndgeojson"
+    src_dir.mkdir()
+    # Enough rows for DuckDB to write bloom filters.
+    lines = [_place_feature(i, *place) + "\n" for i, place in enumerate(_PLACES * 5)]
+    (src_dir / "a.geojson").write_text("".join(lines[:30]))
+    (src_dir / "b.geojson").write_text("".join(lines[30:]))
+    (src_dir / "empty.geojson").write_text("")
+    out = tmp_path / "out" / "latest.parquet"
+
+    ndgeojson_to_parquet.convert_to_parquet(src_dir, out, keep_world=keep_world)
+
+    kept = [p for p in _PLACES if keep_world or (p[0] == "FR" and p[1] != "7501")]
+    with duckdb.connect() as con:
+        con.load_extension("spatial")
+        rows = con.execute(f"""
+            SELECT country, ST_X(geom), ST_Y(geom), bbox
+            FROM read_parquet('{out.as_posix()}', file_row_number = true)
+            ORDER BY file_row_number
+        """).fetchall()
+        assert len(rows) == 5 * len(kept)
+
+        (geo,) = con.execute(f"""
+            SELECT value FROM parquet_kv_metadata('{out.as_posix()}')
+            WHERE key = 'geo'
+        """).fetchall()
+        meta = json.loads(geo[0])
+        column = meta["columns"]["geom"]
+        xmin, ymin, xmax, ymax = column["bbox"]
+        assert (xmin, ymin) == (min(p[2] for p in kept), min(p[3] for p in kept))
+        assert (xmax, ymax) == (max(p[2] for p in kept), max(p[3] for p in kept))
+        assert column["geometry_types"] == ["Point"]
+
+        # Country first, then along the Hilbert curve of the file's bbox.
+        expected = con.execute(f"""
+            SELECT country, ST_X(geom), ST_Y(geom), bbox
+            FROM read_parquet('{out.as_posix()}')
+            ORDER BY country, ST_Hilbert(geom,
+                {{'min_x': {xmin}, 'min_y': {ymin}, 'max_x': {xmax}, 'max_y': {ymax}}}::BOX_2D)
+        """).fetchall()
+        assert [r[:3] for r in rows] == [r[:3] for r in expected]
+        assert [r[0] for r in rows] == sorted(r[0] for r in rows)
+        assert all(r[3]["xmin"] == r[1] and r[3]["ymax"] == r[2] for r in rows)
+
+        # brand_wikidata bloom filters: a brand absent from the file is ruled out.
+        def excluded(value):
+            return con.execute(f"""
+                SELECT bool_and(bloom_filter_excludes)
+                FROM parquet_bloom_probe('{out.as_posix()}', 'brand_wikidata', '{value}')
+            """).fetchone()[0]
+
+        assert not excluded("Q1")
+        assert excluded("Q999")
+    assert not (out.parent / ".duckdb_temp").exists()
@@ -0,0 +1,74 @@
+import gzip
+from datetime import datetime, timezone
+
+from src.pipeline._replication import (
+    changed_objects,
+    download_changes,
+    fetch_state,
+    parse_state,
+    sequence_path,
+)
+
+STATE = "#Sat Jan 04 21:21:02 UTC 2025\nsequenceNumber={seq}\ntimestamp=2025-01-0{seq}T20\\:21\\:02Z\n"
+
+OSC = """<?xml version='1.0' encoding='UTF-8'?>
+<osmChange version="0.6">
+  <modify>
+    <node id="{seq}1" version="3" lat="48.85" lon="2.35"><tag k="shop" v="bakery"/></node>
+    <way id="{seq}2" version="2"><nd ref="1"/><nd ref="2"/><tag k="shop" v="supermarket"/></way>
+  </modify>
+  <delete>
+    <relation id="{seq}3" version="5"><member type="way" ref="7" role="outer"/></relation>
+  </delete>
+</osmChange>
+"""
+
+
+def _publish(root, sequences):
+    updates = root / "europe" / "test-updates"
+    for seq in sequences:
+        path = updates / f"{sequence_path(seq)}.osc.gz"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(gzip.compress(OSC.format(seq=seq).encode()))
+    (updates / "state.txt").write_text(STATE.format(seq=max(sequences)))
+    return updates
+
+
+def test_sequence_path():
+    assert sequence_path(4123) == "000/004/123"
+    assert sequence_path(234567890) == "234/567/890"
+
+
+def test_parse_state():
+    seq, ts = parse_state(STATE.format(seq=5))
+    assert seq == 5
+    assert ts == datetime(2025, 1, 5, 20, 21, 2, tzinfo=timezone.utc)
+
+
+def test_fetch_and_download_changes(http_server, tmp_path):
+    base_url, root = http_server
+    _publish(root, [3, 4, 5])
+    updates_url = f"{base_url}/europe/test-updates"
+
+    assert fetch_state(updates_url)[0] == 5
+
+    paths = download_changes(updates_url, 3, 5, tmp_path / "changes")
+    assert [p.name for p in paths] == ["000000004.osc.gz", "000000005.osc.gz"]
+
+    assert changed_objects(paths) == {
+        ("N", 41), ("W", 42), ("R", 43),
+        ("N", 51), ("W", 52), ("R", 53),
+    }
+
+
+def test_download_changes_keeps_already_fetched_files(http_server, tmp_path):
+    base_url, root = http_server
+    _publish(root, [1, 2])
+    dest = tmp_path / "changes"
+    dest.mkdir()
+    (dest / "000000002.osc.gz").write_bytes(b"already here")
+
+    paths = download_changes(f"{base_url}/europe/test-updates", 0, 2, dest)
+
+    assert len(paths) == 2
+    assert paths[1].read_bytes() == b"already here"
@@ -0,0 +1,52 @@
+import pytest
+
+from src.pipeline import rollback
+
+
+class _Cursor:
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, query, params=None):
+        self.statements.append(query)
+
+
+@pytest.fixture
+def flat_nodes(tmp_path, monkeypatch):
+    current = tmp_path / "nodes.bin"
+    previous = tmp_path / "nodes.previous.bin"
+    monkeypatch.setattr(rollback, "FLAT_NODES_PATH", current)
+    monkeypatch.setattr(rollback, "PREVIOUS_FLAT_NODES_PATH", previous)
+    return current, previous
+
+
+def test_after_osm_swaps_flat_nodes(flat_nodes):
+    current, previous = flat_nodes
+    current.write_bytes(b"current")
+    previous.write_bytes(b"previous")
+
+    rollback._after_osm(_Cursor())
+
+    assert current.read_bytes() == b"previous"
+    assert previous.read_bytes() == b"current"
+    assert not current.with_suffix(".swap").exists()
+
+
+def test_osm_rollback_refused_without_previous_flat_nodes(flat_nodes, monkeypatch):
+    # First slim import over a legacy database: previous tables, no file.
+    current, previous = flat_nodes
+    current.write_bytes(b"current")
+
+    def connect():
+        raise AssertionError("nothing may be moved")
+
+    monkeypatch.setattr(rollback, "connect", connect)
+    with pytest.raises(RuntimeError, match="nodes.previous.bin"):
+        rollback.main(["osm"])
+    cur = _Cursor()
+    with pytest.raises(RuntimeError):
+        rollback._after_osm(cur)
+
+    assert current.read_bytes() == b"current"
+    assert not current.with_suffix(".swap").exists()
+    assert cur.statements == []
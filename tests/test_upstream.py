@@ -0,0 +1,61 @@
+import json
+import os
+import threading
+
+from src.pipeline import _upstream
+from src.pipeline._upstream import fetch_all, fetch_last_modified, fetch_text
+
+
+def test_fetch_text_memoized(http_server):
+    base_url, root = http_server
+    (root / "state.txt").write_text("sequenceNumber=1\n")
+
+    assert fetch_text(f"{base_url}/state.txt") == "sequenceNumber=1\n"
+    # Every later step of the run sees the same snapshot.
+    (root / "state.txt").write_text("sequenceNumber=2\n")
+    os.utime(root / "state.txt", (2_000_000_000, 2_000_000_000))
+    assert fetch_text(f"{base_url}/state.txt") == "sequenceNumber=1\n"
+
+    _upstream.reset()
+    assert fetch_text(f"{base_url}/state.txt") == "sequenceNumber=2\n"
+
+
+def test_fetch_text_conditional(http_server, upstream_cache):
+    base_url, root = http_server
+    path = root / "history.json"
+    path.write_text('["run-1"]')
+    os.utime(path, (1_700_000_000, 1_700_000_000))
+
+    assert fetch_text(f"{base_url}/history.json") == '["run-1"]'
+    entry = json.loads(upstream_cache.read_text())[f"{base_url}/history.json"]
+    assert entry["last_modified"] and entry["text"] == '["run-1"]'
+
+    # Same Last-Modified on the server: the next run gets a 304 and reuses
+    # the cached body (which the rewritten file would tell apart).
+    path.write_text('["run-X"]')
+    os.utime(path, (1_700_000_000, 1_700_000_000))
+    _upstream.reset()
+    assert fetch_text(f"{base_url}/history.json") == '["run-1"]'
+
+
+def test_fetch_last_modified(http_server):
+    base_url, root = http_server
+    path = root / "france-latest.osm.pbf"
+    path.write_bytes(b"pbf")
+    os.utime(path, (1_700_000_000, 1_700_000_000))
+
+    assert fetch_last_modified(f"{base_url}/france-latest.osm.pbf").timestamp() == (
+        1_700_000_000
+    )
+
+
+def test_fetch_all_concurrent():
+    barrier = threading.Barrier(3, timeout=5)
+
+    def wait(item):
+        # Only passes once all three items are in flight at the same time.
+        barrier.wait()
+        return item * 2
+
+    assert fetch_all(wait, [1, 2, 3]) == [2, 4, 6]
+    assert fetch_all(wait, []) == []